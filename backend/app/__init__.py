@@ -55,6 +55,37 @@ def create_app(config_class=Config):
     # Configure JWT
     jwt.init_app(app)
 
+    # One database change listener per worker, feeding the in-memory
+    # available-listings snapshot and the /api/listing/stream subscribers
+    from app.utils.change_feed import init_change_feed
+    from app.utils.feed_store import init_feed_store
+    from app.utils.listing_events import init_listing_events
+    from app.utils.suggest import init_suggest_index
+    change_feed = init_change_feed(app)
+    init_feed_store(app, change_feed)
+    init_listing_events(app, change_feed)
+    # Per-worker typeahead index for /api/listing/suggest
+    init_suggest_index(app, change_feed)
+
+    # Keep the /api/listing/changes log compact
+    from app.utils.change_log import init_change_log_compaction
+    init_change_log_compaction(app)
+
+    # Background processing of /api/listing/upload jobs into the image store
+    from app.utils.storage import init_image_storage
+    from app.utils.uploads import init_upload_jobs
+    init_image_storage(app)
+    init_upload_jobs(app)
+
+    # Similar listings and recommendations are updated from the upload worker's loop
+    from app.utils.recommend import init_recommendation_updates
+    from app.utils.similar import init_similar_refresh
+    init_similar_refresh(app)
+    init_recommendation_updates(app)
+
+    from app.commands import listings_cli
+    app.cli.add_command(listings_cli)
+
     # Register blueprints
     from app.routes.auth_routes import bp as auth_bp
     from app.routes.listing_routes import bp as listing_bp
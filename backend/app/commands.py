@@ -0,0 +1,70 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .extensions import db
+from .models.pricing import rebuild_price_sketches
+from .utils.change_log import compact_change_log
+from .utils.recommend import run_recommendations
+from .utils.similar import rebuild_similar_listings, refresh_similar_listings
+
+# Maintenance tasks, e.g. `flask --app wsgi listings compact-changes` from a
+# scheduler.
+listings_cli = AppGroup('listings', help='Listing maintenance tasks.')
+
+
+@listings_cli.command('compact-changes')
+def compact_changes():
+    """Compact the listing change log behind /api/listing/changes."""
+    removed = compact_change_log(current_app)
+    if removed is None:
+        click.echo('Another process is compacting the change log; skipped.')
+    else:
+        click.echo('Removed %d superseded changes and %d expired tombstones.' % removed)
+
+
+@listings_cli.command('rebuild-similar')
+def rebuild_similar():
+    """Recompute every listing's similar listings from a fresh TF-IDF model."""
+    count = rebuild_similar_listings(current_app)
+    click.echo('Rebuilt similar listings for %d listings.' % count)
+
+
+@listings_cli.command('refresh-similar')
+def refresh_similar():
+    """Update the similar listings affected by listing changes since the last run."""
+    count = refresh_similar_listings(current_app)
+    if count is None:
+        click.echo('Another process is refreshing similar listings; skipped.')
+    else:
+        click.echo('Refreshed similar listings after changes to %d listings.' % count)
+
+
+@listings_cli.command('build-recommendations')
+@click.option('--full', is_flag=True, help='Recompute everything instead of only what new hearts affect.')
+def build_recommendations(full):
+    """Update the per-user lists behind /api/listing/recommended."""
+    written = run_recommendations(current_app, full=full)
+    if written is None:
+        click.echo('Another process is updating recommendations; skipped.')
+    else:
+        click.echo('Wrote neighbours for %d listings and recommendations for %d users.' % written)
+
+
+@listings_cli.command('rebuild-price-sketches')
+def rebuild_price_sketches_command():
+    """Recompute the price digests behind /api/listing/price-suggestion from all listings."""
+    count = rebuild_price_sketches(db.session)
+    db.session.commit()
+    click.echo('Rebuilt %d price sketches.' % count)
+
+
+@listings_cli.command('upload-worker')
+def upload_worker():
+    """Process queued /api/listing/upload jobs spooled on this host until interrupted.
+
+    gunicorn.conf.py starts one per host beside the web workers unless
+    LISTING_UPLOAD_JOBS_IN_PROCESS=1.
+    """
+    runner = current_app.extensions['upload_jobs']
+    click.echo('Processing upload jobs with %d workers.' % runner.workers)
+    runner.serve()
@@ -20,16 +20,76 @@ class Config:
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
         'max_overflow': 2,
         'pool_recycle': 300,
         'pool_pre_ping': True,
         'pool_timeout': 30
     }
     
+    # Listing collections are streamed from the database this many rows at a time
+    LISTING_STREAM_BATCH_SIZE = 500
+    # Streams hold a pooled connection while the client reads; keep most of the pool for other requests
+    LISTING_STREAM_MAX_CONCURRENT = 4
+    # Largest number of ids accepted by /api/listing/batch
+    LISTING_BATCH_MAX_IDS = 250
+    # Each worker follows listing changes with one PostgreSQL LISTEN connection
+    # (or by polling listings_version on SQLite)
+    LISTING_CHANGE_FEED_BACKGROUND = True  # False: only sync() when called (tests)
+    LISTING_CHANGE_FEED_POLL_INTERVAL = 1.0
+    LISTING_CHANGE_FEED_RETRY_SECONDS = 5
+    # Serve the available-listings feed from an in-process snapshot
+    LISTING_FEED_STORE = True
+    # Recent changes kept per worker so /api/listing/stream clients can resume
+    LISTING_EVENTS_BACKLOG = 1000
+    # Seconds between keepalive comments on an idle event stream
+    LISTING_EVENTS_HEARTBEAT = 15
+    # /api/listing/changes: compact the change log this often (seconds; 0 to
+    # leave it to `flask listings compact-changes`) and keep tombstones this
+    # many days, after which clients that have not synced start over
+    LISTING_CHANGES_COMPACT_INTERVAL = 3600
+    LISTING_CHANGES_TOMBSTONE_DAYS = 30
+    # A heart's weight in /api/listing/trending halves every this many hours
+    TRENDING_HALF_LIFE_HOURS = 24
+    # Neighbours precomputed per listing for /api/listing/<id>/similar
+    SIMILAR_LISTINGS_K = 10
+    # Seconds between the upload worker's refreshes of lists affected by listing writes
+    SIMILAR_LISTINGS_REFRESH_INTERVAL = 60
+    # Listings kept per user by `flask listings build-recommendations` for
+    # /api/listing/recommended
+    RECOMMENDATIONS_PER_USER = 20
+    # Seconds between the upload worker's incremental recommendation updates
+    RECOMMENDATIONS_INTERVAL = 300
+    
     # File upload config
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # /api/listing/upload spools files here for the upload jobs
+    LISTING_UPLOAD_SPOOL = os.environ.get('LISTING_UPLOAD_SPOOL') or os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), 'uploads', 'spool')
+    LISTING_UPLOAD_WORKERS = int(os.environ.get('LISTING_UPLOAD_WORKERS', 4))
+    LISTING_UPLOAD_TIMEOUT = 30  # seconds per photo stored
+    # Off under gunicorn, which runs jobs in `flask listings upload-worker` instead
+    LISTING_UPLOAD_JOBS_IN_PROCESS = os.environ.get('LISTING_UPLOAD_JOBS_IN_PROCESS', '1') == '1'
+    LISTING_UPLOAD_POLL_INTERVAL = 1.0
+    # Processing this long means the job's worker died: requeued, or failed at twice this
+    LISTING_UPLOAD_JOB_STALE = 600
+    LISTING_UPLOAD_JOB_RETENTION_DAYS = 7
+    # Uploaded photos are stored upright, stripped of EXIF metadata, at most
+    # this many pixels on their longest edge, re-encoded as WEBP or JPEG
+    LISTING_IMAGE_MAX_EDGE = 1600
+    LISTING_IMAGE_QUALITY = 80
+    LISTING_IMAGE_FORMAT = 'WEBP'
+    # Smaller copies stored beside each photo, by longest edge: thumbnails
+    # for grid cards (200px wide at 2x) and a medium size for phones; the
+    # detail view offers all of them in a srcset
+    LISTING_IMAGE_VARIANTS = {'thumbnail': 400, 'medium': 960}
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
+    # Stored photos go to Cloudinary or, with 'local', under
+    # LISTING_IMAGE_STORAGE_ROOT, served at LISTING_IMAGE_STORAGE_URL (set an
+    # absolute URL when the frontend is on another origin)
+    LISTING_IMAGE_STORAGE = os.environ.get('LISTING_IMAGE_STORAGE', 'cloudinary')
+    LISTING_IMAGE_STORAGE_ROOT = os.environ.get('LISTING_IMAGE_STORAGE_ROOT') or os.path.join(UPLOAD_FOLDER, 'images')
+    LISTING_IMAGE_STORAGE_URL = os.environ.get('LISTING_IMAGE_STORAGE_URL', '/api/listing/images')
     
     # Email config
     MAIL_SERVER = 'smtp.gmail.com'
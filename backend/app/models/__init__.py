@@ -1,4 +1,16 @@
 from .user import User
-from .listing import Listing, ListingImage, HeartedListing
+from .listing import Listing, ListingImage, HeartedListing, ListingsVersion
+from .facets import ListingFacetCount, facet_counts
+from .changes import ListingChange, ListingChangeHorizon
+from .similar import ListingSimilarity, SimilarityRefresh
+from .recommend import HeartEvent, ListingCooccurrence, ListingRecommendation
+from .pricing import PriceSketch, price_suggestion
+from .uploads import UploadJob, StoredImage
+from . import tracking
+from .search import search_listings
+from .trending import trending_listings
 
-__all__ = ['User', 'Listing', 'ListingImage', 'HeartedListing'] 
\ No newline at end of file
+__all__ = ['User', 'Listing', 'ListingImage', 'HeartedListing', 'ListingsVersion', 'ListingFacetCount',
+           'facet_counts', 'ListingChange', 'ListingChangeHorizon', 'ListingSimilarity',
+           'SimilarityRefresh', 'HeartEvent', 'ListingCooccurrence', 'ListingRecommendation', 'PriceSketch',
+           'price_suggestion', 'UploadJob', 'StoredImage', 'search_listings', 'trending_listings']
@@ -0,0 +1,100 @@
+from datetime import datetime
+from sqlalchemy import DDL, event
+from ..extensions import db
+from .sql import BigId
+
+# Change ops, also used in the listing_changes NOTIFY payload
+CREATED, UPDATED, DELETED = 'c', 'u', 'd'
+
+
+class ListingChange(db.Model):
+    """Append-only log of listing writes, the source of /api/listing/changes.
+
+    One row per listing per flush, written by the session hooks in
+    tracking.py in the same transaction as the write. The row id is the sync
+    cursor. Compaction keeps only the newest row per listing and eventually
+    drops old tombstones (op 'd'), advancing ListingChangeHorizon past them.
+    """
+    __tablename__ = 'listing_changes'
+    __table_args__ = (
+        db.Index('ix_listing_changes_listing_id_id', 'listing_id', 'id'),
+    )
+
+    id = db.Column(BigId, primary_key=True, autoincrement=True)
+    # No foreign key: tombstones outlive their listing
+    listing_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(1), nullable=False)
+    version = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ListingChange {self.id} {self.op}{self.listing_id}>'
+
+
+class ListingChangeHorizon(db.Model):
+    """Single row: the newest change id dropped by tombstone compaction.
+
+    A client whose cursor is below it may have missed a deletion and has to
+    sync from scratch.
+    """
+    __tablename__ = 'listing_change_horizon'
+
+    id = db.Column(db.Integer, primary_key=True)
+    change_id = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def current(cls):
+        return db.session.get(cls, 1)
+
+    def __repr__(self):
+        return f'<ListingChangeHorizon {self.change_id}>'
+
+event.listen(ListingChangeHorizon.__table__, 'after_create', DDL(
+    "INSERT INTO listing_change_horizon (id, change_id) VALUES (1, 0)"))
+
+
+def record_listing_changes(connection, version, changes):
+    """Append {listing_id: op} to the change log for one listings version."""
+    now = datetime.utcnow()
+    connection.execute(ListingChange.__table__.insert(), [
+        {'listing_id': listing_id, 'op': op, 'version': version, 'created_at': now}
+        for listing_id, op in sorted(changes.items())
+    ])
+
+
+def compact_listing_changes(session, tombstone_retention):
+    """Compact the change log; returns (superseded rows, tombstones) removed.
+
+    Dropping every row but the newest per listing never hides anything from
+    a client, whatever its cursor. Tombstones are kept for
+    `tombstone_retention` so clients that sync at least that often see
+    deletions; older ones are dropped and the horizon moves past them.
+    """
+    table = ListingChange.__table__
+    newest = db.select(db.func.max(table.c.id)).group_by(table.c.listing_id)
+    superseded = session.execute(table.delete().where(table.c.id.not_in(newest))).rowcount
+
+    expired = (table.c.op == DELETED) & (table.c.created_at < datetime.utcnow() - tombstone_retention)
+    horizon = session.execute(db.select(db.func.max(table.c.id)).where(expired)).scalar()
+    tombstones = 0
+    if horizon is not None:
+        tombstones = session.execute(table.delete().where(expired & (table.c.id <= horizon))).rowcount
+        session.execute(ListingChangeHorizon.__table__.update()
+                        .where(ListingChangeHorizon.id == 1)
+                        .where(ListingChangeHorizon.change_id < horizon)
+                        .values(change_id=horizon))
+    return superseded, tombstones
+
+
+def listing_changes_since(since, limit):
+    """Changes after cursor `since`, oldest first, as (rows, has_more).
+
+    Rows are (id, listing_id, op), at most `limit` of them.
+    """
+    rows = (db.session.query(ListingChange.id, ListingChange.listing_id, ListingChange.op)
+            .filter(ListingChange.id > since)
+            .order_by(ListingChange.id)
+            .limit(limit + 1)
+            .all())
+    return rows[:limit], len(rows) > limit
+
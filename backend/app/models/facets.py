@@ -0,0 +1,116 @@
+from bisect import bisect_right
+from collections import namedtuple
+from sqlalchemy import func
+from ..extensions import db
+from .listing import Listing
+from .sql import dialect_insert
+
+# Lower bounds of the price histogram buckets; the last bucket is open-ended.
+PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500]
+
+FACET_FIELDS = ('status', 'category', 'condition', 'price')
+
+
+def price_bucket(price):
+    return max(0, bisect_right(PRICE_BUCKETS, price or 0) - 1)
+
+
+class ListingFacetCount(db.Model):
+    """Listing counts per (status, category, condition, price bucket) cell.
+
+    Maintained incrementally by the session hooks in tracking.py, so facet
+    counts for any filter combination are a sum over a few hundred rows at
+    most instead of a GROUP BY over every listing. Missing categories and
+    conditions are stored as ''.
+    """
+    __tablename__ = 'listing_facet_counts'
+
+    status = db.Column(db.String(20), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    condition = db.Column(db.String(50), primary_key=True)
+    price_bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ListingFacetCount {self.status}/{self.category}/{self.condition}/{self.price_bucket}: {self.count}>'
+
+
+def facet_cell(status, category, condition, price):
+    return (status or 'available', (category or '').lower(), condition or '', price_bucket(price))
+
+
+def apply_facet_deltas(connection, deltas):
+    """Add {cell: delta} to the stored counts with one upsert per changed cell."""
+    table = ListingFacetCount.__table__
+    for (status, category, condition, bucket), delta in deltas.items():
+        if not delta:
+            continue
+        statement = dialect_insert(connection, table).values(
+            status=status, category=category, condition=condition,
+            price_bucket=bucket, count=delta)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['status', 'category', 'condition', 'price_bucket'],
+            set_={'count': table.c.count + delta}))
+
+
+# A facet cell counted from the listings table rather than ListingFacetCount
+_ExactCell = namedtuple('_ExactCell', 'status category condition price_bucket count')
+
+
+def _cells_up_to(max_price, cells):
+    """The cells of listings priced at or below `max_price`.
+
+    Buckets entirely below `max_price` are taken from `cells` as they are.
+    The bucket `max_price` falls inside is counted again from the listings
+    themselves, over its price range only (ix_listings_price), so the
+    counts agree with the feed's `price <= max_price` filter.
+    """
+    bucket = price_bucket(max_price)
+    below = [cell for cell in cells if cell.price_bucket < bucket]
+    rows = db.session.query(
+        Listing.status, func.lower(Listing.category), Listing.condition, func.count()
+    ).filter(
+        Listing.price >= PRICE_BUCKETS[bucket], Listing.price <= max_price
+    ).group_by(Listing.status, func.lower(Listing.category), Listing.condition)
+    return below + [_ExactCell(status or 'available', category or '', condition or '', bucket, count)
+                    for status, category, condition, count in rows]
+
+
+def facet_counts(status=None, category=None, condition=None, max_price=None):
+    """Facet counts for a filter set.
+
+    Each facet is counted with every filter applied except its own, so the
+    UI can show how many results picking another value would give.
+    `max_price` is applied exactly, as the feed applies it (see _cells_up_to).
+    """
+    filters = {
+        'status': (lambda cell: cell.status == status) if status else None,
+        'category': (lambda cell: cell.category == category.lower()) if category else None,
+        'condition': (lambda cell: cell.condition == condition) if condition else None,
+    }
+    cells = ListingFacetCount.query.filter(ListingFacetCount.count > 0).all()
+    priced = _cells_up_to(max_price, cells) if max_price else cells
+
+    def count_by(facet, key):
+        counts = {}
+        for cell in (cells if facet == 'price' else priced):
+            if all(check(cell) for name, check in filters.items() if check and name != facet):
+                value = key(cell)
+                counts[value] = counts.get(value, 0) + cell.count
+        return counts
+
+    buckets = count_by('price', lambda cell: cell.price_bucket)
+    return {
+        'total': sum(count_by(None, lambda cell: None).values()),
+        'statuses': count_by('status', lambda cell: cell.status),
+        'categories': count_by('category', lambda cell: cell.category or None),
+        'conditions': count_by('condition', lambda cell: cell.condition or None),
+        'price_histogram': [
+            {
+                'min': low,
+                'max': PRICE_BUCKETS[i + 1] if i + 1 < len(PRICE_BUCKETS) else None,
+                'count': buckets.get(i, 0)
+            }
+            for i, low in enumerate(PRICE_BUCKETS)
+        ]
+    }
@@ -0,0 +1,51 @@
+from datetime import datetime
+from ..extensions import db
+from .listing import Listing, HeartedListing
+from .recommend import HeartEvent
+from .sql import dialect_insert
+from .trending import record_heart, remove_heart
+
+
+def add_heart(session, user_id, listing_id, half_life_hours):
+    """Heart `listing_id` for `user_id` if it is available; idempotent.
+
+    A single INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING: the
+    SELECT checks availability, the unique (user_id, listing_id) index turns
+    a repeat into a no-op, and RETURNING says whether this call added the
+    heart, in which case the listing's trending counters are updated and
+    the heart is logged for the next recommendations run. Returns True if
+    the heart was added by this call.
+    """
+    table = HeartedListing.__table__
+    now = datetime.utcnow()
+    available = (db.select(db.literal(int(user_id)), Listing.id, db.literal(now))
+                 .where(Listing.id == listing_id, Listing.status == 'available'))
+    statement = (dialect_insert(session.connection(), table)
+                 .from_select(['user_id', 'listing_id', 'created_at'], available)
+                 .on_conflict_do_nothing(index_elements=['user_id', 'listing_id'])
+                 .returning(table.c.created_at))
+    hearted_at = session.execute(statement).scalar()
+    if hearted_at is None:
+        return False
+    record_heart(session, listing_id, hearted_at, half_life_hours)
+    session.add(HeartEvent(user_id=int(user_id), listing_id=listing_id))
+    return True
+
+
+def delete_heart(session, user_id, listing_id, half_life_hours):
+    """Remove `user_id`'s heart on `listing_id`; idempotent.
+
+    One DELETE ... RETURNING, whose returned created_at is the weight to
+    take back out of the trending score. Returns True if a heart was removed.
+    """
+    table = HeartedListing.__table__
+    hearted_at = session.execute(
+        table.delete()
+        .where(table.c.user_id == int(user_id), table.c.listing_id == listing_id)
+        .returning(table.c.created_at)
+    ).scalar()
+    if hearted_at is None:
+        return False
+    remove_heart(session, listing_id, hearted_at, half_life_hours)
+    session.add(HeartEvent(user_id=int(user_id), listing_id=listing_id))
+    return True
@@ -1,9 +1,27 @@
 from ..extensions import db
 from datetime import datetime
+from sqlalchemy import DDL, event
 from .user import User
 
+CATEGORIES = [
+    'tops', 'bottoms', 'dresses', 'shoes',
+    'furniture', 'appliances', 'books', 'other'
+]
+
 class Listing(db.Model):
     __tablename__ = 'listings'
+    # Every read path orders by (created_at, id) after an equality filter, so
+    # each index ends in those columns and serves the keyset seek directly.
+    __table_args__ = (
+        db.Index('ix_listings_created_at_id', 'created_at', 'id'),
+        db.Index('ix_listings_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_listings_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_listings_buyer_id_created_at_id', 'buyer_id', 'created_at', 'id',
+                 postgresql_where=db.text('buyer_id IS NOT NULL'),
+                 sqlite_where=db.text('buyer_id IS NOT NULL')),
+        db.Index('ix_listings_price', 'price'),
+        db.Index('ix_listings_status_trending_score_id', 'status', 'trending_score', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -14,10 +32,16 @@ class Listing(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     buyer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     condition = db.Column(db.String(50), nullable=True)
+    # Maintained by heart_listing/unheart_listing; see models/trending.py
+    heart_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    trending_score = db.Column(db.Float, nullable=True)
     
     # Add relationship with ListingImage
-    images = db.relationship('ListingImage', backref='listing', lazy=True, cascade='all, delete-orphan')
+    images = db.relationship('ListingImage', backref='listing', lazy=True, cascade='all, delete-orphan',
+                             order_by='ListingImage.id')
+    seller = db.relationship('User', foreign_keys=[user_id], lazy=True)
     
     def __init__(self, title, description, price, category, status, user_id, condition='good', created_at=None):
         self.title = title
@@ -41,30 +65,50 @@ class Listing(db.Model):
             'user_id': self.user_id,
             'buyer_id': self.buyer_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'images': [image.filename for image in self.images],
+            'thumbnail': (self.images[0].thumbnail or self.images[0].filename) if self.images else None,
             'condition': self.condition
         }
     
     def __repr__(self):
         return f'<Listing {self.title}>'
 
+# The feed matches categories case-insensitively on lower(category)
+db.Index('ix_listings_lower_category_created_at_id',
+         db.func.lower(Listing.category), Listing.created_at, Listing.id)
+
 class ListingImage(db.Model):
     __tablename__ = 'listing_images'
+    __table_args__ = (
+        db.Index('ix_listing_images_listing_id_id', 'listing_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     listing_id = db.Column(db.Integer, db.ForeignKey('listings.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set for photos uploaded through /api/listing/upload (see StoredImage);
+    # payloads fall back to `filename` where they are missing
+    thumbnail = db.Column(db.String(255))
+    srcset = db.Column(db.Text)
     
-    def __init__(self, filename, listing_id):
+    def __init__(self, filename, listing_id, thumbnail=None, srcset=None):
         self.filename = filename
         self.listing_id = listing_id
+        self.thumbnail = thumbnail
+        self.srcset = srcset
     
     def __repr__(self):
         return f'<ListingImage {self.filename}>'
 
 class HeartedListing(db.Model):
     __tablename__ = 'hearted_listings'
+    __table_args__ = (
+        # One heart per user per listing; heart/unheart upsert against it
+        db.Index('uq_hearted_listings_user_id_listing_id', 'user_id', 'listing_id', unique=True),
+        db.Index('ix_hearted_listings_listing_id', 'listing_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -76,4 +120,26 @@ class HeartedListing(db.Model):
     listing = db.relationship('Listing', backref=db.backref('hearted_by', lazy=True))
 
     def __repr__(self):
-        return f'<HeartedListing {self.id}>' 
\ No newline at end of file
+        return f'<HeartedListing {self.id}>' 
+
+class ListingsVersion(db.Model):
+    """Single-row counter bumped in the same transaction as any listing write.
+
+    Read endpoints derive their ETags from it, so a conditional GET can be
+    answered without running the listing query.
+    """
+    __tablename__ = 'listings_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def current(cls):
+        return db.session.get(cls, 1)
+
+    def __repr__(self):
+        return f'<ListingsVersion {self.version}>'
+
+event.listen(ListingsVersion.__table__, 'after_create', DDL(
+    "INSERT INTO listings_version (id, version, updated_at) VALUES (1, 0, CURRENT_TIMESTAMP)"))
@@ -0,0 +1,106 @@
+from ..extensions import db
+from ..utils.tdigest import TDigest
+from .listing import Listing
+from .sql import dialect_insert
+
+# Sketch kinds: prices of listings still on sale, and the prices they sold at
+ASKING = 'asking'
+SOLD = 'sold'
+
+PRICE_QUANTILES = (0.25, 0.5, 0.75)
+# Sales needed before the sold prices alone drive the suggestion
+MIN_SOLD_FOR_SUGGESTION = 5
+
+
+class PriceSketch(db.Model):
+    """t-digest of listing prices per (kind, category, condition).
+
+    Maintained incrementally by the session hooks in tracking.py: a new
+    listing adds its price to the asking sketch, a repriced one moves it, a
+    sale moves it to the sold sketch. A digest is a few hundred bytes of
+    centroids however many listings it summarises, so price suggestions
+    read a handful of rows instead of scanning listings. Missing categories
+    and conditions are stored as ''.
+    """
+    __tablename__ = 'price_sketches'
+
+    kind = db.Column(db.String(10), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    condition = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    digest = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<PriceSketch {self.kind}/{self.category}/{self.condition}: {self.count}>'
+
+
+def price_cell(status, category, condition):
+    return (SOLD if status == 'sold' else ASKING, (category or '').lower(), condition or '')
+
+
+def apply_price_deltas(connection, deltas):
+    """Apply {cell: [(price, +1 or -1), ...]} to the stored digests.
+
+    Each changed digest is read under a row lock, updated and written back,
+    so concurrent writers to the same cell queue up instead of losing
+    each other's prices.
+    """
+    table = PriceSketch.__table__
+    for (kind, category, condition), changes in sorted(deltas.items()):
+        if not changes:
+            continue
+        key = (table.c.kind == kind) & (table.c.category == category) & (table.c.condition == condition)
+        connection.execute(
+            dialect_insert(connection, table)
+            .values(kind=kind, category=category, condition=condition, count=0, digest=TDigest().to_bytes())
+            .on_conflict_do_nothing(index_elements=['kind', 'category', 'condition']))
+        stored = connection.execute(db.select(table.c.digest).where(key).with_for_update()).scalar()
+        digest = TDigest.from_bytes(stored)
+        for price, sign in changes:
+            if sign > 0:
+                digest.add(price)
+            else:
+                digest.remove(price)
+        connection.execute(table.update().where(key).values(count=digest.count, digest=digest.to_bytes()))
+
+
+def rebuild_price_sketches(session):
+    """Recompute every digest from the listings table; the caller commits."""
+    digests = {}
+    for status, category, condition, price in session.execute(
+            db.select(Listing.status, Listing.category, Listing.condition, Listing.price)):
+        digests.setdefault(price_cell(status, category, condition), TDigest()).add(price)
+    session.execute(PriceSketch.__table__.delete())
+    if digests:
+        session.execute(PriceSketch.__table__.insert(), [
+            {'kind': kind, 'category': category, 'condition': condition,
+             'count': digest.count, 'digest': digest.to_bytes()}
+            for (kind, category, condition), digest in digests.items()
+        ])
+    return len(digests)
+
+
+def _summary(digest):
+    count = digest.count
+    if not count:
+        return {'count': 0, 'low': None, 'median': None, 'high': None}
+    low, median, high = (round(digest.quantile(q), 2) for q in PRICE_QUANTILES)
+    return {'count': count, 'low': low, 'median': median, 'high': high}
+
+
+def price_suggestion(category, condition=None):
+    """Median and interquartile range of asking and sold prices.
+
+    With no `condition` the digests of every condition in the category are
+    merged. `suggested` is the sold median once enough sales back it, the
+    asking median otherwise.
+    """
+    query = PriceSketch.query.filter(PriceSketch.category == (category or '').lower())
+    if condition:
+        query = query.filter(PriceSketch.condition == condition)
+    digests = {ASKING: TDigest(), SOLD: TDigest()}
+    for sketch in query:
+        digests[sketch.kind].update(TDigest.from_bytes(sketch.digest))
+    asking, sold = _summary(digests[ASKING]), _summary(digests[SOLD])
+    source = sold if sold['count'] >= MIN_SOLD_FOR_SUGGESTION else asking
+    return {'asking': asking, 'sold': sold, 'suggested': source['median']}
@@ -0,0 +1,53 @@
+from ..extensions import db
+from .sql import BigId
+
+
+class HeartEvent(db.Model):
+    """Append-only log of hearts added or removed since the last recommendations run.
+
+    Written alongside each heart/unheart that changed something; the
+    incremental job reads it to find which listings' co-occurrences moved
+    and deletes what it has processed.
+    """
+    __tablename__ = 'heart_events'
+
+    id = db.Column(BigId, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    listing_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<HeartEvent {self.user_id}:{self.listing_id}>'
+
+
+class ListingCooccurrence(db.Model):
+    """Top item-item neighbours by cosine similarity of the sets of users who hearted them.
+
+    Row `rank` of `listing_id` is the rank-th listing most often hearted by
+    the same people, normalised by how popular each one is. Neighbours are
+    available listings; `listing_id` may be any hearted listing.
+    """
+    __tablename__ = 'listing_cooccurrences'
+    __table_args__ = (
+        db.Index('ix_listing_cooccurrences_neighbour_id', 'neighbour_id'),
+    )
+
+    listing_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    neighbour_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<ListingCooccurrence {self.listing_id}#{self.rank}: {self.neighbour_id}>'
+
+
+class ListingRecommendation(db.Model):
+    """Per-user recommendation list served by /api/listing/recommended."""
+    __tablename__ = 'listing_recommendations'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    listing_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<ListingRecommendation {self.user_id}#{self.rank}: {self.listing_id}>'
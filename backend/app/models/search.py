@@ -0,0 +1,95 @@
+import re
+from sqlalchemy import DDL, event, func, literal_column, table, column
+from ..extensions import db
+from .listing import Listing
+
+# PostgreSQL keeps a weighted tsvector in a generated column (title ranks above
+# description) with a GIN index on it. SQLite mirrors listings into an FTS5
+# external-content table kept in sync by triggers.
+POSTGRES_DDL = [
+    """
+    ALTER TABLE listings ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_listings_search_vector ON listings USING gin (search_vector)",
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+        title, description, content='listings', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_fts_ai AFTER INSERT ON listings BEGIN
+        INSERT INTO listings_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_fts_ad AFTER DELETE ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS listings_fts_au AFTER UPDATE OF title, description ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO listings_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO listings_fts(listings_fts) VALUES ('rebuild')",
+]
+
+# Keep db.create_all()/drop_all() (local development and tests) in step with
+# what the migration creates in production.
+for statement in POSTGRES_DDL:
+    event.listen(Listing.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(Listing.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Listing.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS listings_fts').execute_if(dialect='sqlite'))
+
+_fts = table('listings_fts', column('rowid'))
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts5_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_listings(query, text):
+    """Restrict `query` to listings matching `text`, best match first.
+
+    Returns None when `text` contains nothing searchable.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        if not _WORD.search(text):
+            return None
+        tsquery = func.websearch_to_tsquery('english', text)
+        vector = literal_column('listings.search_vector')
+        rank = func.ts_rank_cd(vector, tsquery)
+        return query.filter(vector.op('@@')(tsquery)).order_by(rank.desc(), Listing.id.desc())
+
+    match = _fts5_query(text)
+    if match is None:
+        return None
+    fts = literal_column('listings_fts')
+    # bm25() is lower-is-better; weight title hits above description hits.
+    rank = func.bm25(fts, 10.0, 1.0)
+    return (query
+            .join(_fts, _fts.c.rowid == Listing.id)
+            .filter(fts.op('MATCH')(match))
+            .order_by(rank, Listing.id.desc()))
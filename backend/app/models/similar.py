@@ -0,0 +1,44 @@
+from ..extensions import db
+from .sql import BigId
+
+
+class ListingSimilarity(db.Model):
+    """Precomputed nearest neighbours of each available listing.
+
+    Row `rank` of `listing_id` is its rank-th most similar listing by TF-IDF
+    cosine over title, description and category (see
+    app.utils.similar). /api/listing/<id>/similar reads one primary key
+    range, so serving it costs the same however many listings there are.
+    """
+    __tablename__ = 'listing_similarities'
+    __table_args__ = (
+        # Finds the lists a listing appears in when it changes or goes away
+        db.Index('ix_listing_similarities_similar_id', 'similar_id'),
+    )
+
+    # No foreign keys: rows are cleaned up by `flask listings refresh-similar`
+    # after listings change, and must not block deleting a listing
+    listing_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    similar_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<ListingSimilarity {self.listing_id}#{self.rank}: {self.similar_id}>'
+
+
+class SimilarityRefresh(db.Model):
+    """Append-only log of listings whose similar lists may be out of date.
+
+    Written in the same transaction as a listing write that changed its
+    title, description, category or status (see tracking.py); `flask
+    listings refresh-similar` reads it, brings the affected lists up to date
+    and deletes what it has processed.
+    """
+    __tablename__ = 'similarity_refreshes'
+
+    id = db.Column(BigId, primary_key=True, autoincrement=True)
+    listing_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<SimilarityRefresh {self.listing_id}>'
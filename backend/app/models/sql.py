@@ -0,0 +1,19 @@
+from sqlalchemy import BigInteger, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Autoincrementing id of append-only logs: SQLite only autoincrements
+# INTEGER PRIMARY KEY columns
+BigId = BigInteger().with_variant(Integer, 'sqlite')
+
+
+def dialect_insert(bind, table):
+    """INSERT construct supporting on_conflict_do_* for the bound dialect.
+
+    PostgreSQL and SQLite both implement INSERT ... ON CONFLICT; other
+    dialects are not supported by the listing read models.
+    """
+    if bind.dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    if bind.dialect.name == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError(f'ON CONFLICT is not supported on {bind.dialect.name}')
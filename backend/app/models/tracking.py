@@ -0,0 +1,157 @@
+from datetime import datetime
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+from .listing import Listing, ListingImage, ListingsVersion
+from .facets import FACET_FIELDS, facet_cell, apply_facet_deltas
+from .pricing import price_cell, apply_price_deltas
+from .changes import CREATED, UPDATED, DELETED, record_listing_changes
+from .similar import SimilarityRefresh
+
+# Session hooks that keep derived listing state in the same transaction as
+# the listing write that caused it.
+
+# PostgreSQL NOTIFY channel carrying "<version>:<op><id>,<op><id>,..." for
+# every committed listing change, op being c(reated), u(pdated) or d(eleted);
+# see app.utils.change_feed.
+LISTING_CHANGES_CHANNEL = 'listing_changes'
+
+_OP_PRECEDENCE = {UPDATED: 0, CREATED: 1, DELETED: 2}
+
+# Listing fields the similarity model reads (see app.utils.similar)
+_SIMILARITY_FIELDS = ('title', 'description', 'category', 'status')
+
+
+def _listing_changes(session):
+    """{listing_id: op} for listings touched by this flush, including via their images."""
+    changes = {}
+
+    def record(listing_id, op):
+        if _OP_PRECEDENCE[op] >= _OP_PRECEDENCE.get(changes.get(listing_id), -1):
+            changes[listing_id] = op
+
+    for obj, op in ([(obj, CREATED) for obj in session.new]
+                    + [(obj, DELETED) for obj in session.deleted]
+                    + [(obj, UPDATED) for obj in session.dirty]):
+        if not isinstance(obj, (Listing, ListingImage)):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Listing):
+            record(obj.id, op)
+        else:
+            record(obj.listing_id, UPDATED)
+    return changes
+
+
+def _stored_values(session, listing):
+    """Facet field values of `listing` as they are in the database right now."""
+    state = inspect(listing)
+    values = {}
+    for field in FACET_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        elif history.unchanged:
+            values[field] = history.unchanged[0]
+        else:
+            # Not loaded (e.g. expired after a commit): read the row before it changes
+            columns = [getattr(Listing, name) for name in FACET_FIELDS]
+            row = session.connection().execute(
+                select(*columns).where(Listing.id == state.identity[0])).one()
+            return row._asdict()
+    return values
+
+
+@event.listens_for(Session, 'before_flush')
+def _record_old_facet_cells(session, flush_context, instances):
+    deltas = session.info.setdefault('facet_deltas', {})
+    old_prices = session.info.setdefault('old_prices', {})
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Listing) or inspect(obj).identity is None:
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        values = _stored_values(session, obj)
+        cell = facet_cell(values['status'], values['category'], values['condition'], values['price'])
+        deltas[cell] = deltas.get(cell, 0) - 1
+        old_prices[obj] = (price_cell(values['status'], values['category'], values['condition']),
+                           values['price'])
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_facet_deltas(session, flush_context):
+    deltas = session.info.pop('facet_deltas', {})
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Listing):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        cell = facet_cell(obj.status, obj.category, obj.condition, obj.price)
+        deltas[cell] = deltas.get(cell, 0) + 1
+    apply_facet_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_price_deltas(session, flush_context):
+    # Only listings whose sketch cell or price moved touch a digest: removal
+    # from a t-digest is approximate, so a title edit should not churn it
+    old_prices = session.info.pop('old_prices', {})
+    deltas = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Listing):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        new = (price_cell(obj.status, obj.category, obj.condition), obj.price)
+        old = old_prices.pop(obj, None)
+        if old == new:
+            continue
+        if old is not None:
+            deltas.setdefault(old[0], []).append((old[1], -1))
+        deltas.setdefault(new[0], []).append((new[1], 1))
+    for cell, price in old_prices.values():  # deleted listings
+        deltas.setdefault(cell, []).append((price, -1))
+    apply_price_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_facet_deltas(session, previous_transaction):
+    session.info.pop('facet_deltas', None)
+    session.info.pop('old_prices', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _queue_similarity_refresh(session, flush_context):
+    listing_ids = {obj.id for obj in list(session.new) + list(session.deleted) if isinstance(obj, Listing)}
+    for obj in session.dirty:
+        if isinstance(obj, Listing) and any(
+                inspect(obj).attrs[field].history.has_changes() for field in _SIMILARITY_FIELDS):
+            listing_ids.add(obj.id)
+    if listing_ids:
+        session.connection().execute(SimilarityRefresh.__table__.insert(),
+                                     [{'listing_id': listing_id} for listing_id in sorted(listing_ids)])
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_listings_version(session, flush_context):
+    changes = _listing_changes(session)
+    if not changes:
+        return
+    connection = session.connection()
+    version = connection.execute(
+        ListingsVersion.__table__.update()
+        .where(ListingsVersion.id == 1)
+        .values(version=ListingsVersion.version + 1, updated_at=datetime.utcnow())
+        .returning(ListingsVersion.version)
+    ).scalar()
+    # Appended while holding the listings_version row lock, so change ids
+    # become visible in id order and a sync cursor never skips a late commit
+    record_listing_changes(connection, version, changes)
+    if connection.dialect.name == 'postgresql':
+        # Delivered to listeners only if and when this transaction commits
+        changed = ','.join(changes[listing_id] + str(listing_id) for listing_id in sorted(changes))
+        payload = f'{version}:{changed}'
+        if len(payload) > 7900:
+            payload = f'{version}:*'  # over NOTIFY's 8000-byte limit: listeners reload everything
+        connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                           {'channel': LISTING_CHANGES_CHANNEL, 'payload': payload})
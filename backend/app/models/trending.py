@@ -0,0 +1,73 @@
+import math
+from datetime import datetime
+from .listing import Listing
+
+# Trending scores are log(sum(exp((hearted_at - TRENDING_EPOCH) / tau))) over a
+# listing's hearts, tau being the decay time constant. Every listing's decayed
+# heart total shrinks by the same factor as time passes, so ordering by the
+# stored score is ordering by current heart velocity, and a heart only ever
+# changes its own listing's score. Working in log space keeps the numbers
+# small however far from the epoch we get.
+TRENDING_EPOCH = datetime(2025, 1, 1)
+
+
+def heart_weight(hearted_at, half_life_hours):
+    """log-space weight of a heart given at `hearted_at`."""
+    tau = half_life_hours * 3600 / math.log(2)
+    return (hearted_at - TRENDING_EPOCH).total_seconds() / tau
+
+
+def log_add(score, weight):
+    """log(exp(score) + exp(weight)), with None as log(0)."""
+    if score is None:
+        return weight
+    high, low = max(score, weight), min(score, weight)
+    return high + math.log1p(math.exp(low - high))
+
+
+def log_subtract(score, weight):
+    """log(exp(score) - exp(weight)), or None once nothing measurable is left."""
+    if score is None or weight >= score:
+        return None
+    remainder = -math.expm1(weight - score)
+    if remainder < 1e-12:
+        return None
+    return score + math.log(remainder)
+
+
+def _adjust(session, listing_id, hearted_at, half_life_hours, added):
+    # Row-locked read-modify-write; a plain UPDATE so the heart counter does
+    # not count as a listing edit (updated_at, listings_version, change log)
+    row = (session.query(Listing.heart_count, Listing.trending_score)
+           .filter(Listing.id == listing_id)
+           .with_for_update()
+           .one())
+    weight = heart_weight(hearted_at, half_life_hours)
+    if added:
+        heart_count, score = row.heart_count + 1, log_add(row.trending_score, weight)
+    else:
+        heart_count = max(0, row.heart_count - 1)
+        score = log_subtract(row.trending_score, weight) if heart_count else None
+    session.execute(Listing.__table__.update()
+                    .where(Listing.id == listing_id)
+                    .values(heart_count=heart_count, trending_score=score,
+                            updated_at=Listing.updated_at))
+
+
+def record_heart(session, listing_id, hearted_at, half_life_hours):
+    _adjust(session, listing_id, hearted_at, half_life_hours, added=True)
+
+
+def remove_heart(session, listing_id, hearted_at, half_life_hours):
+    _adjust(session, listing_id, hearted_at, half_life_hours, added=False)
+
+
+def trending_listings(query, limit):
+    """`query` (listing rows) narrowed to the top `limit` available listings by trending score.
+
+    Walks ix_listings_status_trending_score_id backwards, so the cost is
+    `limit` index entries whatever the number of hearts.
+    """
+    return (query.filter(Listing.status == 'available', Listing.trending_score.isnot(None))
+            .order_by(Listing.trending_score.desc(), Listing.id.desc())
+            .limit(limit))
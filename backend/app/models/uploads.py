@@ -0,0 +1,86 @@
+from datetime import datetime
+from ..extensions import db
+
+# Upload job states
+QUEUED, PROCESSING, DONE, FAILED = 'queued', 'processing', 'done', 'failed'
+
+
+class UploadJob(db.Model):
+    """A batch of images accepted by /api/listing/upload, processed in the background.
+
+    The files wait in the upload spool (LISTING_UPLOAD_SPOOL/<id>/<index>)
+    until a worker claims the job by moving it from queued to processing;
+    `results` then holds one {'url'} or {'error'} per file, in upload
+    order. A job is done when at least one file was stored, failed when
+    none was. `digests` are the files' SHA-256 hex digests, taken while
+    spooling.
+    """
+    __tablename__ = 'upload_jobs'
+    __table_args__ = (
+        # Workers claim the oldest queued jobs first
+        db.Index('ix_upload_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    filenames = db.Column(db.JSON, nullable=False)
+    digests = db.Column(db.JSON)
+    results = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.finished:
+            data['urls'] = [result['url'] for result in self.results if 'url' in result]
+            data['failed'] = [{'index': index, 'filename': filename, 'error': result['error']}
+                              for index, (filename, result) in enumerate(zip(self.filenames, self.results))
+                              if 'error' in result]
+        return data
+
+    def __repr__(self):
+        return f'<UploadJob {self.id} {self.status}>'
+
+
+class StoredImage(db.Model):
+    """Where the photo made from an uploaded file is stored, by the file's SHA-256.
+
+    Uploading a file seen before (e.g. a listing's photos sent again when
+    it is edited) reuses this URL instead of processing and storing it
+    again. Entries outlive changes to the LISTING_IMAGE_* settings.
+    `thumbnail` and `srcset` describe the smaller variants stored beside
+    the photo; listings pick them up by `url` when they are saved.
+    """
+    __tablename__ = 'stored_images'
+    __table_args__ = (
+        db.Index('ix_stored_images_url', 'url'),
+    )
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    url = db.Column(db.String(255), nullable=False)
+    thumbnail = db.Column(db.String(255))
+    srcset = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredImage {self.sha256} {self.url}>'
+
+
+def stored_variants(session, urls):
+    """{url: (thumbnail, srcset)} for the photos among `urls` that have variants."""
+    if not urls:
+        return {}
+    rows = session.execute(
+        db.select(StoredImage.url, StoredImage.thumbnail, StoredImage.srcset)
+        .where(StoredImage.url.in_(set(urls)), StoredImage.thumbnail.isnot(None)))
+    return {url: (thumbnail, srcset) for url, thumbnail, srcset in rows}
@@ -1,16 +1,33 @@
-from flask import Blueprint, request, jsonify, current_app, session
+from flask import Blueprint, Response, request, jsonify, current_app, session, url_for, send_from_directory, abort
 from werkzeug.utils import secure_filename
 import os
 from ..extensions import db, mail
-from ..models import Listing, ListingImage, User, HeartedListing
+from ..models import (Listing, ListingImage, User, HeartedListing, ListingsVersion,
+                      ListingChangeHorizon, ListingSimilarity, ListingRecommendation, facet_counts,
+                      price_suggestion, search_listings, trending_listings)
+from ..models.uploads import stored_variants
+from ..models.hearts import add_heart, delete_heart
+from ..models.changes import DELETED, listing_changes_since
 from datetime import datetime
 from sqlalchemy import and_, or_
 from flask_mail import Message
-from ..utils.cloudinary_config import upload_image
+from ..utils.uploads import spool_upload, wait_for_job, image_options, process_upload
+from ..utils.storage import LocalStorage
+from ..models.listing import CATEGORIES
+from ..signals import listing_saved, listing_deleted
+from ..utils.suggest import get_suggest_index, suggest_categories
+from ..utils.conditional import conditional, feed_etag
+from ..utils.serializers import (ListingView, InvalidFields, listing_rows, serialize_rows,
+                                 project, json_response, streamed_json_response)
+from ..utils.change_feed import get_change_feed
+from ..utils.feed_store import get_feed_store
+from ..utils.listing_events import InvalidEventId
+from ..utils.pagination import parse_page_args, paginate, estimate_count, InvalidCursor
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from functools import wraps
 import base64
+import hashlib
 import io
-from PIL import Image
 import json
 
 bp = Blueprint('listing', __name__)
@@ -25,8 +42,112 @@ if not os.path.exists(UPLOAD_FOLDER):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def apply_listing_filters(query, args):
+    """Apply the feed's max_price/category/status query-string filters."""
+    max_price = args.get('max_price', type=float)
+    category = args.get('category')
+    status = args.get('status')
+
+    if max_price:
+        query = query.filter(Listing.price <= max_price)
+    if category:
+        query = query.filter(db.func.lower(Listing.category) == category.lower())
+    if status:
+        query = query.filter(Listing.status == status)
+    return query
+
+def feed_validators(*args, **kwargs):
+    """Validators for collection endpoints: any listing write changes them."""
+    version = ListingsVersion.current()
+    if version is None:
+        return None, None
+    etag = feed_etag(version.version, request.path, sorted(request.args.items(multi=True)))
+    return etag, version.updated_at
+
+def store_feed_validators(*args, **kwargs):
+    """Feed validators, taken from the in-memory store when it will answer.
+
+    The ETag embeds the listings version the store has caught up to, so it
+    matches what a database-served response would carry at that version.
+    """
+    store = get_feed_store(current_app, request.args)
+    if store is None:
+        return feed_validators()
+    etag = feed_etag(store.version, request.path, sorted(request.args.items(multi=True)))
+    return etag, None
+
+def listing_validators(id):
+    """Validators for one listing, read from its updated_at alone."""
+    row = db.session.query(Listing.updated_at).filter(Listing.id == id).first()
+    if row is None or row.updated_at is None:
+        return None, None
+    return f'{id}-{row.updated_at.timestamp():.6f}', row.updated_at
+
+def with_listing_view(seller=False, detail=False):
+    """Pass the view's ?fields=/?include= selection in as `listing_view`."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                listing_view = ListingView.from_args(request.args, seller=seller, detail=detail)
+            except InvalidFields as e:
+                return jsonify({'error': f'Unknown fields: {e}'}), 400
+            return view(*args, listing_view=listing_view, **kwargs)
+        return wrapper
+    return decorator
+
+def listing_page_response(query, listing_view):
+    """Serialize listing rows newest first, paginated when the client asks for it.
+
+    Without `limit`/`cursor` the full list is returned as a plain array, as
+    before, streamed in batches so memory does not grow with the catalogue.
+    With them the response is an envelope holding one keyset page, the
+    opaque cursor for the next page and a cheap total estimate.
+    """
+    try:
+        limit, cursor = parse_page_args(request.args)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    if limit is None:
+        return streamed_json_response(
+            query.order_by(Listing.created_at.desc(), Listing.id.desc()),
+            listing_view, current_app.config['LISTING_STREAM_BATCH_SIZE'])
+
+    rows, next_cursor = paginate(query, Listing.created_at, Listing.id, limit, cursor)
+    return json_response({
+        'listings': serialize_rows(rows, listing_view),
+        'next_cursor': next_cursor,
+        'total_estimate': estimate_count(db.session, query)
+    })
+
+def feed_store_response(store, listing_view):
+    """listing_page_response() for the feed, answered from the in-memory store."""
+    try:
+        limit, cursor = parse_page_args(request.args)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    payloads, next_cursor, total = store.page(
+        category=request.args.get('category'),
+        max_price=request.args.get('max_price', type=float),
+        limit=limit, cursor=cursor)
+    payloads = [project(payload, listing_view) for payload in payloads]
+    if limit is None:
+        return json_response(payloads)
+    return json_response({
+        'listings': payloads,
+        'next_cursor': next_cursor,
+        'total_estimate': total
+    })
+
 @bp.route('/upload', methods=['POST'])
 def upload_images():
+    """Accept images for upload and return a job id right away (202).
+
+    The files are spooled to disk and processed in the background; poll
+    /api/listing/upload/<job_id> for the URLs.
+    """
     try:
         current_app.logger.info("Starting image upload process...")
         
@@ -38,31 +159,47 @@ def upload_images():
             current_app.logger.warning("No images provided in request")
             return jsonify({'error': 'No images provided'}), 400
 
-        image_urls = []
         for file in files:
-            current_app.logger.info(f"Processing file: {file.filename}")
-            if file and allowed_file(file.filename):
-                try:
-                    # Upload to Cloudinary using our utility function
-                    current_app.logger.info(f"Uploading {file.filename} to Cloudinary...")
-                    upload_result = upload_image(file)
-                    secure_url = upload_result['secure_url']
-                    current_app.logger.info(f"Upload successful, URL: {secure_url}")
-                    image_urls.append(secure_url)
-                except Exception as upload_error:
-                    current_app.logger.error(f"Failed to upload {file.filename}: {str(upload_error)}")
-                    raise upload_error
-            else:
+            if not (file and allowed_file(file.filename)):
                 current_app.logger.warning(f"Invalid file type for {file.filename}")
                 return jsonify({'error': f'Invalid file type for {file.filename}'}), 400
-        
-        current_app.logger.info(f"Successfully uploaded {len(image_urls)} images")
-        return jsonify({'urls': image_urls}), 200
+
+        job = spool_upload(current_app._get_current_object(), [(file.filename, file.stream) for file in files])
+        current_app.logger.info(f"Queued {len(files)} images as upload job {job.id}")
+        response = jsonify({'job_id': job.id, 'status': job.status,
+                            'status_url': url_for('listing.get_upload_job', job_id=job.id)})
+        return response, 202
     except Exception as e:
         current_app.logger.error(f"Error uploading images: {str(e)}")
         current_app.logger.exception("Full traceback:")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/upload/<job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    """An upload job's status; its URLs (in upload order) and failures once finished.
+
+    ?wait=N holds the request for up to N seconds (at most 30) until the
+    job finishes.
+    """
+    try:
+        wait = max(0.0, min(request.args.get('wait', 0, type=float), 30.0))
+        job = wait_for_job(current_app._get_current_object(), job_id, wait)
+        if job is None:
+            return jsonify({'error': 'Upload job not found'}), 404
+        return jsonify(job.to_dict())
+    except Exception as e:
+        current_app.logger.error(f"Error fetching upload job: {str(e)}")
+        return jsonify({'error': 'Failed to fetch upload job'}), 500
+
+@bp.route('/images/<path:name>', methods=['GET'])
+def get_stored_image(name):
+    """A photo kept by the local image storage (LISTING_IMAGE_STORAGE = 'local')."""
+    storage = current_app.extensions['image_storage']
+    if not isinstance(storage, LocalStorage):
+        abort(404)
+    # Named by content hash, so never changes
+    return send_from_directory(storage.root, name, max_age=365 * 24 * 3600)
+
 @bp.route('/test-upload', methods=['POST'])
 def test_upload():
     try:
@@ -73,24 +210,17 @@ def test_upload():
 
         # Convert base64 to image file
         image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Save to a temporary BytesIO object
-        temp_buffer = io.BytesIO()
-        image.save(temp_buffer, format='JPEG')
-        temp_buffer.seek(0)
 
-        # Upload to Cloudinary using our utility function
-        upload_result = upload_image(temp_buffer)
+        # Store it and its variants under its content hash, like /upload does
+        key = hashlib.sha256(image_bytes).hexdigest()
+        stored = process_upload(current_app.extensions['image_storage'], key, 'test-upload',
+                                io.BytesIO(image_bytes), image_options(current_app.config))
         
         return jsonify({
             'message': 'Image uploaded successfully',
-            'url': upload_result['secure_url'],
-            'public_id': upload_result['public_id']
+            'url': stored['url'],
+            'thumbnail': stored['thumbnail'],
+            'public_id': key
         }), 200
 
     except Exception as e:
@@ -98,41 +228,74 @@ def test_upload():
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/', methods=['GET'])
-def get_listings():
+@conditional(store_feed_validators)
+@with_listing_view()
+def get_listings(listing_view):
     try:
-        # Get query parameters for filtering
-        max_price = request.args.get('max_price', type=float)
-        category = request.args.get('category')
-        
-        # Start with base query
-        query = Listing.query
-        
-        # Apply filters if they exist
-        if max_price:
-            query = query.filter(Listing.price <= max_price)
-        if category:
-            query = query.filter(Listing.category.ilike(category))
-            
-        # Get all listings
-        listings = query.order_by(Listing.created_at.desc()).all()
+        # The store keeps list payloads, which have no srcset
+        store = None if listing_view.srcset else get_feed_store(current_app, request.args)
+        if store is not None:
+            return feed_store_response(store, listing_view)
+
+        # Start with base query and apply filters if they exist
+        query = apply_listing_filters(listing_rows(listing_view), request.args)
         
         # Convert to dictionary format
-        return jsonify([{
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images],  # Include image URLs
-            'condition': listing.condition
-        } for listing in listings])
+        return listing_page_response(query, listing_view)
     except Exception as e:
         current_app.logger.error(f"Error fetching listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch listings'}), 500
 
+@bp.route('/search', methods=['GET'])
+@with_listing_view()
+def search(listing_view):
+    try:
+        text = request.args.get('q', '').strip()
+        if not text:
+            return jsonify({'error': 'Search query is required'}), 400
+
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        offset = max(0, request.args.get('offset', 0, type=int))
+
+        query = search_listings(apply_listing_filters(listing_rows(listing_view), request.args), text)
+        if query is None:
+            return jsonify([])
+
+        rows = query.offset(offset).limit(limit).all()
+        return json_response(serialize_rows(rows, listing_view))
+    except Exception as e:
+        current_app.logger.error(f"Error searching listings: {str(e)}")
+        return jsonify({'error': 'Failed to search listings'}), 500
+
+@bp.route('/suggest', methods=['GET'])
+def suggest():
+    try:
+        prefix = request.args.get('prefix', '')
+        limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+        index = get_suggest_index(current_app._get_current_object())
+        return jsonify({
+            'categories': suggest_categories(prefix),
+            'listings': index.suggest(prefix, limit)
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error suggesting listings: {str(e)}")
+        return jsonify({'error': 'Failed to suggest listings'}), 500
+
+@bp.route('/stream', methods=['GET'])
+def stream_listing_events():
+    """Server-Sent Events feed of listing creates, updates and deletes."""
+    events = current_app.extensions['listing_events']
+    get_change_feed(current_app)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        body = events.subscribe(last_event_id, current_app.config['LISTING_EVENTS_HEARTBEAT'])
+    except InvalidEventId:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @bp.route('', methods=['POST'])
 def create_listing():
     try:
@@ -178,23 +341,15 @@ def create_listing():
 
             # Handle images if provided
             if images:
+                variants = stored_variants(db.session, images)
                 for url in images:
-                    image = ListingImage(filename=url, listing_id=new_listing.id)
+                    image = ListingImage(url, new_listing.id, *variants.get(url, (None, None)))
                     db.session.add(image)
                 db.session.commit()
 
-            return jsonify({
-                'id': new_listing.id,
-                'title': new_listing.title,
-                'description': new_listing.description,
-                'price': new_listing.price,
-                'category': new_listing.category,
-                'status': new_listing.status,
-                'user_id': new_listing.user_id,
-                'images': [image.filename for image in new_listing.images],
-                'condition': new_listing.condition,
-                'created_at': new_listing.created_at.isoformat() if new_listing.created_at else None
-            }), 201
+            listing_saved.send(current_app._get_current_object(), listing=new_listing)
+
+            return json_response(new_listing.to_dict(), 201)
 
         except Exception as db_error:
             db.session.rollback()
@@ -207,14 +362,148 @@ def create_listing():
 
 @bp.route('/categories', methods=['GET'])
 def get_categories():
-    categories = [
-        'tops', 'bottoms', 'dresses', 'shoes',
-        'furniture', 'appliances', 'books', 'other'
-    ]
-    return jsonify(categories)
+    return jsonify(CATEGORIES)
+
+@bp.route('/batch', methods=['GET'])
+@conditional(feed_validators)
+@with_listing_view()
+def get_listing_batch(listing_view):
+    try:
+        try:
+            ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return jsonify({'error': 'ids is required'}), 400
+        if len(ids) > current_app.config['LISTING_BATCH_MAX_IDS']:
+            return jsonify({
+                'error': f"At most {current_app.config['LISTING_BATCH_MAX_IDS']} ids per request"
+            }), 400
+
+        rows = listing_rows(listing_view).filter(Listing.id.in_(ids)).all()
+        payloads = {row.id: payload for row, payload in zip(rows, serialize_rows(rows, listing_view))}
+        return json_response({
+            'listings': [payloads[listing_id] for listing_id in ids if listing_id in payloads],
+            'missing': [listing_id for listing_id in ids if listing_id not in payloads]
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error fetching listing batch: {str(e)}")
+        return jsonify({'error': 'Failed to fetch listings'}), 500
+
+@bp.route('/changes', methods=['GET'])
+@with_listing_view()
+def get_listing_changes(listing_view):
+    """Listings upserted and deleted since a sync cursor.
+
+    Start with no `since` for a full sync, then pass back the returned
+    `cursor` (looping while `has_more`). A 410 means the cursor predates the
+    retained tombstones and the client must sync from scratch.
+    """
+    try:
+        since = request.args.get('since', '0')
+        if not since.isdigit():
+            return jsonify({'error': 'Invalid cursor'}), 400
+        since = int(since)
+        limit = max(1, min(request.args.get('limit', 500, type=int), 1000))
+
+        if since and since < ListingChangeHorizon.current().change_id:
+            return jsonify({'error': 'Cursor expired; sync again without since', 'reset': True}), 410
+
+        changes, has_more = listing_changes_since(since, limit)
+        latest = {}
+        for change in changes:
+            latest.pop(change.listing_id, None)
+            latest[change.listing_id] = change.op
+
+        upsert_ids = [listing_id for listing_id, op in latest.items() if op != DELETED]
+        rows = listing_rows(listing_view).filter(Listing.id.in_(upsert_ids)).all() if upsert_ids else []
+        upserts = serialize_rows(rows, listing_view)
+        found = {row.id for row in rows}
+        return json_response({
+            'upserts': upserts,
+            # Deleted, or deleted after this page was logged (its tombstone follows)
+            'tombstones': [listing_id for listing_id in latest if listing_id not in found],
+            'cursor': str(changes[-1].id if changes else since),
+            'has_more': has_more
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error fetching listing changes: {str(e)}")
+        return jsonify({'error': 'Failed to fetch listing changes'}), 500
+
+@bp.route('/trending', methods=['GET'])
+@with_listing_view()
+def get_trending_listings(listing_view):
+    """Available listings by time-decayed heart velocity, hottest first."""
+    try:
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        rows = trending_listings(listing_rows(listing_view), limit).all()
+        return json_response(serialize_rows(rows, listing_view))
+    except Exception as e:
+        current_app.logger.error(f"Error fetching trending listings: {str(e)}")
+        return jsonify({'error': 'Failed to fetch trending listings'}), 500
+
+@bp.route('/recommended', methods=['GET'])
+@jwt_required()
+@with_listing_view()
+def get_recommended_listings(listing_view):
+    """The current user's recommendations from heart co-occurrence, best first.
+
+    Read from the list `flask listings build-recommendations` stored for
+    them; users with no hearts yet (or no list yet) get trending listings.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        if not current_user_id:
+            return jsonify({'error': 'User not authenticated'}), 401
+        limit = max(1, min(request.args.get('limit', current_app.config['RECOMMENDATIONS_PER_USER'], type=int),
+                           current_app.config['RECOMMENDATIONS_PER_USER']))
+        rows = (listing_rows(listing_view)
+                .join(ListingRecommendation, ListingRecommendation.listing_id == Listing.id)
+                .filter(ListingRecommendation.user_id == int(current_user_id), Listing.status == 'available')
+                .order_by(ListingRecommendation.rank)
+                .limit(limit)
+                .all())
+        if not rows:
+            rows = trending_listings(listing_rows(listing_view), limit).all()
+        return json_response(serialize_rows(rows, listing_view))
+    except Exception as e:
+        current_app.logger.error(f"Error fetching recommended listings: {str(e)}")
+        return jsonify({'error': 'Failed to fetch recommended listings'}), 500
+
+@bp.route('/facets', methods=['GET'])
+@conditional(feed_validators)
+def get_facets():
+    try:
+        return jsonify(facet_counts(
+            status=request.args.get('status'),
+            category=request.args.get('category'),
+            condition=request.args.get('condition'),
+            max_price=request.args.get('max_price', type=float)
+        ))
+    except Exception as e:
+        current_app.logger.error(f"Error fetching facets: {str(e)}")
+        return jsonify({'error': 'Failed to fetch facets'}), 500
+
+@bp.route('/price-suggestion', methods=['GET'])
+@conditional(feed_validators)
+def get_price_suggestion():
+    """Asking and sold price ranges for a category (and condition), read from price sketches."""
+    try:
+        category = request.args.get('category')
+        if not category:
+            return jsonify({'error': 'category is required'}), 400
+        condition = request.args.get('condition')
+        suggestion = price_suggestion(category, condition)
+        return jsonify({'category': category, 'condition': condition, **suggestion})
+    except Exception as e:
+        current_app.logger.error(f"Error fetching price suggestion: {str(e)}")
+        return jsonify({'error': 'Failed to fetch price suggestion'}), 500
 
 @bp.route('/user', methods=['GET'])
-def get_user_listings():
+@conditional(feed_validators)
+@with_listing_view()
+def get_user_listings(listing_view):
     try:
         # Get the netid from the query parameters
         netid = request.args.get('netid')
@@ -223,30 +512,20 @@ def get_user_listings():
             return jsonify({'error': 'NetID is required'}), 400
             
         # Get all listings for this user by joining with users table
-        listings = (Listing.query
-                   .join(User, Listing.user_id == User.id)
-                   .filter(User.netid == netid)
-                   .order_by(Listing.created_at.desc())
-                   .all())
+        query = (listing_rows(listing_view)
+                 .join(User, Listing.user_id == User.id)
+                 .filter(User.netid == netid))
         
         # Convert to dictionary format
-        return jsonify([{
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images]
-        } for listing in listings])
+        return listing_page_response(query, listing_view)
     except Exception as e:
         current_app.logger.error(f"Error fetching user listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch user listings'}), 500
 
 @bp.route('/buyer', methods=['GET'])
-def get_buyer_listings():
+@conditional(feed_validators)
+@with_listing_view()
+def get_buyer_listings(listing_view):
     try:
         # Get the netid from the request parameters
         netid = request.args.get('netid')
@@ -259,22 +538,10 @@ def get_buyer_listings():
             return jsonify({'error': 'User not found'}), 404
             
         # Query for listings where the user is the buyer
-        listings = Listing.query.filter_by(buyer_id=user.id).order_by(Listing.created_at.desc()).all()
+        query = listing_rows(listing_view).filter(Listing.buyer_id == user.id)
         
         # Convert to dictionary format
-        return jsonify([{
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'buyer_id': listing.buyer_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images],
-            'condition': listing.condition
-        } for listing in listings])
+        return listing_page_response(query, listing_view)
     except Exception as e:
         current_app.logger.error(f"Error fetching buyer listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch buyer listings'}), 500
@@ -295,6 +562,7 @@ def request_to_buy(id):
     listing.buyer_id = buyer_id
     listing.status = 'pending'
     db.session.commit()
+    listing_saved.send(current_app._get_current_object(), listing=listing)
     
     # Get seller's email
     seller = User.query.get(listing.user_id)
@@ -341,6 +609,7 @@ def update_listing_status(id):
             
         listing.status = data['status']
         db.session.commit()
+        listing_saved.send(current_app._get_current_object(), listing=listing)
         
         return jsonify({
             'id': listing.id,
@@ -367,31 +636,41 @@ def delete_listing(id):
     
     db.session.delete(listing)
     db.session.commit()
+    listing_deleted.send(current_app._get_current_object(), listing_id=id)
     
     return '', 204
 
 @bp.route('/<int:id>', methods=['GET'])
-def get_single_listing(id):
+@conditional(listing_validators)
+@with_listing_view(seller=True, detail=True)
+def get_single_listing(id, listing_view):
     try:
-        listing = Listing.query.get_or_404(id)
-        user = User.query.get(listing.user_id)
-        return jsonify({
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'user_netid': user.netid if user else None,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images],
-            'condition': listing.condition
-        })
+        row = listing_rows(listing_view).filter(Listing.id == id).first()
+        if row is None:
+            return jsonify({'error': 'Listing not found'}), 404
+        return json_response(serialize_rows([row], listing_view)[0])
     except Exception as e:
         current_app.logger.error(f"Error fetching listing {id}: {str(e)}")
         return jsonify({'error': 'Failed to fetch listing'}), 500
 
+@bp.route('/<int:id>/similar', methods=['GET'])
+@with_listing_view()
+def get_similar_listings(id, listing_view):
+    """Available listings most like this one, from its precomputed neighbour list."""
+    try:
+        limit = max(1, min(request.args.get('limit', current_app.config['SIMILAR_LISTINGS_K'], type=int),
+                           current_app.config['SIMILAR_LISTINGS_K']))
+        rows = (listing_rows(listing_view)
+                .join(ListingSimilarity, ListingSimilarity.similar_id == Listing.id)
+                .filter(ListingSimilarity.listing_id == id, Listing.status == 'available')
+                .order_by(ListingSimilarity.rank)
+                .limit(limit)
+                .all())
+        return json_response(serialize_rows(rows, listing_view))
+    except Exception as e:
+        current_app.logger.error(f"Error fetching similar listings: {str(e)}")
+        return jsonify({'error': 'Failed to fetch similar listings'}), 500
+
 @bp.route('/<int:id>/notify', methods=['POST'])
 def notify_seller(id):
     try:
@@ -472,13 +751,16 @@ def update_listing(id):
         if 'category' in data:
             listing.category = data['category']
         if 'images' in data:
+            # Replacing images must still count as a change to the listing
+            listing.updated_at = datetime.utcnow()
             # Clear existing images
             ListingImage.query.filter_by(listing_id=listing.id).delete()
             # Add new images
             try:
                 image_urls = json.loads(data['images']) if isinstance(data['images'], str) else data['images']
+                variants = stored_variants(db.session, image_urls)
                 for image_url in image_urls:
-                    image = ListingImage(filename=image_url, listing_id=listing.id)
+                    image = ListingImage(image_url, listing.id, *variants.get(image_url, (None, None)))
                     db.session.add(image)
             except json.JSONDecodeError:
                 current_app.logger.error("Failed to parse image URLs")
@@ -487,18 +769,9 @@ def update_listing(id):
             listing.condition = data['condition']
         
         db.session.commit()
+        listing_saved.send(current_app._get_current_object(), listing=listing)
         
-        return jsonify({
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images]
-        })
+        return json_response(listing.to_dict())
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error updating listing: {str(e)}")
@@ -512,25 +785,16 @@ def heart_listing(id):
         if not current_user_id:
             return jsonify({'error': 'User not authenticated'}), 401
 
-        listing = Listing.query.get_or_404(id)
-        if listing.status != 'available':
-            return jsonify({'error': 'Listing is not available'}), 400
-
-        # Check if already hearted
-        existing_heart = HeartedListing.query.filter_by(
-            user_id=current_user_id,
-            listing_id=id
-        ).first()
-
-        if existing_heart:
-            return jsonify({'error': 'Listing already hearted'}), 400
-
-        hearted_listing = HeartedListing(
-            user_id=current_user_id,
-            listing_id=id
-        )
-        db.session.add(hearted_listing)
+        added = add_heart(db.session, current_user_id, id, current_app.config['TRENDING_HALF_LIFE_HOURS'])
         db.session.commit()
+        if not added:
+            # Nothing inserted: already hearted (fine, hearting is idempotent),
+            # or there is no available listing to heart
+            status = db.session.query(Listing.status).filter(Listing.id == id).scalar()
+            if status is None:
+                return jsonify({'error': 'Listing not found'}), 404
+            if status != 'available':
+                return jsonify({'error': 'Listing is not available'}), 400
 
         return jsonify({'message': 'Listing hearted successfully'}), 200
     except Exception as e:
@@ -546,33 +810,63 @@ def unheart_listing(id):
         if not current_user_id:
             return jsonify({'error': 'User not authenticated'}), 401
 
-        hearted_listing = HeartedListing.query.filter_by(
-            user_id=current_user_id,
-            listing_id=id
-        ).first_or_404()
-
-        db.session.delete(hearted_listing)
+        # Idempotent: unhearting something not hearted is not an error
+        delete_heart(db.session, current_user_id, id, current_app.config['TRENDING_HALF_LIFE_HOURS'])
         db.session.commit()
 
         return jsonify({'message': 'Listing unhearted successfully'}), 200
     except Exception as e:
         current_app.logger.error(f"Error unhearting listing: {str(e)}")
+        db.session.rollback()
         return jsonify({'error': 'Failed to unheart listing'}), 500
 
+@bp.route('/hearted/ids', methods=['GET'])
+@jwt_required()
+def get_hearted_listing_ids():
+    """The current user's hearted listing ids, ascending, for marking hearts in a grid.
+
+    Read from the (user_id, listing_id) index alone. ?encoding=delta sends
+    the first id followed by the gaps between consecutive ids, which stays
+    small however large the ids get. The ETag covers the id list, so an
+    unchanged list is answered with an empty 304.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        if not current_user_id:
+            return jsonify({'error': 'User not authenticated'}), 401
+        encoding = request.args.get('encoding', 'plain')
+        if encoding not in ('plain', 'delta'):
+            return jsonify({'error': 'encoding must be plain or delta'}), 400
+
+        ids = [listing_id for listing_id, in db.session.query(HeartedListing.listing_id)
+               .filter(HeartedListing.user_id == current_user_id)
+               .order_by(HeartedListing.listing_id)]
+        if encoding == 'delta':
+            ids = [listing_id - previous for previous, listing_id in zip([0] + ids, ids)]
+
+        response = json_response({'encoding': encoding, 'ids': ids})
+        response.set_etag(feed_etag(len(ids), current_user_id, encoding, ids))
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching hearted listing ids: {str(e)}")
+        return jsonify({'error': 'Failed to fetch hearted listings'}), 500
+
 @bp.route('/hearted', methods=['GET'])
 @jwt_required()
-def get_hearted_listings():
+@with_listing_view()
+def get_hearted_listings(listing_view):
     try:
         current_user_id = get_jwt_identity()
         if not current_user_id:
             return jsonify({'error': 'User not authenticated'}), 401
 
-        hearted_listings = HeartedListing.query.filter_by(user_id=current_user_id).all()
-        listing_ids = [hl.listing_id for hl in hearted_listings]
-        
-        listings = Listing.query.filter(Listing.id.in_(listing_ids)).all()
+        hearted_ids = (db.session.query(HeartedListing.listing_id)
+                       .filter(HeartedListing.user_id == current_user_id))
+        query = listing_rows(listing_view).filter(Listing.id.in_(hearted_ids.scalar_subquery()))
         
-        return jsonify([listing.to_dict() for listing in listings]), 200
+        return listing_page_response(query, listing_view)
     except Exception as e:
         current_app.logger.error(f"Error fetching hearted listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch hearted listings'}), 500
@@ -0,0 +1,8 @@
+from blinker import Namespace
+
+# Sent by the listing routes after a listing change has been committed, so
+# in-process read models (search suggestions, caches) can update themselves.
+_signals = Namespace()
+
+listing_saved = _signals.signal('listing-saved')
+listing_deleted = _signals.signal('listing-deleted')
@@ -0,0 +1,157 @@
+import logging
+import select
+import threading
+import time
+from ..extensions import db
+from ..models import Listing, ListingsVersion
+from ..models.tracking import LISTING_CHANGES_CHANNEL
+from .serializers import listing_rows, serialize_rows
+
+logger = logging.getLogger(__name__)
+
+
+def parse_notification(payload):
+    """Decode a listing_changes NOTIFY payload into (version, {listing_id: op}).
+
+    The changes are None when the writer could not name them ("<version>:*").
+    """
+    version, _, changed = payload.partition(':')
+    if changed == '*':
+        return int(version), None
+    changes = {}
+    for item in changed.split(','):
+        changes[int(item[1:])] = item[0]
+    return int(version), changes
+
+
+class ChangeFeed:
+    """The worker's single database change listener, fanned out to in-process subscribers.
+
+    On PostgreSQL a background thread LISTENs on a dedicated connection for
+    the NOTIFY every committed listing write sends, reads the changed
+    listings once and hands them to each subscriber. On SQLite, which has no
+    notifications, it polls listings_version and asks subscribers to resync
+    whenever it moves.
+
+    Subscribers implement:
+
+    - reset(version): start over from the database as of `version`
+    - changed(version, changes, payloads): `changes` is {listing_id: op} for
+      one listings version and `payloads` the current default-view payloads
+      of those listings that still exist (any status)
+    - stale(): the feed lost its connection, so changes may be missed until
+      the next reset
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.version = None
+        self._thread = None
+
+    def subscribe(self, subscriber):
+        self.subscribers.append(subscriber)
+
+    # -- dispatch (called with an app context) -------------------------
+
+    def reset(self):
+        """Resynchronise every subscriber from the database."""
+        version = ListingsVersion.current().version
+        for subscriber in self.subscribers:
+            subscriber.reset(version)
+        self.version = version
+
+    def receive(self, notifications):
+        """Apply a batch of NOTIFY payloads, in the order they were sent."""
+        batches = []
+        for payload in notifications:
+            version, changes = parse_notification(payload)
+            if changes is None:
+                self.reset()
+                batches = []
+            elif self.version is None or version > self.version:
+                # Older versions are already reflected in the last reset
+                batches.append((version, changes))
+        if not batches:
+            return
+        listing_ids = {listing_id for _, changes in batches for listing_id in changes}
+        # One read for the whole batch: every subscriber sees the latest state
+        rows = listing_rows().filter(Listing.id.in_(listing_ids)).all()
+        payloads = {payload['id']: payload for payload in serialize_rows(rows)}
+        for version, changes in batches:
+            current = [payloads[listing_id] for listing_id in sorted(changes) if listing_id in payloads]
+            for subscriber in self.subscribers:
+                subscriber.changed(version, changes, current)
+            self.version = version
+
+    def sync(self):
+        """Polling fallback: resynchronise if listings_version moved."""
+        if ListingsVersion.current().version != self.version:
+            self.reset()
+
+    # -- background thread ---------------------------------------------
+
+    def start(self):
+        """Start listening, once per worker."""
+        with self.lock:
+            if self._thread is not None or not self.app.config['LISTING_CHANGE_FEED_BACKGROUND']:
+                return
+            self._thread = threading.Thread(target=self._run, name='listing-change-feed', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    if db.engine.dialect.name == 'postgresql':
+                        self._listen()
+                    else:
+                        self._poll()
+            except Exception:
+                logger.exception('Listing change feed lost its connection; resynchronising')
+            self.version = None
+            for subscriber in self.subscribers:
+                subscriber.stale()
+            time.sleep(self.app.config['LISTING_CHANGE_FEED_RETRY_SECONDS'])
+
+    def _poll(self):
+        interval = self.app.config['LISTING_CHANGE_FEED_POLL_INTERVAL']
+        while True:
+            self.sync()
+            db.session.remove()
+            time.sleep(interval)
+
+    def _listen(self):
+        connection = db.engine.raw_connection()
+        connection.detach()  # held for the life of the thread, not returned to the pool
+        listener = connection.driver_connection
+        try:
+            listener.autocommit = True
+            listener.cursor().execute(f'LISTEN {LISTING_CHANGES_CHANNEL}')
+            # Subscribed before resetting, so nothing committed meanwhile is missed
+            self.reset()
+            db.session.remove()
+            while True:
+                if select.select([listener], [], [], 30) == ([], [], []):
+                    continue
+                listener.poll()
+                notifications = [notify.payload for notify in listener.notifies]
+                del listener.notifies[:]
+                if notifications:
+                    self.receive(notifications)
+                    db.session.remove()
+        finally:
+            connection.close()
+
+
+def init_change_feed(app):
+    feed = app.extensions['listing_change_feed'] = ChangeFeed(app)
+    return feed
+
+
+def get_change_feed(app):
+    """The worker's change feed, started on first use."""
+    feed = app.extensions['listing_change_feed']
+    feed.start()
+    return feed
@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import text
+from ..extensions import db
+from ..models.changes import compact_listing_changes
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_xact_lock key: one compaction at a time across workers
+_COMPACTION_LOCK = 0x6c636f6d
+
+
+def compact_change_log(app):
+    """Compact the listing change log once; returns (superseded, tombstones) removed.
+
+    Returns None when another process is already compacting.
+    """
+    retention = timedelta(days=app.config['LISTING_CHANGES_TOMBSTONE_DAYS'])
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            locked = db.session.execute(text('SELECT pg_try_advisory_xact_lock(:key)'),
+                                        {'key': _COMPACTION_LOCK}).scalar()
+            if not locked:
+                db.session.rollback()
+                return None
+        removed = compact_listing_changes(db.session, retention)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info('Compacted listing change log: %d superseded rows, %d tombstones', *removed)
+    return removed
+
+
+class ChangeLogCompactor:
+    """Background thread compacting the change log every LISTING_CHANGES_COMPACT_INTERVAL seconds."""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self.lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='listing-change-compactor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = self.app.config['LISTING_CHANGES_COMPACT_INTERVAL']
+        while True:
+            time.sleep(interval)
+            try:
+                with self.app.app_context():
+                    compact_change_log(self.app)
+            except Exception:
+                logger.exception('Listing change log compaction failed')
+
+
+def init_change_log_compaction(app):
+    """Compact in the background once the worker serves its first request."""
+    if not app.config['LISTING_CHANGES_COMPACT_INTERVAL']:
+        return
+    compactor = app.extensions['listing_change_compactor'] = ChangeLogCompactor(app)
+    app.before_request(compactor.start)
@@ -9,13 +9,15 @@ cloudinary.config(
     api_secret=os.getenv('CLOUDINARY_API_SECRET')
 )
 
-def upload_image(image_file):
+def upload_image(image_file, **options):
     """
     Upload an image to Cloudinary and return the result
+
+    Extra keyword arguments (e.g. timeout) are passed to the Cloudinary uploader.
     """
     try:
         # Upload the image
-        result = cloudinary.uploader.upload(image_file)
+        result = cloudinary.uploader.upload(image_file, **options)
         # Return the full result object
         return result
     except Exception as e:
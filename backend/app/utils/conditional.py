@@ -0,0 +1,40 @@
+import hashlib
+from functools import wraps
+from flask import current_app, make_response, request
+from werkzeug.http import is_resource_modified
+
+
+def feed_etag(version, *parts):
+    """Strong ETag for a response that depends only on `version` and `parts`."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+    return f'{version}-{digest}'
+
+
+def conditional(validators):
+    """Answer If-None-Match/If-Modified-Since before running the view.
+
+    `validators` receives the view's arguments and returns (etag,
+    last_modified) from a cheap query, or (None, None) when the resource
+    does not exist, in which case the view runs normally. Matching requests
+    get an empty 304 without the view (and its listing query) being called.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = validators(*args, **kwargs)
+            if etag is None:
+                return view(*args, **kwargs)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,152 @@
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from ..models import Listing
+from .change_feed import get_change_feed
+from .pagination import encode_cursor
+from .serializers import listing_rows, serialize_rows
+
+logger = logging.getLogger(__name__)
+
+_MAX_KEY = (datetime.max, float('inf'))
+
+
+class FeedStore:
+    """Per-worker, read-optimized snapshot of the available listings.
+
+    Payloads are kept newest first by their (created_at, id) keyset key, with
+    per-category key lists and a price-ordered list beside them, so the
+    marketplace feed (status=available, optional category/max_price, keyset
+    pages) is answered from memory. The snapshot is kept current as a
+    subscriber of the worker's change feed: on PostgreSQL only
+    the listings named in each change are replaced, on SQLite it reloads
+    whenever listings_version moves.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ready = False
+        self.version = None
+        self._clear()
+
+    def _clear(self):
+        self._payloads = {}
+        self._keys = []
+        self._by_category = {}
+        self._prices = []
+
+    # -- serving --------------------------------------------------------
+
+    def serves(self, args):
+        """Whether a feed request with these query args can come from memory."""
+        return (self.ready
+                and args.get('status') == 'available'
+                and not args.get('include'))
+
+    def page(self, category=None, max_price=None, limit=None, cursor=None):
+        """Payloads newest first, as (payloads, next_cursor, total)."""
+        with self.lock:
+            keys = self._candidates(category, max_price)
+            if cursor is not None:
+                keys = keys[:bisect_left(keys, cursor)]
+            total = len(keys)
+            if limit is None or len(keys) <= limit:
+                selected, next_cursor = keys[::-1], None
+            else:
+                selected = keys[:-limit - 1:-1]
+                next_cursor = encode_cursor(*selected[-1])
+            return [self._payloads[key[1]] for key in selected], next_cursor, total
+
+    def _candidates(self, category, max_price):
+        """Ascending keys matching the filters."""
+        keys = self._by_category.get(category.lower(), []) if category else self._keys
+        if not max_price:
+            return keys
+        cheap = bisect_right(self._prices, (max_price,) + _MAX_KEY)
+        if cheap < len(keys) // 4:
+            # Few listings under the price: start from the price index
+            matches = [(created_at, listing_id) for _, created_at, listing_id in self._prices[:cheap]]
+            if category:
+                wanted = set(keys)
+                matches = [key for key in matches if key in wanted]
+            return sorted(matches)
+        return [key for key in keys if self._payloads[key[1]]['price'] <= max_price]
+
+    # -- maintenance ----------------------------------------------------
+
+    def _key(self, payload):
+        return (payload['created_at'], payload['id'])
+
+    def _insert(self, payload):
+        key = self._key(payload)
+        self._payloads[payload['id']] = payload
+        insort(self._keys, key)
+        insort(self._by_category.setdefault((payload['category'] or '').lower(), []), key)
+        insort(self._prices, (payload['price'],) + key)
+
+    def _discard(self, listing_id):
+        payload = self._payloads.pop(listing_id, None)
+        if payload is None:
+            return
+        key = self._key(payload)
+        for keys, item in ((self._keys, key),
+                           (self._by_category.get((payload['category'] or '').lower(), []), key),
+                           (self._prices, (payload['price'],) + key)):
+            position = bisect_left(keys, item)
+            if position < len(keys) and keys[position] == item:
+                del keys[position]
+
+    def load(self, version, payloads):
+        """Replace the snapshot."""
+        with self.lock:
+            self._clear()
+            for payload in payloads:
+                self._insert(payload)
+            self.version = version
+            self.ready = True
+
+    def apply(self, version, listing_ids, payloads):
+        """Apply a change event: fresh `payloads` replace whatever `listing_ids` held."""
+        with self.lock:
+            for listing_id in listing_ids:
+                self._discard(listing_id)
+            for payload in payloads:
+                self._insert(payload)
+            if self.version is None or version > self.version:
+                self.version = version
+
+    # -- change feed subscriber (called with an app context) -------------
+
+    def reset(self, version):
+        """Rebuild from the database."""
+        rows = listing_rows().filter(Listing.status == 'available').all()
+        self.load(version, serialize_rows(rows))
+        logger.info('Listing feed store loaded %d listings at version %s', len(self._payloads), version)
+
+    def changed(self, version, changes, payloads):
+        self.apply(version, list(changes),
+                   [payload for payload in payloads if payload['status'] == 'available'])
+
+    def stale(self):
+        with self.lock:
+            self.ready = False
+
+
+def init_feed_store(app, change_feed):
+    if app.config['LISTING_FEED_STORE']:
+        store = app.extensions['listing_feed_store'] = FeedStore()
+        change_feed.subscribe(store)
+
+
+def get_feed_store(app, args):
+    """The worker's feed store if it can answer this request, else None.
+
+    The first feed request in a worker starts the change feed; requests are
+    served from the database until the snapshot is loaded.
+    """
+    store = app.extensions.get('listing_feed_store')
+    if store is None:
+        return None
+    get_change_feed(app)
+    return store if store.serves(args) else None
@@ -0,0 +1,133 @@
+import threading
+from collections import deque
+from ..models.changes import CREATED, DELETED
+from .serializers import ListingView, dumps, project
+
+# Events carry what a grid card needs; clients fetch /<id> for the rest
+EVENT_VIEW = ListingView(fields=('id', 'title', 'price', 'category', 'status', 'condition',
+                                 'user_id', 'created_at', 'updated_at', 'image', 'thumbnail'))
+
+_EVENT_NAMES = {CREATED: 'create', DELETED: 'delete'}
+
+
+class InvalidEventId(ValueError):
+    """Raised for a Last-Event-ID this stream never issued."""
+
+
+def format_event_id(key):
+    return f'{key[0]}-{key[1]}'
+
+
+def parse_event_id(value):
+    """Parse "<listings version>-<index>" back into its sort key."""
+    try:
+        version, index = value.split('-')
+        return int(version), int(index)
+    except ValueError:
+        raise InvalidEventId(value)
+
+
+def format_event(key, name, data):
+    return f'id: {format_event_id(key)}\nevent: {name}\ndata: {dumps(data).decode()}\n\n'
+
+
+class ListingEvents:
+    """Fans listing changes out to Server-Sent Events subscribers.
+
+    A subscriber of the worker's change feed, so however many clients are
+    connected there is one listener and one read per change. Event ids are
+    "<listings version>-<index of the listing within that change>"; they
+    are the same in every worker, so a client can resume on any of them
+    with Last-Event-ID as long as the event is still in the `backlog` most
+    recent ones. A client that cannot be resumed gets a `reset` event and
+    should refetch the feed.
+    """
+
+    def __init__(self, backlog):
+        self.condition = threading.Condition()
+        self._events = deque(maxlen=backlog)  # (seq, key, text)
+        self._seq = 0
+        # Clients whose last event is older than this cannot be caught up
+        self.floor = None
+
+    def _append(self, key, text):
+        if len(self._events) == self._events.maxlen:
+            self.floor = self._events[0][1]
+        self._seq += 1
+        self._events.append((self._seq, key, text))
+
+    # -- change feed subscriber -----------------------------------------
+
+    def reset(self, version):
+        key = (version, 0)
+        with self.condition:
+            self._events.clear()
+            if self.floor is not None:
+                # Changes may have been missed: everyone connected refetches
+                self._append(key, format_event(key, 'reset', {'version': version}))
+            self.floor = key
+            self.condition.notify_all()
+
+    def changed(self, version, changes, payloads):
+        payloads = {payload['id']: payload for payload in payloads}
+        with self.condition:
+            for index, listing_id in enumerate(sorted(changes)):
+                key = (version, index)
+                payload = payloads.get(listing_id)
+                if payload is None or changes[listing_id] == DELETED:
+                    self._append(key, format_event(key, 'delete', {'id': listing_id}))
+                else:
+                    name = _EVENT_NAMES.get(changes[listing_id], 'update')
+                    self._append(key, format_event(key, name, project(payload, EVENT_VIEW)))
+            self.condition.notify_all()
+
+    def stale(self):
+        pass
+
+    # -- subscribers ----------------------------------------------------
+
+    def _start(self, last_key):
+        """(seq to continue after, reset text or None) for a new subscriber."""
+        with self.condition:
+            if last_key is None:
+                return self._seq, None
+            if self.floor is None or last_key < self.floor:
+                key = self.floor or (0, 0)
+                return self._seq, format_event(key, 'reset', {'version': key[0]})
+            for seq, key, _ in self._events:
+                if key > last_key:
+                    return seq - 1, None
+            return self._seq, None
+
+    def subscribe(self, last_event_id=None, heartbeat=15):
+        """Generator of SSE text for one client, starting after `last_event_id`."""
+        last_key = parse_event_id(last_event_id) if last_event_id else None
+        seq, reset = self._start(last_key)
+
+        def stream(seq):
+            yield 'retry: 3000\n\n'
+            if reset:
+                yield reset
+            while True:
+                with self.condition:
+                    if self._seq == seq:
+                        self.condition.wait(heartbeat)
+                    if self._events and self._events[0][0] > seq + 1:
+                        # Fell further behind than the backlog
+                        seq = self._seq
+                        key = self.floor
+                        pending = [format_event(key, 'reset', {'version': key[0]})]
+                    else:
+                        pending = [text for event_seq, _, text in self._events if event_seq > seq]
+                        seq = self._seq
+                if pending:
+                    yield ''.join(pending)
+                else:
+                    yield ': keepalive\n\n'
+
+        return stream(seq)
+
+
+def init_listing_events(app, change_feed):
+    events = app.extensions['listing_events'] = ListingEvents(app.config['LISTING_EVENTS_BACKLOG'])
+    change_feed.subscribe(events)
@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import text, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(created_at, listing_id):
+    """Encode the (created_at, id) sort key of the last row on a page.
+
+    The cursor is opaque to clients: url-safe base64 of a small JSON array.
+    """
+    payload = json.dumps([created_at.isoformat(), listing_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor into (created_at, id)."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, listing_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(listing_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def parse_page_args(args):
+    """Read `limit` and `cursor` from the query string.
+
+    Returns (limit, cursor) where limit is None when the client did not ask
+    for a page, so endpoints can keep returning a plain array to old clients.
+    """
+    limit = args.get('limit', type=int)
+    cursor = args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return limit, (decode_cursor(cursor) if cursor else None)
+
+
+def keyset_filter(created_at_col, id_col, cursor):
+    """Rows strictly after `cursor` in (created_at DESC, id DESC) order.
+
+    Written as a row-value comparison so PostgreSQL can turn it into a single
+    index range scan on (created_at, id).
+    """
+    return tuple_(created_at_col, id_col) < tuple_(*cursor)
+
+
+def paginate(query, created_at_col, id_col, limit, cursor):
+    """Fetch one page of `query` ordered newest first.
+
+    Fetches limit + 1 rows so we know whether another page exists without a
+    separate COUNT. Returns (rows, next_cursor).
+    """
+    query = query.order_by(created_at_col.desc(), id_col.desc())
+    if cursor is not None:
+        query = query.filter(keyset_filter(created_at_col, id_col, cursor))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def estimate_count(session, query):
+    """Cheap row estimate for `query`.
+
+    On PostgreSQL this reads the planner's row estimate from EXPLAIN instead of
+    running COUNT(*). Other backends (SQLite in development) fall back to an
+    exact count, which is fine at development sizes.
+    """
+    bind = session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return query.order_by(None).count()
+    statement = query.order_by(None).statement.compile(
+        dialect=bind.dialect, compile_kwargs={'literal_binds': True})
+    plan = session.execute(text(f'EXPLAIN (FORMAT JSON) {statement}')).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,250 @@
+import logging
+import math
+from collections import Counter
+from operator import mul
+from sqlalchemy import func, select, text
+from ..extensions import db
+from ..models import Listing, HeartedListing
+from ..models.recommend import HeartEvent, ListingCooccurrence, ListingRecommendation
+from .similar import top_k
+
+logger = logging.getLogger(__name__)
+
+# Neighbours stored per listing; user lists are scored from these
+NEIGHBOURS_PER_LISTING = 20
+# Hearts loaded per user (newest first): a user is never recommended these
+MAX_HEARTS_PER_USER = 200
+# Counting co-occurrences is quadratic in a user's hearts, so each user
+# contributes pairs from only this many of their most recent ones
+COOCCURRENCE_HEARTS_PER_USER = 50
+# A user's recommendations are scored from this many of their latest hearts
+SCORED_HEARTS = 50
+# Rows per IN (...) list / bulk insert
+_CHUNK = 5000
+# pg_try_advisory_xact_lock key: one recommendations run at a time across hosts
+_RUN_LOCK = 0x72656373
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _CHUNK):
+        yield values[start:start + _CHUNK]
+
+
+def _load_hearts(user_ids=None):
+    """{user_id: [listing_id, ...]}, newest first and capped, for `user_ids` (or everyone)."""
+    hearts = {}
+    batches = [None] if user_ids is None else _chunks(user_ids)
+    for batch in batches:
+        query = (select(HeartedListing.user_id, HeartedListing.listing_id)
+                 .order_by(HeartedListing.user_id, HeartedListing.id.desc()))
+        if batch is not None:
+            query = query.where(HeartedListing.user_id.in_(batch))
+        for user_id, listing_id in db.session.execute(query):
+            listings = hearts.setdefault(user_id, [])
+            if len(listings) < MAX_HEARTS_PER_USER:
+                listings.append(listing_id)
+    return hearts
+
+
+def _load_listings():
+    """({listing_id: heart_count} for hearted listings, available ids, {listing_id: seller id})."""
+    popularity, available, sellers = {}, set(), {}
+    for listing_id, heart_count, status, user_id in db.session.execute(
+            select(Listing.id, Listing.heart_count, Listing.status, Listing.user_id)):
+        if heart_count:
+            popularity[listing_id] = heart_count
+        if status == 'available':
+            available.add(listing_id)
+            sellers[listing_id] = user_id
+    return popularity, available, sellers
+
+
+def cooccurrence_rows(listing_ids, user_hearts, popularity, available):
+    """Yield (listing_id, scale, row) for each of `listing_ids`.
+
+    The cosine between two listings is the number of users who hearted both
+    over the geometric mean of their heart counts. `row` maps each available
+    neighbour to shared / sqrt(neighbour's hearts) and `scale` is
+    1 / sqrt(the listing's own hearts): the cosines are scale times the
+    values, but a row can be ranked without scaling it. `user_hearts` must
+    hold every user who hearted a listing in `listing_ids`; only their
+    COOCCURRENCE_HEARTS_PER_USER latest hearts are paired up.
+
+    This is one row of the item-item product of the sparse listing x user
+    matrix at a time; Counter.update and map/zip do the per-pair work in C.
+    """
+    targets = set(listing_ids)
+    inverse_norms = {listing_id: 1 / math.sqrt(count) for listing_id, count in popularity.items()}
+    hearted_by, candidates = {}, {}
+    for user_id, listings in user_hearts.items():
+        listings = listings[:COOCCURRENCE_HEARTS_PER_USER]
+        for listing_id in listings:
+            if listing_id in targets:
+                hearted_by.setdefault(listing_id, []).append(user_id)
+        candidates[user_id] = [listing_id for listing_id in listings
+                               if listing_id in available and listing_id in inverse_norms]
+
+    for listing_id in targets:
+        counts = Counter()
+        for user_id in hearted_by.get(listing_id, ()):
+            counts.update(candidates[user_id])
+        counts.pop(listing_id, None)
+        neighbours = list(counts)
+        row = dict(zip(neighbours, map(mul, counts.values(), map(inverse_norms.__getitem__, neighbours))))
+        yield listing_id, inverse_norms.get(listing_id, 1.0), row
+
+
+def cooccurrence_scores(listing_ids, user_hearts, popularity, available):
+    """{listing_id: {neighbour_id: cosine}} for `listing_ids`; see cooccurrence_rows."""
+    return {listing_id: {other: scale * value for other, value in row.items()}
+            for listing_id, scale, row in cooccurrence_rows(listing_ids, user_hearts, popularity, available)}
+
+
+def recommend_for(user_id, hearted, neighbours, sellers, limit):
+    """Top `limit` (listing_id, score): neighbour scores summed over the user's recent hearts."""
+    scores = {}
+    for listing_id in hearted[:SCORED_HEARTS]:
+        for other, score in neighbours.get(listing_id, ()):
+            scores[other] = scores.get(other, 0.0) + score
+    for listing_id in hearted:
+        scores.pop(listing_id, None)
+    for listing_id in [other for other in scores if sellers.get(other) == user_id]:
+        del scores[listing_id]
+    return top_k(scores, limit)
+
+
+def _replace_rows(model, key, lists):
+    """Replace the ranked rows of every `key` value in `lists` ({key: [(id, score)]})."""
+    table = model.__table__
+    value_column = 'neighbour_id' if model is ListingCooccurrence else 'listing_id'
+    for batch in _chunks(lists):
+        db.session.execute(table.delete().where(table.c[key].in_(batch)))
+    rows = [{key: owner, 'rank': rank, value_column: other, 'score': score}
+            for owner, ranked in lists.items() for rank, (other, score) in enumerate(ranked)]
+    for batch in _chunks(rows):
+        db.session.execute(table.insert(), batch)
+
+
+def _stored_neighbours(listing_ids):
+    neighbours = {}
+    for batch in _chunks(listing_ids):
+        for row in db.session.execute(
+                select(ListingCooccurrence.listing_id, ListingCooccurrence.neighbour_id,
+                       ListingCooccurrence.score)
+                .where(ListingCooccurrence.listing_id.in_(batch))
+                .order_by(ListingCooccurrence.listing_id, ListingCooccurrence.rank)):
+            neighbours.setdefault(row.listing_id, []).append((row.neighbour_id, row.score))
+    return neighbours
+
+
+def build_recommendations(limit):
+    """Recompute every neighbour list and every user's recommendations."""
+    last_event = db.session.execute(select(func.max(HeartEvent.id))).scalar()
+    user_hearts = _load_hearts()
+    popularity, available, sellers = _load_listings()
+
+    neighbours = {}
+    for listing_id, scale, row in cooccurrence_rows(popularity, user_hearts, popularity, available):
+        if row:
+            neighbours[listing_id] = [(other, scale * value)
+                                      for other, value in top_k(row, NEIGHBOURS_PER_LISTING)]
+    db.session.execute(ListingCooccurrence.__table__.delete())
+    _replace_rows(ListingCooccurrence, 'listing_id', neighbours)
+
+    recommendations = {user_id: recommend_for(user_id, hearted, neighbours, sellers, limit)
+                       for user_id, hearted in user_hearts.items()}
+    db.session.execute(ListingRecommendation.__table__.delete())
+    _replace_rows(ListingRecommendation, 'user_id',
+                  {user_id: ranked for user_id, ranked in recommendations.items() if ranked})
+
+    if last_event is not None:
+        db.session.execute(HeartEvent.__table__.delete().where(HeartEvent.id <= last_event))
+    db.session.commit()
+    return len(neighbours), len(recommendations)
+
+
+def update_recommendations(limit):
+    """Recompute only what the hearts logged since the last run affect.
+
+    The co-occurrences of every listing hearted or unhearted since then are
+    recomputed exactly; since the similarity is symmetric, the same scores
+    are patched into the lists of the listings they pair with. Then only the
+    users who hearted a listing whose list changed get new recommendations.
+    """
+    events = db.session.execute(
+        select(HeartEvent.id, HeartEvent.user_id, HeartEvent.listing_id).order_by(HeartEvent.id)).all()
+    if not events:
+        return 0, 0
+    changed = {event.listing_id for event in events}
+    popularity, available, sellers = _load_listings()
+
+    hearters = set(db.session.execute(
+        select(HeartedListing.user_id).where(HeartedListing.listing_id.in_(changed)).distinct()).scalars())
+    user_hearts = _load_hearts(hearters | {event.user_id for event in events})
+    scores = cooccurrence_scores(changed, user_hearts, popularity, available)
+
+    # Listings paired with a changed one, before or after
+    partners = {other for others in scores.values() for other in others}
+    for batch in _chunks(changed):
+        partners.update(db.session.execute(
+            select(ListingCooccurrence.listing_id)
+            .where(ListingCooccurrence.neighbour_id.in_(batch))).scalars())
+    partners -= changed
+
+    lists = {listing_id: top_k(others, NEIGHBOURS_PER_LISTING) for listing_id, others in scores.items()}
+    for listing_id, stored in _stored_neighbours(partners).items():
+        merged = {other: score for other, score in stored if other not in changed}
+        merged.update((source, scores[source][listing_id]) for source in changed
+                      if listing_id in scores[source])
+        lists[listing_id] = top_k({other: score for other, score in merged.items() if other in available},
+                                  NEIGHBOURS_PER_LISTING)
+    for listing_id in partners - set(lists):
+        lists[listing_id] = top_k({source: scores[source][listing_id] for source in changed
+                                   if listing_id in scores[source]}, NEIGHBOURS_PER_LISTING)
+    _replace_rows(ListingCooccurrence, 'listing_id', lists)
+
+    affected = set()
+    for batch in _chunks(lists):
+        affected.update(db.session.execute(
+            select(HeartedListing.user_id).where(HeartedListing.listing_id.in_(batch)).distinct()).scalars())
+    affected |= {event.user_id for event in events}
+    user_hearts = _load_hearts(affected)
+    neighbours = _stored_neighbours({listing_id for hearted in user_hearts.values() for listing_id in hearted})
+    recommendations = {user_id: recommend_for(user_id, user_hearts.get(user_id, []), neighbours, sellers, limit)
+                       for user_id in affected}
+    _replace_rows(ListingRecommendation, 'user_id', recommendations)
+
+    db.session.execute(HeartEvent.__table__.delete().where(HeartEvent.id <= events[-1].id))
+    db.session.commit()
+    return len(lists), len(recommendations)
+
+
+def run_recommendations(app, full=False):
+    """Full rebuild the first time (or when asked), otherwise an incremental update.
+
+    Returns (listing lists, user lists) written, or None when another
+    process is already running.
+    """
+    limit = app.config['RECOMMENDATIONS_PER_USER']
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            locked = db.session.execute(text('SELECT pg_try_advisory_xact_lock(:key)'),
+                                        {'key': _RUN_LOCK}).scalar()
+            if not locked:
+                db.session.rollback()
+                return None
+        if full or not db.session.execute(select(ListingCooccurrence.listing_id).limit(1)).first():
+            listings, users = build_recommendations(limit)
+        else:
+            listings, users = update_recommendations(limit)
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info('Recommendations: %d listing neighbour lists and %d user lists written', listings, users)
+    return listings, users
+
+
+def init_recommendation_updates(app):
+    """Update recommendations from the upload worker's loop (see UploadJobRunner.schedule)."""
+    app.extensions['upload_jobs'].schedule(run_recommendations, app.config['RECOMMENDATIONS_INTERVAL'])
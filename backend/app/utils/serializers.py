@@ -0,0 +1,242 @@
+import json
+import logging
+import threading
+from datetime import datetime
+from flask import current_app, stream_with_context
+from sqlalchemy.orm import aliased
+from ..extensions import db
+from ..models import Listing, ListingImage, User
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Every listing payload has exactly these keys (plus its image fields, and
+# 'user_netid' when the seller is included), whichever endpoint produced it.
+LISTING_FIELDS = (
+    'id', 'title', 'description', 'price', 'category', 'status',
+    'user_id', 'buyer_id', 'condition', 'created_at', 'updated_at'
+)
+
+# 'images' is every image URL, 'image' just the first one, 'thumbnail' the
+# first one's small variant (for grid cards) and 'srcset' an <img srcset>
+# per image, in the order of 'images'. Images without variants fall back to
+# their URL.
+IMAGE_FIELDS = ('images', 'image', 'thumbnail', 'srcset')
+
+# Collections carry thumbnails for the grid, a single listing srcsets
+DEFAULT_FIELDS = LISTING_FIELDS + ('images', 'thumbnail')
+DETAIL_FIELDS = LISTING_FIELDS + ('images', 'srcset')
+
+# Always selected: the row key and the keyset pagination sort key
+_SORT_COLUMNS = ('id', 'created_at')
+
+
+class InvalidFields(ValueError):
+    """Raised for a ?fields= or ?include= value naming something we don't serve."""
+
+
+class ListingView:
+    """Which parts of a listing a response carries.
+
+    Built from the ?fields= and ?include= query parameters, it narrows both
+    the SELECT list and the JSON payload; images are only queried when an
+    image field is requested and the seller is only joined when included.
+    """
+
+    def __init__(self, fields=None, seller=False, detail=False):
+        if fields is None:
+            fields = DETAIL_FIELDS if detail else DEFAULT_FIELDS
+        unknown = set(fields) - set(LISTING_FIELDS) - set(IMAGE_FIELDS)
+        if unknown:
+            raise InvalidFields(', '.join(sorted(unknown)))
+        self.fields = tuple(field for field in LISTING_FIELDS if field in fields)
+        self.images = 'images' in fields
+        self.image = 'image' in fields
+        self.thumbnail = 'thumbnail' in fields
+        self.srcset = 'srcset' in fields
+        self.seller = seller
+
+    @property
+    def any_image(self):
+        return self.images or self.image or self.thumbnail or self.srcset
+
+    @classmethod
+    def from_args(cls, args, seller=False, detail=False):
+        fields = args.get('fields')
+        include = {name for name in args.get('include', '').split(',') if name}
+        if include - {'seller'}:
+            raise InvalidFields(', '.join(sorted(include - {'seller'})))
+        return cls(
+            fields=[field.strip() for field in fields.split(',') if field.strip()] if fields else None,
+            seller=seller or 'seller' in include,
+            detail=detail
+        )
+
+
+DEFAULT_VIEW = ListingView()
+
+
+def listing_rows(view=DEFAULT_VIEW):
+    """Query for listing payloads as plain rows rather than ORM objects.
+
+    Only the columns `view` needs are selected, so nothing is hydrated into
+    the identity map and unrequested columns such as description are never
+    read. The seller's netid is joined in when the view includes it.
+    """
+    names = _SORT_COLUMNS + tuple(field for field in view.fields if field not in _SORT_COLUMNS)
+    columns = [getattr(Listing, name) for name in names]
+    if not view.seller:
+        return db.session.query(*columns)
+    seller = aliased(User)
+    return (db.session.query(*columns, seller.netid.label('user_netid'))
+            .outerjoin(seller, seller.id == Listing.user_id))
+
+
+def load_images(listing_ids, first_only=False, thumbnail=False, srcset=False):
+    """Images of `listing_ids` in one query, as {listing_id: [row, ...]}.
+
+    Rows have `filename`, plus `thumbnail` and `srcset` when asked for;
+    the other columns are not read.
+    """
+    images = {}
+    if not listing_ids:
+        return images
+    columns = [ListingImage.listing_id, ListingImage.filename]
+    if thumbnail:
+        columns.append(ListingImage.thumbnail)
+    if srcset:
+        columns.append(ListingImage.srcset)
+    rows = (db.session.query(*columns)
+            .filter(ListingImage.listing_id.in_(listing_ids))
+            .order_by(ListingImage.id))
+    if first_only:
+        first_ids = (db.session.query(db.func.min(ListingImage.id))
+                     .filter(ListingImage.listing_id.in_(listing_ids))
+                     .group_by(ListingImage.listing_id))
+        rows = rows.filter(ListingImage.id.in_(first_ids.scalar_subquery()))
+    for row in rows:
+        images.setdefault(row.listing_id, []).append(row)
+    return images
+
+
+def serialize_rows(rows, view=DEFAULT_VIEW):
+    """Turn rows from listing_rows(view) into payload dicts."""
+    images = {}
+    if view.any_image:
+        images = load_images([row.id for row in rows], first_only=not (view.images or view.srcset),
+                             thumbnail=view.thumbnail, srcset=view.srcset)
+    keys = view.fields + (('user_netid',) if view.seller else ())
+    payloads = []
+    for row in rows:
+        payload = {key: getattr(row, key) for key in keys}
+        listing_images = images.get(row.id, [])
+        first = listing_images[0] if listing_images else None
+        if view.images:
+            payload['images'] = [image.filename for image in listing_images]
+        if view.image:
+            payload['image'] = first and first.filename
+        if view.thumbnail:
+            payload['thumbnail'] = first and (first.thumbnail or first.filename)
+        if view.srcset:
+            payload['srcset'] = [image.srcset or image.filename for image in listing_images]
+        payloads.append(payload)
+    return payloads
+
+
+def project(payload, view):
+    """Narrow a full default-view payload (e.g. a cached one) to `view`, which has no srcset."""
+    projected = {field: payload[field] for field in view.fields}
+    if view.images:
+        projected['images'] = payload['images']
+    if view.image:
+        projected['image'] = payload['images'][0] if payload['images'] else None
+    if view.thumbnail:
+        projected['thumbnail'] = payload['thumbnail']
+    return projected
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """Encode `payload` to JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def stream_rows(query, view=DEFAULT_VIEW, batch_size=500):
+    """An iterator over a JSON array of listing payloads, a batch at a time.
+
+    Rows come from a server-side cursor (yield_per), and each batch gets its
+    images from one query, so memory stays bounded by `batch_size` whatever
+    the size of the result. The query runs and its first batch is
+    serialized before this returns, so errors up to that point raise here.
+    """
+    result = db.session.execute(query.statement.execution_options(yield_per=batch_size))
+    try:
+        partitions = result.partitions()
+        rows = next(partitions, None)
+        head = b'[' + (_encode_batch(rows, view) if rows else b'')
+    except Exception:
+        result.close()
+        raise
+    return _stream_rest(result, partitions, head, view)
+
+
+def _encode_batch(rows, view):
+    return b','.join(dumps(payload) for payload in serialize_rows(rows, view))
+
+
+def _stream_rest(result, partitions, head, view):
+    try:
+        yield head
+        for rows in partitions:
+            yield b',' + _encode_batch(rows, view)
+    except Exception:
+        # The status line and part of the array are already sent: re-raising
+        # has the server drop the connection without the final chunk, so the
+        # client sees a broken transfer rather than a short array with a 200
+        logger.exception('Listing stream failed after the response started; aborting it')
+        raise
+    finally:
+        result.close()
+    yield b']'
+
+
+def streamed_json_response(query, view=DEFAULT_VIEW, batch_size=500):
+    """Chunked response for the JSON array of listing payloads in `query`.
+
+    A failure before the first batch is read raises from here, so the view
+    answers with its usual error status. The server-side cursor, and the
+    database connection under it, stays checked out until the last batch is
+    sent, which is as long as the client takes to read the response. At
+    most LISTING_STREAM_MAX_CONCURRENT responses per process stream at
+    once; beyond that the array is built in memory, and the connection goes
+    back to the pool before the client starts reading.
+    """
+    slots = current_app.extensions.setdefault(
+        'listing_stream_slots', threading.BoundedSemaphore(current_app.config['LISTING_STREAM_MAX_CONCURRENT']))
+    if not slots.acquire(blocking=False):
+        return current_app.response_class(b''.join(stream_rows(query, view, batch_size)),
+                                          mimetype='application/json')
+    try:
+        response = current_app.response_class(
+            stream_with_context(stream_rows(query, view, batch_size)), mimetype='application/json')
+    except BaseException:
+        slots.release()
+        raise
+    response.call_on_close(slots.release)
+    return response
+
+
+def json_response(payload, status=200):
+    """Like jsonify(), but through dumps(); datetimes become ISO 8601 strings."""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
@@ -0,0 +1,252 @@
+import heapq
+import logging
+import math
+from collections import Counter
+from sqlalchemy import func, select, text
+from ..extensions import db
+from ..models import Listing
+from ..models.similar import ListingSimilarity, SimilarityRefresh
+from .suggest import normalize
+
+logger = logging.getLogger(__name__)
+
+# Term weight before TF-IDF: a title word counts double
+TITLE_WEIGHT = 2.0
+# Similarity multiplier for a listing in the same category. Applied after
+# scoring, so the category alone never makes two listings similar
+CATEGORY_BOOST = 1.5
+# When a listing changes, the lists it might newly enter are looked for among
+# its k * REVERSE_CANDIDATES closest listings; a rebuild catches the rest
+REVERSE_CANDIDATES = 5
+# pg_try_advisory_xact_lock key: one refresh at a time across hosts
+_REFRESH_LOCK = 0x73696d6c
+
+_STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have i in is it its my of on or so '
+    'that the this to was were will with you your'.split())
+
+
+def listing_terms(title, description):
+    """Weighted terms of a listing, as a Counter."""
+    terms = Counter()
+    for text, weight in ((title, TITLE_WEIGHT), (description, 1.0)):
+        for word in normalize(text).split():
+            if len(word) > 1 and word not in _STOPWORDS:
+                terms[word] += weight
+    return terms
+
+
+def top_k(scores, k):
+    """The `k` best (listing_id, score) pairs, ties broken by lower id.
+
+    The k-th best score is found over the bare values, which heapq compares
+    in C; only the pairs scoring at least that much are then sorted.
+    """
+    if len(scores) > k:
+        threshold = heapq.nlargest(k, scores.values())[-1] if k else float('inf')
+        items = [item for item in scores.items() if item[1] >= threshold]
+    else:
+        items = list(scores.items())
+    items.sort(key=lambda item: (-item[1], item[0]))
+    return items[:k]
+
+
+class SimilarityIndex:
+    """TF-IDF model of the available listings, built by the similarity jobs.
+
+    Vectors are sparse dicts of L2-normalised tf-idf weights (sublinear tf,
+    smoothed idf), with an inverted index from term to listing ids, so the
+    cosine similarities of one listing against the corpus touch only the
+    listings that share a term with it. A vector is weighed with the
+    document frequencies current when its listing was last indexed.
+    """
+
+    def __init__(self):
+        self._terms = {}
+        self._categories = {}
+        self._vectors = {}
+        self._df = Counter()
+        self._postings = {}
+
+    def __contains__(self, listing_id):
+        return listing_id in self._vectors
+
+    def listing_ids(self):
+        return sorted(self._vectors)
+
+    def build(self, rows):
+        """Index (id, title, description, category) rows into an empty model."""
+        for listing_id, title, description, category in rows:
+            terms = self._terms[listing_id] = listing_terms(title, description)
+            self._categories[listing_id] = (category or '').lower()
+            self._df.update(terms.keys())
+        for listing_id, terms in self._terms.items():
+            self._index(listing_id, terms)
+
+    def upsert(self, listing_id, title, description, category):
+        self._remove(listing_id)
+        terms = self._terms[listing_id] = listing_terms(title, description)
+        self._categories[listing_id] = (category or '').lower()
+        self._df.update(terms.keys())
+        self._index(listing_id, terms)
+
+    def remove(self, listing_id):
+        self._remove(listing_id)
+
+    def _index(self, listing_id, terms):
+        corpus = len(self._terms)
+        vector = {term: (1 + math.log(weight)) * (math.log((1 + corpus) / (1 + self._df[term])) + 1)
+                  for term, weight in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        self._vectors[listing_id] = {term: weight / norm for term, weight in vector.items()} if norm else {}
+        for term in vector:
+            self._postings.setdefault(term, set()).add(listing_id)
+
+    def _remove(self, listing_id):
+        terms = self._terms.pop(listing_id, None)
+        if terms is None:
+            return
+        self._vectors.pop(listing_id)
+        self._categories.pop(listing_id)
+        for term in terms:
+            self._df[term] -= 1
+            if not self._df[term]:
+                del self._df[term]
+            ids = self._postings.get(term)
+            if ids is not None:
+                ids.discard(listing_id)
+                if not ids:
+                    del self._postings[term]
+
+    def scores(self, listing_id):
+        """{other_id: similarity} for the listings sharing a term with `listing_id`.
+
+        The cosine similarity, times CATEGORY_BOOST for listings in the same
+        category.
+        """
+        vector = self._vectors.get(listing_id)
+        if not vector:
+            return {}
+        scores = {}
+        for term, weight in vector.items():
+            for other in self._postings[term]:
+                if other != listing_id:
+                    scores[other] = scores.get(other, 0.0) + weight * self._vectors[other][term]
+        category = self._categories[listing_id]
+        if category:
+            for other in scores:
+                if self._categories[other] == category:
+                    scores[other] *= CATEGORY_BOOST
+        return scores
+
+    def neighbours(self, listing_id, k):
+        return top_k(self.scores(listing_id), k)
+
+
+def _write_neighbours(listing_id, neighbours):
+    table = ListingSimilarity.__table__
+    db.session.execute(table.delete().where(table.c.listing_id == listing_id))
+    if neighbours:
+        db.session.execute(table.insert(), [
+            {'listing_id': listing_id, 'rank': rank, 'similar_id': other, 'score': score}
+            for rank, (other, score) in enumerate(neighbours)
+        ])
+
+
+def refresh_listing_neighbours(index, listing_id, k):
+    """Bring the stored lists up to date after `listing_id` changed; the caller commits.
+
+    Its own list is recomputed, as is every list it already appears in
+    (where it may now rank differently, or be gone). Lists it could newly
+    enter are those of its closest listings whose k-th neighbour scores
+    lower than it.
+    """
+    table = ListingSimilarity.__table__
+    holders = set(db.session.execute(
+        select(table.c.listing_id).where(table.c.similar_id == listing_id)).scalars())
+    scores = index.scores(listing_id)
+    _write_neighbours(listing_id, top_k(scores, k))
+
+    candidates = [(other, score) for other, score in top_k(scores, k * REVERSE_CANDIDATES)
+                  if other not in holders]
+    current = {}
+    if candidates:
+        current = {row.listing_id: (row.count, row.lowest) for row in db.session.execute(
+            select(table.c.listing_id, func.count().label('count'), func.min(table.c.score).label('lowest'))
+            .where(table.c.listing_id.in_([other for other, _ in candidates]))
+            .group_by(table.c.listing_id))}
+    entered = {other for other, score in candidates
+               if current.get(other, (0, 0.0))[0] < k or score > current[other][1]}
+
+    for other in sorted(holders | entered):
+        _write_neighbours(other, index.neighbours(other, k) if other in index else [])
+
+
+def load_similarity_index():
+    """A model of the available listings, as they are in the database now."""
+    index = SimilarityIndex()
+    index.build(db.session.query(Listing.id, Listing.title, Listing.description, Listing.category)
+                .filter(Listing.status == 'available').all())
+    return index
+
+
+def rebuild_similar_listings(app):
+    """Rebuild the model and every stored list from scratch; returns the number of listings."""
+    last_refresh = db.session.execute(select(func.max(SimilarityRefresh.id))).scalar()
+    index = load_similarity_index()
+    k = app.config['SIMILAR_LISTINGS_K']
+    table = ListingSimilarity.__table__
+    db.session.execute(table.delete())
+    listing_ids = index.listing_ids()
+    for listing_id in listing_ids:
+        neighbours = index.neighbours(listing_id, k)
+        if neighbours:
+            db.session.execute(table.insert(), [
+                {'listing_id': listing_id, 'rank': rank, 'similar_id': other, 'score': score}
+                for rank, (other, score) in enumerate(neighbours)
+            ])
+    if last_refresh is not None:
+        db.session.execute(SimilarityRefresh.__table__.delete().where(SimilarityRefresh.id <= last_refresh))
+    db.session.commit()
+    return len(listing_ids)
+
+
+def refresh_similar_listings(app):
+    """Update the stored lists of the listings changed since the last run.
+
+    Run off the request path every SIMILAR_LISTINGS_REFRESH_INTERVAL
+    seconds by the upload worker, or by `flask listings refresh-similar`.
+    The model is built once per run; each listing logged in
+    similarity_refreshes is then refreshed with refresh_listing_neighbours.
+    Returns the number of listings refreshed, or None when another process
+    is already refreshing.
+    """
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            locked = db.session.execute(text('SELECT pg_try_advisory_xact_lock(:key)'),
+                                        {'key': _REFRESH_LOCK}).scalar()
+            if not locked:
+                db.session.rollback()
+                return None
+        refreshes = db.session.execute(
+            select(SimilarityRefresh.id, SimilarityRefresh.listing_id).order_by(SimilarityRefresh.id)).all()
+        if not refreshes:
+            db.session.commit()
+            return 0
+        index = load_similarity_index()
+        listing_ids = sorted({refresh.listing_id for refresh in refreshes})
+        for listing_id in listing_ids:
+            refresh_listing_neighbours(index, listing_id, app.config['SIMILAR_LISTINGS_K'])
+        db.session.execute(SimilarityRefresh.__table__.delete().where(SimilarityRefresh.id <= refreshes[-1].id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info('Similar listings: refreshed after changes to %d listings', len(listing_ids))
+    return len(listing_ids)
+
+
+def init_similar_refresh(app):
+    """Refresh similar listings from the upload worker's loop (see UploadJobRunner.schedule)."""
+    app.extensions['upload_jobs'].schedule(refresh_similar_listings,
+                                           app.config['SIMILAR_LISTINGS_REFRESH_INTERVAL'])
@@ -0,0 +1,78 @@
+import io
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from .cloudinary_config import upload_image
+
+# File extension per stored content type (see images.FORMATS)
+EXTENSIONS = {'image/webp': '.webp', 'image/jpeg': '.jpg'}
+
+
+class ImageStorage(ABC):
+    """Where processed listing photos are kept.
+
+    `store` saves one photo under `key`, the SHA-256 hex digest of the
+    uploaded file it was made from, and returns its public URL. Storing the
+    same key again must be harmless and return the same URL.
+    """
+
+    @abstractmethod
+    def store(self, key, data, content_type):
+        pass
+
+
+class CloudinaryStorage(ImageStorage):
+    """Photos on Cloudinary, with the key as public id."""
+
+    def __init__(self, timeout, upload=upload_image):
+        self.timeout = timeout
+        self.upload = upload
+
+    def store(self, key, data, content_type):
+        # overwrite=False: a key stored before is answered without re-processing
+        result = self.upload(io.BytesIO(data), public_id=key, overwrite=False, timeout=self.timeout)
+        return result['secure_url']
+
+
+class LocalStorage(ImageStorage):
+    """Photos in a local directory served by /api/listing/images, for running offline.
+
+    Files are spread over 256 subdirectories by the key's first two
+    characters: <root>/ab/abcd....webp.
+    """
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def store(self, key, data, content_type):
+        name = f'{key[:2]}/{key}{EXTENSIONS[content_type]}'
+        path = self.path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written aside and renamed, so a reader never sees half a file
+            fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as output:
+                    output.write(data)
+                os.replace(temporary, path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+        return f'{self.base_url}/{name}'
+
+
+def init_image_storage(app):
+    """The backend named by LISTING_IMAGE_STORAGE, as app.extensions['image_storage']."""
+    backend = app.config['LISTING_IMAGE_STORAGE']
+    if backend == 'cloudinary':
+        storage = CloudinaryStorage(app.config['LISTING_UPLOAD_TIMEOUT'])
+    elif backend == 'local':
+        storage = LocalStorage(app.config['LISTING_IMAGE_STORAGE_ROOT'], app.config['LISTING_IMAGE_STORAGE_URL'])
+    else:
+        raise ValueError(f'Unknown LISTING_IMAGE_STORAGE: {backend!r}')
+    app.extensions['image_storage'] = storage
+    return storage
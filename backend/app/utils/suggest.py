@@ -0,0 +1,242 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from ..extensions import db
+from ..models.listing import CATEGORIES, Listing
+from ..signals import listing_saved, listing_deleted
+from .change_feed import get_change_feed
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_PREFIX_END = '\U0010ffff'
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation/whitespace to single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_WORD.findall(text.lower()))
+
+
+def trigrams(word):
+    """Trigrams of `word`, padded at the front only so they work for prefixes."""
+    padded = f'  {word}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, giving up once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class SuggestIndex:
+    """In-process typeahead index over available listing titles.
+
+    Exact prefixes are answered from a sorted list of title suffixes (one per
+    word boundary, so "desk" finds "Wooden desk") with two binary searches.
+    When that yields too little, the last word of the query is matched
+    against a trigram index and checked with a bounded edit distance, which
+    tolerates a typo or two.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self._listings = {}
+        self._keys = []
+        self._trigrams = {}
+
+    def build(self, rows):
+        """Replace the index contents with (id, title, category) rows."""
+        with self.lock:
+            self._listings = {}
+            self._keys = []
+            self._trigrams = {}
+            for listing_id, title, category in rows:
+                self._add(listing_id, title, category, sort=False)
+            self._keys.sort()
+            self.built = True
+
+    def upsert(self, listing_id, title, category):
+        with self.lock:
+            if not self.built:
+                return
+            self._remove(listing_id)
+            self._add(listing_id, title, category)
+
+    def remove(self, listing_id):
+        with self.lock:
+            if self.built:
+                self._remove(listing_id)
+
+    def _add(self, listing_id, title, category, sort=True):
+        words = normalize(title).split()
+        self._listings[listing_id] = (title, category, words)
+        for i in range(len(words)):
+            key = (' '.join(words[i:]), listing_id)
+            if sort:
+                insort(self._keys, key)
+            else:
+                self._keys.append(key)
+        for word in set(words):
+            for gram in trigrams(word):
+                self._trigrams.setdefault(gram, set()).add(listing_id)
+
+    def _remove(self, listing_id):
+        entry = self._listings.pop(listing_id, None)
+        if entry is None:
+            return
+        words = entry[2]
+        for i in range(len(words)):
+            key = (' '.join(words[i:]), listing_id)
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+        for word in set(words):
+            for gram in trigrams(word):
+                ids = self._trigrams.get(gram)
+                if ids is not None:
+                    ids.discard(listing_id)
+                    if not ids:
+                        del self._trigrams[gram]
+
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` {'id', 'title', 'category'} dicts for `prefix`."""
+        query = normalize(prefix)
+        if not query:
+            return []
+        with self.lock:
+            matches = self._prefix_matches(query, limit)
+            if len(matches) < limit:
+                matches += [listing_id for listing_id in self._fuzzy_matches(query, limit)
+                            if listing_id not in matches][:limit - len(matches)]
+            return [{'id': listing_id,
+                     'title': self._listings[listing_id][0],
+                     'category': self._listings[listing_id][1]}
+                    for listing_id in matches]
+
+    def _prefix_matches(self, query, limit):
+        """Listings with a word sequence starting with `query`.
+
+        Titles that start with the query rank ahead of mid-title matches; only
+        a bounded slice of the key range is scanned, so short prefixes stay cheap.
+        """
+        start = bisect_left(self._keys, (query,))
+        end = min(bisect_left(self._keys, (query + _PREFIX_END,), lo=start), start + limit * 4)
+        leading, inner = [], []
+        seen = set()
+        for key, listing_id in self._keys[start:end]:
+            if listing_id in seen:
+                continue
+            seen.add(listing_id)
+            words = self._listings[listing_id][2]
+            (leading if ' '.join(words).startswith(query) else inner).append(listing_id)
+        return (leading + inner)[:limit]
+
+    def _fuzzy_matches(self, query, limit):
+        token = query.split()[-1]
+        if len(token) < 3:
+            return []
+        grams = trigrams(token)
+        overlap = {}
+        for gram in grams:
+            for listing_id in self._trigrams.get(gram, ()):
+                overlap[listing_id] = overlap.get(listing_id, 0) + 1
+        threshold = max(1, len(grams) // 3)
+        max_edits = 1 if len(token) <= 4 else 2
+        scored = []
+        for listing_id, shared in overlap.items():
+            if shared < threshold:
+                continue
+            words = self._listings[listing_id][2]
+            distance = min(edit_distance(token, word[:len(token)], max_edits) for word in words)
+            if distance <= max_edits:
+                scored.append((distance, -shared, listing_id))
+        scored.sort()
+        return [listing_id for _, _, listing_id in scored[:limit]]
+
+    # -- change feed subscriber ----------------------------------------
+
+    def reset(self, version):
+        # Until /suggest first needs it, there is nothing to rebuild
+        with self.lock:
+            if self.built:
+                self.build(available_listing_rows().all())
+
+    def changed(self, version, changes, payloads):
+        with self.lock:
+            if not self.built:
+                return
+            for listing_id in changes:
+                self._remove(listing_id)
+            for payload in payloads:
+                if payload['status'] == 'available':
+                    self._add(payload['id'], payload['title'], payload['category'])
+
+    def stale(self):
+        # Keep answering from what we have; the feed resets us once it is back
+        pass
+
+
+def available_listing_rows():
+    """(id, title, category) rows of the available listings, for SuggestIndex.build()."""
+    return (db.session.query(Listing.id, Listing.title, Listing.category)
+            .filter(Listing.status == 'available'))
+
+
+def suggest_categories(prefix):
+    query = normalize(prefix)
+    return [category for category in CATEGORIES if query and category.startswith(query)]
+
+
+def init_suggest_index(app, change_feed):
+    """Give each app (one per gunicorn worker) its own index.
+
+    It is built by the first /suggest request, so CLI commands and the
+    upload worker never scan the listings for it. From then on it follows
+    the change feed, so listings written through any worker show up (or
+    drop out), and this worker's own writes are applied at once by the
+    listing signals; no keystroke has to touch the database.
+    """
+    index = app.extensions['suggest_index'] = SuggestIndex()
+    change_feed.subscribe(index)
+    return index
+
+
+def get_suggest_index(app):
+    """Return the app's index, building it on first use."""
+    index = app.extensions['suggest_index']
+    get_change_feed(app)
+    if not index.built:
+        with index.lock:
+            if not index.built:
+                index.build(available_listing_rows().all())
+    return index
+
+
+@listing_saved.connect
+def _index_saved_listing(app, listing, **extra):
+    index = app.extensions.get('suggest_index')
+    if index is None:
+        return
+    if listing.status == 'available':
+        index.upsert(listing.id, listing.title, listing.category)
+    else:
+        index.remove(listing.id)
+
+
+@listing_deleted.connect
+def _index_deleted_listing(app, listing_id, **extra):
+    index = app.extensions.get('suggest_index')
+    if index is not None:
+        index.remove(listing_id)
@@ -0,0 +1,122 @@
+import math
+import struct
+from bisect import bisect_left
+
+# Compression parameter: a digest keeps at most about this many centroids,
+# and quantiles near the median are accurate to well under 1% of the values
+DEFAULT_COMPRESSION = 100
+
+_HEADER = struct.Struct('<HI')
+
+
+class TDigest:
+    """Merging t-digest (Dunning & Ertl) for streaming quantile estimates.
+
+    Values are summarised as sorted (mean, weight) centroids, sized by the
+    arcsine scale function so centroids are small in the tails and large
+    around the median. Adds are buffered and merged in one pass. `remove`
+    takes one unit of weight back out of the centroid nearest the value,
+    which is exact while that value is still a centroid of its own and a
+    close approximation once it has been merged.
+    """
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, centroids=()):
+        self.compression = compression
+        self._centroids = list(centroids)
+        self._buffer = []
+
+    @property
+    def count(self):
+        self._merge()
+        return sum(weight for _, weight in self._centroids)
+
+    def centroids(self):
+        self._merge()
+        return list(self._centroids)
+
+    def add(self, value, weight=1):
+        self._buffer.append((float(value), weight))
+        if len(self._buffer) >= self.compression:
+            self._merge()
+
+    def update(self, other):
+        """Merge another digest's centroids into this one."""
+        self._buffer.extend(other.centroids())
+        self._merge()
+
+    def remove(self, value, weight=1):
+        self._merge()
+        if not self._centroids:
+            return
+        index = bisect_left(self._centroids, (value,))
+        nearest = min((i for i in (index - 1, index) if 0 <= i < len(self._centroids)),
+                      key=lambda i: abs(self._centroids[i][0] - value))
+        mean, current = self._centroids[nearest]
+        if current <= weight:
+            del self._centroids[nearest]
+        else:
+            self._centroids[nearest] = (mean, current - weight)
+
+    def _limit(self, q):
+        # k(q) = delta / (2 pi) * asin(2q - 1); a centroid may span one unit of k
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _merge(self):
+        if not self._buffer:
+            return
+        values = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in values)
+        merged = [list(values[0])]
+        before = 0  # weight of the centroids before the one being built
+        k_low = self._limit(0)
+        for mean, weight in values[1:]:
+            current = merged[-1]
+            if self._limit((before + current[1] + weight) / total) - k_low <= 1:
+                combined = current[1] + weight
+                current[0] += (mean - current[0]) * weight / combined
+                current[1] = combined
+            else:
+                before += current[1]
+                k_low = self._limit(before / total)
+                merged.append([mean, weight])
+        self._centroids = [(mean, weight) for mean, weight in merged]
+
+    def quantile(self, q):
+        """Estimated value at quantile `q` (0..1), or None for an empty digest.
+
+        Interpolates linearly between the centres of adjacent centroids.
+        """
+        self._merge()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        total = sum(weight for _, weight in centroids)
+        target = q * total
+        cumulative = 0.0
+        for i, (mean, weight) in enumerate(centroids):
+            centre = cumulative + weight / 2
+            if target < centre:
+                if i == 0:
+                    return mean
+                previous_mean, previous_weight = centroids[i - 1]
+                previous_centre = cumulative - previous_weight / 2
+                return previous_mean + (mean - previous_mean) * (target - previous_centre) / (centre - previous_centre)
+            cumulative += weight
+        return centroids[-1][0]
+
+    def to_bytes(self):
+        """Little-endian (compression, n) header, then n float64 means and n uint32 weights."""
+        centroids = self.centroids()
+        return (_HEADER.pack(self.compression, len(centroids))
+                + struct.pack(f'<{len(centroids)}d', *(mean for mean, _ in centroids))
+                + struct.pack(f'<{len(centroids)}I', *(int(weight) for _, weight in centroids)))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data:
+            return cls()
+        compression, n = _HEADER.unpack_from(data)
+        means = struct.unpack_from(f'<{n}d', data, _HEADER.size)
+        weights = struct.unpack_from(f'<{n}I', data, _HEADER.size + 8 * n)
+        return cls(compression, zip(means, weights))
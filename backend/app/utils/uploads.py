@@ -0,0 +1,380 @@
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import delete, or_, select, update
+from ..extensions import db
+from ..models.sql import dialect_insert
+from ..models.uploads import UploadJob, StoredImage, QUEUED, PROCESSING, DONE, FAILED
+from .images import image_variants
+
+logger = logging.getLogger(__name__)
+
+# How often a request waiting on a job handled by another process re-reads it
+_WAIT_POLL_SECONDS = 0.25
+# Spooled files are copied and hashed this many bytes at a time
+_CHUNK_SIZE = 64 * 1024
+# How often a poller deletes finished jobs older than LISTING_UPLOAD_JOB_RETENTION_DAYS
+_PURGE_INTERVAL = 3600
+
+
+def _off_event_loop(function, *args):
+    """Call `function` on a native thread when gevent has patched threading.
+
+    Under gevent the upload pool's threads are greenlets sharing the
+    worker's one OS thread, so decoding and resizing there would stall
+    every other request and stream the worker serves. The hub's
+    threadpool runs real threads; the calling greenlet waits without
+    blocking the loop.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('threading'):
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args)
+    return function(*args)
+
+
+def process_upload(storage, key, filename, stream, image_options):
+    """Normalize one photo, make its smaller variants and store them all.
+
+    The photo is stored under `key` and each variant under `key`-<name>;
+    a variant no smaller than the next larger size is not stored. Returns
+    {'url', 'thumbnail', 'srcset'}, the srcset listing every stored size
+    by width.
+    """
+    max_edge = image_options['max_edge']
+    sizes = {name: min(edge, max_edge) for name, edge in image_options['variants'].items()}
+    sizes['full'] = max_edge
+    # Largest first, the full size ahead of variants as large as it
+    names = sorted(sizes, key=lambda name: (sizes[name], name == 'full'), reverse=True)
+    encoded = _off_event_loop(image_variants, stream, [sizes[name] for name in names],
+                              image_options['quality'], image_options['output_format'])
+    urls, srcset, previous = {}, [], None
+    for name, (data, content_type, size) in zip(names, encoded):
+        if size != previous:
+            url = storage.store(key if name == 'full' else f'{key}-{name}', data, content_type)
+            srcset.append(f'{url} {size[0]}w')
+            previous = size
+        urls[name] = url
+    logger.info('Uploaded %s (%d sizes): %s', filename, len(srcset), urls['full'])
+    return {'url': urls['full'], 'thumbnail': urls.get('thumbnail', urls['full']),
+            'srcset': ', '.join(reversed(srcset))}
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_options(config):
+    return {'max_edge': config['LISTING_IMAGE_MAX_EDGE'], 'quality': config['LISTING_IMAGE_QUALITY'],
+            'output_format': config['LISTING_IMAGE_FORMAT'], 'variants': config['LISTING_IMAGE_VARIANTS']}
+
+
+def spool_path(app, job_id, index=None):
+    directory = os.path.join(app.config['LISTING_UPLOAD_SPOOL'], job_id)
+    return directory if index is None else os.path.join(directory, str(index))
+
+
+def spool_upload(app, files):
+    """Copy (filename, stream) pairs into the spool and queue them as one job.
+
+    The streams are copied (and hashed) in chunks, so a request's files
+    never need to fit in memory. They are read to the end before this
+    returns: the request's streams are closed when it ends, and workers
+    only ever read the spooled copies. Returns the committed UploadJob;
+    with in-process workers it is already claimed and running.
+    """
+    job_id = uuid.uuid4().hex
+    directory = spool_path(app, job_id)
+    os.makedirs(directory)
+    try:
+        digests = []
+        for index, (_, stream) in enumerate(files):
+            digest = hashlib.sha256()
+            with open(os.path.join(directory, str(index)), 'wb') as spooled:
+                for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    spooled.write(chunk)
+            digests.append(digest.hexdigest())
+        job = UploadJob(id=job_id, filenames=[filename for filename, _ in files], digests=digests)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    if app.config['LISTING_UPLOAD_JOBS_IN_PROCESS']:
+        app.extensions['upload_jobs'].run(job_id)
+    return job
+
+
+class _RunningJob:
+    def __init__(self, results, remaining):
+        self.lock = threading.Lock()
+        self.results = results
+        self.remaining = remaining
+        self.stored = {}  # digest -> process_upload() result, for the StoredImage index
+        self.done = threading.Event()
+
+    def record(self, digest, indexes, result):
+        """Store the result for the files with `digest`; True for the last pending digest."""
+        with self.lock:
+            for index in indexes:
+                self.results[index] = result
+            if 'url' in result:
+                self.stored[digest] = result
+            self.remaining -= 1
+            return self.remaining == 0
+
+
+class UploadJobRunner:
+    """Processes upload jobs' files on a pool of LISTING_UPLOAD_WORKERS threads.
+
+    The pool size alone bounds how many photos are normalized and stored
+    at once, whatever the number of requests. Files of one job run side
+    by side; the thread finishing a job's last file writes its results.
+    Files whose SHA-256 is in the StoredImage index, or repeated within
+    the job, are not processed again.
+    """
+
+    def __init__(self, app, storage):
+        self.app = app
+        self.storage = storage
+        self.workers = app.config['LISTING_UPLOAD_WORKERS']
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload')
+        self.lock = threading.Lock()
+        self._running = {}
+        self._thread = None
+        self._purged_at = None
+        self._tasks = []  # [function, interval, next run], see schedule()
+
+    def busy(self):
+        with self.lock:
+            return len(self._running)
+
+    def run(self, job_id):
+        """Claim a queued job and start on its files; False if another worker has it."""
+        claimed = db.session.execute(
+            update(UploadJob)
+            .where(UploadJob.id == job_id, UploadJob.status == QUEUED)
+            .values(status=PROCESSING, claimed_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return False
+        job = db.session.get(UploadJob, job_id)
+        # Jobs queued before digests were taken while spooling
+        digests = job.digests or [file_digest(spool_path(self.app, job_id, index))
+                                  for index in range(len(job.filenames))]
+        # Photos stored before variants were made are processed again
+        known = dict(db.session.execute(
+            select(StoredImage.sha256, StoredImage.url)
+            .where(StoredImage.sha256.in_(set(digests)), StoredImage.thumbnail.isnot(None))).all())
+        db.session.commit()
+
+        results, pending = [None] * len(digests), {}
+        for index, digest in enumerate(digests):
+            if digest in known:
+                results[index] = {'url': known[digest]}
+            else:
+                pending.setdefault(digest, []).append(index)
+        if len(pending) < len(digests):
+            logger.info('Upload job %s: %d of %d files already stored', job_id,
+                        len(digests) - sum(map(len, pending.values())), len(digests))
+        running = _RunningJob(results, len(pending))
+        if not pending:
+            self._finish(job_id, running)
+            return True
+        with self.lock:
+            self._running[job_id] = running
+        options = image_options(self.app.config)
+        for digest, indexes in pending.items():
+            self.pool.submit(self._process_file, job_id, running, digest, indexes,
+                             job.filenames[indexes[0]], options)
+        return True
+
+    def _process_file(self, job_id, running, digest, indexes, filename, options):
+        try:
+            with open(spool_path(self.app, job_id, indexes[0]), 'rb') as stream:
+                result = process_upload(self.storage, digest, filename, stream, options)
+        except Exception as e:
+            logger.error('Failed to upload %s for job %s: %s', filename, job_id, e)
+            result = {'error': str(e)}
+        if running.record(digest, indexes, result):
+            self._finish(job_id, running)
+
+    def _finish(self, job_id, running):
+        try:
+            with self.app.app_context():
+                stored = any('url' in result for result in running.results)
+                if running.stored:
+                    # Another job may have stored the same file meanwhile
+                    # (identically), or an older entry may lack variants
+                    statement = dialect_insert(db.session.connection(), StoredImage.__table__)
+                    db.session.execute(
+                        statement.on_conflict_do_update(
+                            index_elements=['sha256'],
+                            set_={'url': statement.excluded.url, 'thumbnail': statement.excluded.thumbnail,
+                                  'srcset': statement.excluded.srcset}),
+                        [dict(stored, sha256=digest, created_at=datetime.utcnow())
+                         for digest, stored in running.stored.items()])
+                db.session.execute(
+                    update(UploadJob)
+                    .where(UploadJob.id == job_id)
+                    .values(status=DONE if stored else FAILED, results=running.results,
+                            finished_at=datetime.utcnow()))
+                db.session.commit()
+            shutil.rmtree(spool_path(self.app, job_id), ignore_errors=True)
+        except Exception:
+            # Left processing with its spool intact; requeued once stale
+            logger.exception('Could not record the results of upload job %s', job_id)
+        finally:
+            with self.lock:
+                self._running.pop(job_id, None)
+            running.done.set()
+
+    def wait(self, job_id, timeout):
+        """Block up to `timeout` seconds on a job running in this process; False if it is not."""
+        with self.lock:
+            running = self._running.get(job_id)
+        if running is None:
+            return False
+        running.done.wait(timeout)
+        return True
+
+    # -- polling for queued jobs ---------------------------------------
+
+    def requeue_stale(self):
+        """Recover jobs stuck in processing (their worker died).
+
+        Jobs whose files are spooled on this host are put back in the
+        queue. A job is failed, with an error per file, once it has been
+        stuck for twice LISTING_UPLOAD_JOB_STALE without any host requeueing
+        it: its spool is gone, e.g. with the filesystem of a restarted dyno.
+        Queued jobs that no host has claimed for as long are failed the same
+        way.
+        """
+        stale_after = timedelta(seconds=self.app.config['LISTING_UPLOAD_JOB_STALE'])
+        now = datetime.utcnow()
+        stale = [job_id for job_id in db.session.execute(
+                     select(UploadJob.id).where(UploadJob.status == PROCESSING, UploadJob.claimed_at < now - stale_after)
+                 ).scalars() if os.path.isdir(spool_path(self.app, job_id))]
+        if stale:
+            db.session.execute(update(UploadJob)
+                               .where(UploadJob.id.in_(stale), UploadJob.status == PROCESSING)
+                               .values(status=QUEUED, claimed_at=None))
+            logger.warning('Requeued %d stale upload jobs', len(stale))
+        lost = db.session.execute(
+            select(UploadJob).where(or_(
+                (UploadJob.status == PROCESSING) & (UploadJob.claimed_at < now - 2 * stale_after),
+                (UploadJob.status == QUEUED) & (UploadJob.created_at < now - 2 * stale_after)))
+        ).scalars().all()
+        lost = [job for job in lost if not os.path.isdir(spool_path(self.app, job.id))]
+        for job in lost:
+            db.session.execute(
+                update(UploadJob)
+                .where(UploadJob.id == job.id, UploadJob.status == job.status)
+                .values(status=FAILED, finished_at=now,
+                        results=[{'error': 'Upload was lost before it was processed'}] * len(job.filenames)))
+        if lost:
+            logger.warning('Failed %d upload jobs whose files are no longer spooled', len(lost))
+        db.session.commit()
+
+    def purge_finished(self):
+        """Delete jobs finished more than LISTING_UPLOAD_JOB_RETENTION_DAYS ago; returns how many."""
+        cutoff = datetime.utcnow() - timedelta(days=self.app.config['LISTING_UPLOAD_JOB_RETENTION_DAYS'])
+        # created_at rather than finished_at, to use ix_upload_jobs_status_created_at
+        removed = db.session.execute(
+            delete(UploadJob).where(UploadJob.status.in_([DONE, FAILED]), UploadJob.created_at < cutoff)
+        ).rowcount
+        db.session.commit()
+        self._purged_at = time.monotonic()
+        return removed
+
+    def poll(self):
+        """Claim queued jobs spooled on this host, up to one per idle worker; returns how many."""
+        self.requeue_stale()
+        if self._purged_at is None or time.monotonic() - self._purged_at > _PURGE_INTERVAL:
+            self.purge_finished()
+        capacity = self.workers - self.busy()
+        if capacity <= 0:
+            return 0
+        queued = db.session.execute(
+            select(UploadJob.id).where(UploadJob.status == QUEUED).order_by(UploadJob.created_at)
+        ).scalars().all()
+        db.session.commit()
+        started = 0
+        for job_id in queued:
+            if started == capacity:
+                break
+            if os.path.isdir(spool_path(self.app, job_id)) and self.run(job_id):
+                started += 1
+        return started
+
+    def start(self):
+        with self.lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.serve, name='upload-jobs', daemon=True)
+            self._thread.start()
+
+    def schedule(self, function, interval):
+        """Have serve() also call function(app) every `interval` seconds (never if 0).
+
+        For maintenance jobs that need a process off the request path: the
+        upload worker is one on every host.
+        """
+        if interval:
+            self._tasks.append([function, interval, time.monotonic() + interval])
+
+    def run_due_tasks(self):
+        for task in self._tasks:
+            function, interval, due = task
+            if time.monotonic() < due:
+                continue
+            task[2] = time.monotonic() + interval
+            try:
+                with self.app.app_context():
+                    function(self.app)
+            except Exception:
+                logger.exception('Scheduled %s failed', function.__name__)
+
+    def serve(self):
+        """Poll for queued jobs forever; also the loop of `flask listings upload-worker`."""
+        while True:
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception:
+                logger.exception('Polling for upload jobs failed')
+            self.run_due_tasks()
+            time.sleep(self.app.config['LISTING_UPLOAD_POLL_INTERVAL'] or 1.0)
+
+
+def wait_for_job(app, job_id, timeout):
+    """The UploadJob (or None), once finished or after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    app.extensions['upload_jobs'].wait(job_id, timeout)
+    while True:
+        job = db.session.get(UploadJob, job_id, populate_existing=True)
+        remaining = deadline - time.monotonic()
+        if job is None or job.finished or remaining <= 0:
+            return job
+        time.sleep(min(_WAIT_POLL_SECONDS, remaining))
+
+
+def init_upload_jobs(app):
+    """The job runner; web workers poll for queued jobs only with LISTING_UPLOAD_JOBS_IN_PROCESS."""
+    runner = app.extensions['upload_jobs'] = UploadJobRunner(app, app.extensions['image_storage'])
+    if app.config['LISTING_UPLOAD_JOBS_IN_PROCESS'] and app.config['LISTING_UPLOAD_POLL_INTERVAL']:
+        app.before_request(runner.start)
@@ -0,0 +1,64 @@
+"""Bytes saved and CPU time per photo for the upload normalization stage.
+
+Compares normalize_image (draft-mode decode, resize, re-encode) with a
+baseline that decodes the full-resolution photo before resizing.
+
+Usage (from backend/):  python -m benchmarks.bench_image_normalization [count] [max_edge]
+"""
+import io
+import random
+import sys
+import time
+
+from PIL import Image, ImageFilter, ImageOps
+
+from app.utils.images import normalize_image
+
+
+def synthetic_photo(seed, size=(4032, 3024)):
+    """A 12 megapixel JPEG with photo-like detail, EXIF orientation and a camera tag."""
+    rng = random.Random(seed)
+    small = Image.effect_noise((size[0] // 8, size[1] // 8), 60).convert('RGB')
+    tint = Image.new('RGB', small.size, tuple(rng.randrange(60, 200) for _ in range(3)))
+    image = Image.blend(small, tint, 0.5).resize(size, Image.Resampling.BICUBIC)
+    image = image.filter(ImageFilter.DETAIL)
+    exif = image.getexif()
+    exif[0x0112] = rng.choice([1, 6, 8])
+    exif[0x010F] = 'PhoneMaker'
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=95, exif=exif.tobytes())
+    return output.getvalue()
+
+
+def full_decode(data, max_edge, quality, output_format):
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.convert('RGB').save(output, format=output_format, quality=quality)
+    return output.getvalue(), None
+
+
+def measure(fn, photos, **options):
+    cpu, size = 0.0, 0
+    for data in photos:
+        start = time.process_time()
+        output, _ = fn(io.BytesIO(data) if fn is normalize_image else data, **options)
+        cpu += time.process_time() - start
+        size += len(output)
+    return cpu / len(photos), size / len(photos)
+
+
+def main(count=5, max_edge=1600):
+    photos = [synthetic_photo(seed) for seed in range(count)]
+    original = sum(map(len, photos)) / count
+    print(f'{count} photos, 4032x3024, average {original / 1e6:.2f} MB; max edge {max_edge}px, quality 80')
+    print(f'{"":<28}{"CPU/photo":>12}{"bytes/photo":>14}{"saved":>8}')
+    for name, fn, output_format in (('full decode + JPEG', full_decode, 'JPEG'),
+                                    ('normalize_image JPEG', normalize_image, 'JPEG'),
+                                    ('normalize_image WEBP', normalize_image, 'WEBP')):
+        cpu, size = measure(fn, photos, max_edge=max_edge, quality=80, output_format=output_format)
+        print(f'{name:<28}{cpu * 1000:9.1f} ms{size / 1e6:11.2f} MB{1 - size / original:8.0%}')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,83 @@
+"""Compare ORM + jsonify listing serialization with the row serializer.
+
+Usage (from backend/):  python -m benchmarks.bench_listing_serialization [count]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+from sqlalchemy.orm import selectinload
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import Listing, ListingImage, User
+from app.utils.serializers import listing_rows, serialize_rows, dumps, orjson
+
+
+class BenchConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+
+def seed(count):
+    user = User(netid='bench')
+    db.session.add(user)
+    db.session.flush()
+    start = datetime(2025, 1, 1)
+    listings = [
+        dict(title=f'Listing {i}', description='Lorem ipsum dolor sit amet. ' * 40,
+             price=10.0 + i % 300, category='books', status='available', user_id=user.id,
+             condition='good', created_at=start + timedelta(seconds=i), updated_at=start)
+        for i in range(count)
+    ]
+    db.session.execute(Listing.__table__.insert(), listings)
+    ids = [row.id for row in db.session.query(Listing.id)]
+    db.session.execute(ListingImage.__table__.insert(), [
+        dict(filename=f'https://res.cloudinary.com/demo/image/upload/{i}_{j}.jpg', listing_id=i)
+        for i in ids for j in range(2)
+    ])
+    db.session.commit()
+
+
+def orm_path():
+    listings = (Listing.query.options(selectinload(Listing.images))
+                .order_by(Listing.created_at.desc()).all())
+    body = jsonify([listing.to_dict() for listing in listings]).get_data()
+    db.session.expunge_all()
+    return body
+
+
+def row_path():
+    rows = listing_rows().order_by(Listing.created_at.desc()).all()
+    return dumps(serialize_rows(rows))
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn())
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main(count=10_000):
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        seed(count)
+        with app.test_request_context():
+            orm_time, orm_size = timed(orm_path)
+            row_time, row_size = timed(row_path)
+    encoder = 'orjson' if orjson is not None else 'stdlib json'
+    print(f'{count} listings, 2 images each')
+    print(f'ORM + to_dict + jsonify : {orm_time * 1000:8.1f} ms  ({orm_size} bytes)')
+    print(f'rows + {encoder:<16}: {row_time * 1000:8.1f} ms  ({row_size} bytes)')
+    print(f'speedup                 : {orm_time / row_time:8.2f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
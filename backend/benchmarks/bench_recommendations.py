@@ -0,0 +1,47 @@
+"""Time the in-memory part of a full recommendations build (co-occurrence
+rows and their top neighbours) on synthetic hearts; no database involved.
+
+Usage (from backend/):  python -m benchmarks.bench_recommendations [hearts] [users] [listings]
+"""
+import random
+import sys
+import time
+
+from app.utils import recommend
+from app.utils.recommend import NEIGHBOURS_PER_LISTING, cooccurrence_rows, top_k
+
+
+def synthetic_hearts(hearts, users, listings, seed=1):
+    """{user_id: [listing_id, ...]} newest first, with a long tail of activity per user."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(users)]
+    total = sum(weights)
+    user_hearts = {}
+    for user_id, weight in enumerate(weights):
+        count = min(max(1, int(hearts * weight / total)), listings, recommend.MAX_HEARTS_PER_USER)
+        user_hearts[user_id] = rng.sample(range(listings), count)
+    return user_hearts
+
+
+def timed_build(user_hearts, listings, cap):
+    recommend.COOCCURRENCE_HEARTS_PER_USER = cap
+    popularity = {}
+    for hearted in user_hearts.values():
+        for listing_id in hearted:
+            popularity[listing_id] = popularity.get(listing_id, 0) + 1
+    start = time.process_time()
+    for listing_id, scale, row in cooccurrence_rows(popularity, user_hearts, popularity, set(range(listings))):
+        if row:
+            top_k(row, NEIGHBOURS_PER_LISTING)
+    return time.process_time() - start
+
+
+def main(hearts=300000, users=10000, listings=20000):
+    user_hearts = synthetic_hearts(hearts, users, listings)
+    print(f'{sum(map(len, user_hearts.values()))} hearts by {users} users on {listings} listings')
+    for cap in (recommend.MAX_HEARTS_PER_USER, recommend.COOCCURRENCE_HEARTS_PER_USER):
+        print(f'pairs from {cap:3d} hearts per user: {timed_build(user_hearts, listings, cap):6.2f} s CPU')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,63 @@
+"""Time upload jobs from POST /api/listing/upload to done with one and with many
+workers against a fake storage server.
+
+Usage (from backend/):  python -m benchmarks.bench_upload_concurrency [files] [latency_ms]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from benchmarks.bench_image_normalization import synthetic_photo
+from benchmarks.fake_storage import FakeStorageServer
+
+
+class BenchConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    LISTING_CHANGE_FEED_BACKGROUND = False
+    LISTING_CHANGES_COMPACT_INTERVAL = 0
+    LISTING_UPLOAD_JOBS_IN_PROCESS = True
+    LISTING_UPLOAD_POLL_INTERVAL = 0
+    # The cheapest encoder, so storage latency dominates; see
+    # bench_image_normalization for the CPU cost per format
+    LISTING_IMAGE_FORMAT = 'JPEG'
+
+
+def timed_upload(workers, images, spool):
+    config = type('Config', (BenchConfig,), {'LISTING_UPLOAD_WORKERS': workers, 'LISTING_UPLOAD_SPOOL': spool})
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    start = time.perf_counter()
+    response = client.post('/api/listing/upload', content_type='multipart/form-data', data={
+        'images': [(io.BytesIO(image), f'photo{i}.jpg') for i, image in enumerate(images)]})
+    assert response.status_code == 202, response.get_json()
+    response = client.get(response.get_json()['status_url'], query_string={'wait': 30})
+    elapsed = time.perf_counter() - start
+    assert response.get_json()['status'] == 'done', response.get_json()
+    return elapsed
+
+
+def main(files=8, latency_ms=200):
+    # Already within the max edge: little CPU work. Distinct, as duplicates are stored once
+    images = [synthetic_photo(seed, size=(1600, 1200)) for seed in range(files)]
+    with FakeStorageServer(latency=latency_ms / 1000) as server, server.configure(), \
+            tempfile.TemporaryDirectory() as spool:
+        sequential = timed_upload(1, images, spool)
+        pooled = timed_upload(files, images, spool)
+    print(f'{files} 1600x1200 photos of {len(images[0]) // 1024} KB, {latency_ms} ms storage latency, '
+          f'{os.cpu_count()} CPUs')
+    print(f'one at a time : {sequential * 1000:8.1f} ms')
+    print(f'{f"{files} workers":<14}: {pooled * 1000:8.1f} ms')
+    print(f'speedup       : {sequential / pooled:8.2f}x')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,58 @@
+"""Time upload jobs for new photos and for the same photos sent again (e.g. a
+listing edit), on the local image storage; runs offline.
+
+Usage (from backend/):  python -m benchmarks.bench_upload_dedup [files]
+"""
+import io
+import sys
+import tempfile
+import time
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from benchmarks.bench_image_normalization import synthetic_photo
+
+
+class BenchConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    LISTING_CHANGE_FEED_BACKGROUND = False
+    LISTING_CHANGES_COMPACT_INTERVAL = 0
+    LISTING_UPLOAD_JOBS_IN_PROCESS = True
+    LISTING_UPLOAD_POLL_INTERVAL = 0
+    LISTING_IMAGE_STORAGE = 'local'
+
+
+def timed_upload(client, images):
+    start = time.perf_counter()
+    response = client.post('/api/listing/upload', content_type='multipart/form-data', data={
+        'images': [(io.BytesIO(image), f'photo{i}.jpg') for i, image in enumerate(images)]})
+    assert response.status_code == 202, response.get_json()
+    response = client.get(response.get_json()['status_url'], query_string={'wait': 60})
+    elapsed = time.perf_counter() - start
+    assert response.get_json()['status'] == 'done', response.get_json()
+    return elapsed
+
+
+def main(files=4):
+    images = [synthetic_photo(seed) for seed in range(files)]
+    with tempfile.TemporaryDirectory() as root:
+        config = type('Config', (BenchConfig,), {'LISTING_UPLOAD_SPOOL': f'{root}/spool',
+                                                 'LISTING_IMAGE_STORAGE_ROOT': f'{root}/images'})
+        app = create_app(config)
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+        first = timed_upload(client, images)
+        again = timed_upload(client, images)
+    size = sum(map(len, images)) // 1024
+    print(f'{files} 12 MP photos, {size} KB in all')
+    print(f'new photos    : {first * 1000:8.1f} ms')
+    print(f'sent again    : {again * 1000:8.1f} ms')
+    print(f'speedup       : {first / again:8.2f}x')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
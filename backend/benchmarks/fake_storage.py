@@ -0,0 +1,103 @@
+"""Local stand-in for Cloudinary's upload API, for tests and benchmarks.
+
+Point the Cloudinary SDK at it with `cloudinary.config(upload_prefix=server.url)`
+(see `FakeStorageServer.configure`). Every upload sleeps `latency` seconds,
+as a network round trip would, then answers like Cloudinary does. The
+uploaded file's bytes are kept in `uploads` by public id (the one sent, or
+a generated one). `classify`, if
+given, is called with them and may return 'fail' for a 500 error or 'slow'
+to sleep `slow_latency` instead.
+"""
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cloudinary
+
+
+def _form_fields(content_type, body):
+    """The parts of a multipart/form-data body, by name."""
+    message = BytesParser().parsebytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+    return {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+            for part in message.get_payload()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        fields = _form_fields(self.headers.get('Content-Type', ''), body)
+        data = fields.get('file', b'')
+        behaviour = server.classify(data) if server.classify else None
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            time.sleep(server.slow_latency if behaviour == 'slow' else server.latency)
+            if behaviour == 'fail':
+                self._reply(500, {'error': {'message': 'Storage unavailable'}})
+                return
+            public_id = fields['public_id'].decode() if 'public_id' in fields else f'upload_{next(server.ids)}'
+            server.uploads[public_id] = data
+            self._reply(200, {
+                'public_id': public_id,
+                'secure_url': f'{server.url}/image/upload/{public_id}',
+                'bytes': len(data),
+            })
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timed out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeStorageServer(ThreadingHTTPServer):
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, latency=0.05, slow_latency=5.0, classify=None):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.classify = classify
+        self.url = f'http://127.0.0.1:{self.server_address[1]}'
+        self.ids = itertools.count(1)
+        self.uploads = {}  # public_id -> uploaded file
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0  # most uploads seen in flight at once
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    @contextmanager
+    def configure(self):
+        """Send Cloudinary SDK uploads here for the duration of the block."""
+        previous = {key: getattr(cloudinary.config(), key, None)
+                    for key in ('cloud_name', 'api_key', 'api_secret', 'upload_prefix')}
+        cloudinary.config(cloud_name='fake', api_key='key', api_secret='secret', upload_prefix=self.url)
+        try:
+            yield self
+        finally:
+            cloudinary.config(**previous)
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask.testing import FlaskClient
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import User, Listing, ListingImage
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    MAIL_SUPPRESS_SEND = True
+    JWT_SECRET_KEY = 'test-secret-key-that-is-long-enough-for-hs256'
+    LISTING_CHANGE_FEED_BACKGROUND = False
+    LISTING_CHANGES_COMPACT_INTERVAL = 0
+    # Upload jobs run when queued; no poller thread sharing the test database
+    LISTING_UPLOAD_JOBS_IN_PROCESS = True
+    LISTING_UPLOAD_POLL_INTERVAL = 0
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class BufferedClient(FlaskClient):
+    """Test client that reads streamed bodies inside the request, like a WSGI server would."""
+
+    def open(self, *args, **kwargs):
+        kwargs.setdefault('buffered', True)
+        return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def client(app):
+    app.test_client_class = BufferedClient
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(netid='seller'):
+        user = User(netid=netid)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def make_listings(app):
+    """Insert `count` listings one minute apart, newest last, each with images."""
+    def make_listings(user, count, category='books', price=10.0, images=2, start=None):
+        start = start or datetime(2025, 5, 1)
+        listings = []
+        for i in range(count):
+            listing = Listing(
+                title=f'Listing {i}',
+                description=f'Description {i}',
+                price=price + i,
+                category=category,
+                status='available',
+                user_id=user.id,
+                created_at=start + timedelta(minutes=i)
+            )
+            db.session.add(listing)
+            listings.append(listing)
+        db.session.flush()
+        for listing in listings:
+            for j in range(images):
+                db.session.add(ListingImage(filename=f'https://img.test/{listing.id}/{j}.jpg',
+                                            listing_id=listing.id))
+        db.session.commit()
+        return listings
+    return make_listings
+
+
+@pytest.fixture
+def auth_headers(app):
+    def auth_headers(user):
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    return auth_headers
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager counting SQL statements issued while it is open."""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+
+    @contextmanager
+    def count_queries():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return count_queries
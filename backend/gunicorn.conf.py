@@ -0,0 +1,65 @@
+# Gunicorn settings for the API.
+#
+# /api/listing/stream keeps a connection open per subscriber, so the default
+# worker class is gevent: idle subscribers are parked greenlets rather than
+# occupied processes, and one worker can hold thousands of them.
+import os
+import subprocess
+import sys
+import threading
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+# Mostly /api/listing/stream subscribers, which hold no database connection;
+# the few responses that do are capped by LISTING_STREAM_MAX_CONCURRENT so
+# the rest share the SQLAlchemy pool (pool_size + max_overflow per worker)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 5000))
+# Streams send a keepalive comment every LISTING_EVENTS_HEARTBEAT seconds,
+# well inside Heroku's 55 second idle window
+keepalive = 75
+timeout = 30
+
+
+def post_worker_init(worker):
+    if worker_class == 'gevent':
+        # Let psycopg2 yield to other greenlets while waiting on PostgreSQL
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+# Upload jobs decode and resize photos, which would stall a gevent worker's
+# event loop, so under gunicorn they run in one `flask listings
+# upload-worker` process per host, sharing the web workers' upload spool.
+# The master restarts it whenever it exits.
+os.environ.setdefault('LISTING_UPLOAD_JOBS_IN_PROCESS', '0')
+_upload_worker = None
+_stopping = threading.Event()
+
+
+def _supervise_upload_worker(server):
+    global _upload_worker
+    while not _stopping.is_set():
+        _upload_worker = subprocess.Popen(
+            [sys.executable, '-m', 'flask', '--app', 'wsgi', 'listings', 'upload-worker'],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        server.log.info('Started upload worker (pid: %s)', _upload_worker.pid)
+        # Returns even if the arbiter reaped the process first (with code 0)
+        code = _upload_worker.wait()
+        if not _stopping.is_set():
+            server.log.error('Upload worker (pid: %s) exited with code %s; restarting',
+                             _upload_worker.pid, code)
+            _stopping.wait(1)
+
+
+def when_ready(server):
+    if os.environ['LISTING_UPLOAD_JOBS_IN_PROCESS'] != '1':
+        threading.Thread(target=_supervise_upload_worker, args=(server,),
+                         name='upload-worker-supervisor', daemon=True).start()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _upload_worker is not None and _upload_worker.poll() is None:
+        _upload_worker.terminate()
+        _upload_worker.wait(timeout)
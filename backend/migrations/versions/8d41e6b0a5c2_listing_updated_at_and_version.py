@@ -0,0 +1,36 @@
+"""Listing updated_at and listings change version
+
+Revision ID: 8d41e6b0a5c2
+Revises: 3f9a2c7d1b4e
+Create Date: 2025-05-03 14:27:09.562114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41e6b0a5c2'
+down_revision = '3f9a2c7d1b4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE listings SET updated_at = created_at')
+
+    op.create_table('listings_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO listings_version (id, version, updated_at) VALUES (1, 0, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    op.drop_table('listings_version')
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
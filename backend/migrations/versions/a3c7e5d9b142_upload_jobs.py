@@ -0,0 +1,35 @@
+"""Upload jobs
+
+Revision ID: a3c7e5d9b142
+Revises: e8b4c1f7a390
+Create Date: 2025-05-19 10:12:44.618203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e5d9b142'
+down_revision = 'e8b4c1f7a390'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upload_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('filenames', sa.JSON(), nullable=False),
+        sa.Column('results', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_upload_jobs_status_created_at', 'upload_jobs', ['status', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_upload_jobs_status_created_at', table_name='upload_jobs')
+    op.drop_table('upload_jobs')
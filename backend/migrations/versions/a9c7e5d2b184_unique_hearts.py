@@ -0,0 +1,78 @@
+"""One heart per user per listing
+
+Revision ID: a9c7e5d2b184
+Revises: f4d1a8c3b752
+Create Date: 2025-05-10 09:31:55.180463
+
+"""
+import math
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c7e5d2b184'
+down_revision = 'f4d1a8c3b752'
+branch_labels = None
+depends_on = None
+
+# Same epoch and default half-life as app.models.trending / Config
+TRENDING_EPOCH = datetime(2025, 1, 1)
+HALF_LIFE_HOURS = 24
+
+
+def recompute_trending(bind):
+    """Rebuild heart_count/trending_score from the (now deduplicated) hearts."""
+    tau = HALF_LIFE_HOURS * 3600 / math.log(2)
+    weights = {}
+    for listing_id, created_at in bind.execute(sa.text(
+            'SELECT listing_id, created_at FROM hearted_listings')):
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        weights.setdefault(listing_id, []).append(
+            ((created_at or TRENDING_EPOCH) - TRENDING_EPOCH).total_seconds() / tau)
+    bind.execute(sa.text('UPDATE listings SET heart_count = 0, trending_score = NULL'))
+    for listing_id, values in weights.items():
+        high = max(values)
+        score = high + math.log(sum(math.exp(value - high) for value in values))
+        bind.execute(sa.text('UPDATE listings SET heart_count = :count, trending_score = :score '
+                             'WHERE id = :id'),
+                     {'count': len(values), 'score': score, 'id': listing_id})
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Keep each user's first heart on a listing
+    op.execute(
+        'DELETE FROM hearted_listings WHERE id NOT IN '
+        '(SELECT min(id) FROM hearted_listings GROUP BY user_id, listing_id)'
+    )
+    recompute_trending(bind)
+
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            # A duplicate inserted after the DELETE fails the build; rerun the migration
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS uq_hearted_listings_user_id_listing_id')
+            op.create_index('uq_hearted_listings_user_id_listing_id', 'hearted_listings',
+                            ['user_id', 'listing_id'], unique=True, postgresql_concurrently=True)
+            op.drop_index('ix_hearted_listings_user_id_listing_id', table_name='hearted_listings',
+                          postgresql_concurrently=True)
+    else:
+        op.create_index('uq_hearted_listings_user_id_listing_id', 'hearted_listings',
+                        ['user_id', 'listing_id'], unique=True)
+        op.drop_index('ix_hearted_listings_user_id_listing_id', table_name='hearted_listings')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index('ix_hearted_listings_user_id_listing_id', 'hearted_listings',
+                            ['user_id', 'listing_id'], postgresql_concurrently=True)
+            op.drop_index('uq_hearted_listings_user_id_listing_id', table_name='hearted_listings',
+                          postgresql_concurrently=True)
+    else:
+        op.create_index('ix_hearted_listings_user_id_listing_id', 'hearted_listings',
+                        ['user_id', 'listing_id'])
+        op.drop_index('uq_hearted_listings_user_id_listing_id', table_name='hearted_listings')
@@ -0,0 +1,33 @@
+"""Precomputed similar listings
+
+Revision ID: b3f8d6e1c925
+Revises: a9c7e5d2b184
+Create Date: 2025-05-12 15:03:41.226850
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f8d6e1c925'
+down_revision = 'a9c7e5d2b184'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `flask listings rebuild-similar`, then kept current on writes
+    op.create_table('listing_similarities',
+        sa.Column('listing_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('rank', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('similar_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('listing_id', 'rank')
+    )
+    op.create_index('ix_listing_similarities_similar_id', 'listing_similarities', ['similar_id'])
+
+
+def downgrade():
+    op.drop_index('ix_listing_similarities_similar_id', table_name='listing_similarities')
+    op.drop_table('listing_similarities')
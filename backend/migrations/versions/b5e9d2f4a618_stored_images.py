@@ -0,0 +1,35 @@
+"""Stored images index and upload job digests
+
+Revision ID: b5e9d2f4a618
+Revises: a3c7e5d9b142
+Create Date: 2025-05-21 15:04:31.927146
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e9d2f4a618'
+down_revision = 'a3c7e5d9b142'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Starts empty: photos stored before are not deduplicated against
+    op.create_table('stored_images',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    # Jobs queued before this have their spooled files hashed when claimed
+    with op.batch_alter_table('upload_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('digests', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('upload_jobs', schema=None) as batch_op:
+        batch_op.drop_column('digests')
+    op.drop_table('stored_images')
@@ -0,0 +1,52 @@
+"""Listing facet counts
+
+Revision ID: b7e3d9f2a614
+Revises: 8d41e6b0a5c2
+Create Date: 2025-05-05 09:41:52.730018
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3d9f2a614'
+down_revision = '8d41e6b0a5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('listing_facet_counts',
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('condition', sa.String(length=50), nullable=False),
+        sa.Column('price_bucket', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('status', 'category', 'condition', 'price_bucket')
+    )
+    # Bucket lower bounds match app.models.facets.PRICE_BUCKETS at this revision
+    op.execute("""
+        INSERT INTO listing_facet_counts (status, category, condition, price_bucket, count)
+        SELECT status, category, condition, price_bucket, COUNT(*)
+        FROM (
+            SELECT COALESCE(status, 'available') AS status,
+                   LOWER(COALESCE(category, '')) AS category,
+                   COALESCE(condition, '') AS condition,
+                   CASE
+                       WHEN price >= 500 THEN 6
+                       WHEN price >= 250 THEN 5
+                       WHEN price >= 100 THEN 4
+                       WHEN price >= 50 THEN 3
+                       WHEN price >= 25 THEN 2
+                       WHEN price >= 10 THEN 1
+                       ELSE 0
+                   END AS price_bucket
+            FROM listings
+        ) AS cells
+        GROUP BY status, category, condition, price_bucket
+    """)
+
+
+def downgrade():
+    op.drop_table('listing_facet_counts')
@@ -0,0 +1,56 @@
+"""Indexes for the listing read paths
+
+Revision ID: c5a8f1e94d27
+Revises: b7e3d9f2a614
+Create Date: 2025-05-06 16:05:44.281937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a8f1e94d27'
+down_revision = 'b7e3d9f2a614'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, partial predicate)
+INDEXES = [
+    ('ix_listings_created_at_id', 'listings', ['created_at', 'id'], None),
+    ('ix_listings_status_created_at_id', 'listings', ['status', 'created_at', 'id'], None),
+    ('ix_listings_user_id_created_at_id', 'listings', ['user_id', 'created_at', 'id'], None),
+    ('ix_listings_buyer_id_created_at_id', 'listings', ['buyer_id', 'created_at', 'id'],
+     'buyer_id IS NOT NULL'),
+    ('ix_listings_price', 'listings', ['price'], None),
+    ('ix_listings_lower_category_created_at_id', 'listings',
+     [sa.text('lower(category)'), 'created_at', 'id'], None),
+    ('ix_listing_images_listing_id_id', 'listing_images', ['listing_id', 'id'], None),
+    ('ix_hearted_listings_user_id_listing_id', 'hearted_listings', ['user_id', 'listing_id'], None),
+    ('ix_hearted_listings_listing_id', 'hearted_listings', ['listing_id'], None),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and lets
+        # reads and writes continue while each index builds.
+        with op.get_context().autocommit_block():
+            for name, table, columns, where in INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')  # left INVALID by a failed build
+                op.create_index(name, table, columns, postgresql_concurrently=True,
+                                postgresql_where=sa.text(where) if where else None)
+    else:
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns,
+                            sqlite_where=sa.text(where) if where else None)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns, where in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, columns, where in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
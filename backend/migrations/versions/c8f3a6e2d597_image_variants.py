@@ -0,0 +1,38 @@
+"""Listing image variants
+
+Revision ID: c8f3a6e2d597
+Revises: b5e9d2f4a618
+Create Date: 2025-05-23 09:48:12.305716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f3a6e2d597'
+down_revision = 'b5e9d2f4a618'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing images have no variants and are served at full size;
+    # stored_images entries without them are processed again when re-uploaded
+    with op.batch_alter_table('listing_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('thumbnail', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('srcset', sa.Text(), nullable=True))
+    with op.batch_alter_table('stored_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('thumbnail', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('srcset', sa.Text(), nullable=True))
+    op.create_index('ix_stored_images_url', 'stored_images', ['url'])
+
+
+def downgrade():
+    op.drop_index('ix_stored_images_url', table_name='stored_images')
+    with op.batch_alter_table('stored_images', schema=None) as batch_op:
+        batch_op.drop_column('srcset')
+        batch_op.drop_column('thumbnail')
+    with op.batch_alter_table('listing_images', schema=None) as batch_op:
+        batch_op.drop_column('srcset')
+        batch_op.drop_column('thumbnail')
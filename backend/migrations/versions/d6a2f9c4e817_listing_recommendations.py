@@ -0,0 +1,49 @@
+"""Heart co-occurrence recommendations
+
+Revision ID: d6a2f9c4e817
+Revises: b3f8d6e1c925
+Create Date: 2025-05-14 10:22:07.514093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6a2f9c4e817'
+down_revision = 'b3f8d6e1c925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('heart_events',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('listing_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Filled by `flask listings build-recommendations`; the first run (with
+    # nothing stored yet) builds everything from the existing hearts
+    op.create_table('listing_cooccurrences',
+        sa.Column('listing_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('rank', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('neighbour_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('listing_id', 'rank')
+    )
+    op.create_index('ix_listing_cooccurrences_neighbour_id', 'listing_cooccurrences', ['neighbour_id'])
+    op.create_table('listing_recommendations',
+        sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('rank', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('listing_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'rank')
+    )
+
+
+def downgrade():
+    op.drop_table('listing_recommendations')
+    op.drop_index('ix_listing_cooccurrences_neighbour_id', table_name='listing_cooccurrences')
+    op.drop_table('listing_cooccurrences')
+    op.drop_table('heart_events')
@@ -0,0 +1,29 @@
+"""Queue of listings whose similar lists need refreshing
+
+Revision ID: d9e4b7a2c168
+Revises: c8f3a6e2d597
+Create Date: 2025-05-26 10:17:35.418902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9e4b7a2c168'
+down_revision = 'c8f3a6e2d597'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drained by `flask listings refresh-similar`
+    op.create_table('similarity_refreshes',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('listing_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('similarity_refreshes')
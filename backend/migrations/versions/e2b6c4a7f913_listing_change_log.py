@@ -0,0 +1,51 @@
+"""Listing change log for delta sync
+
+Revision ID: e2b6c4a7f913
+Revises: c5a8f1e94d27
+Create Date: 2025-05-08 10:12:37.904215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6c4a7f913'
+down_revision = 'c5a8f1e94d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('listing_changes',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True,
+                  nullable=False),
+        sa.Column('listing_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=1), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_listing_changes_listing_id_id', 'listing_changes', ['listing_id', 'id'])
+
+    op.create_table('listing_change_horizon',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('change_id', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO listing_change_horizon (id, change_id) VALUES (1, 0)")
+
+    # Existing listings enter the log as creates, oldest first, so a full
+    # sync (no cursor) returns all of them
+    op.execute(
+        "INSERT INTO listing_changes (listing_id, op, version, created_at) "
+        "SELECT listings.id, 'c', listings_version.version, CURRENT_TIMESTAMP "
+        "FROM listings CROSS JOIN listings_version WHERE listings_version.id = 1 "
+        "ORDER BY listings.created_at, listings.id"
+    )
+
+
+def downgrade():
+    op.drop_table('listing_change_horizon')
+    op.drop_index('ix_listing_changes_listing_id_id', table_name='listing_changes')
+    op.drop_table('listing_changes')
@@ -0,0 +1,48 @@
+"""Listing price sketches
+
+Revision ID: e8b4c1f7a390
+Revises: d6a2f9c4e817
+Create Date: 2025-05-16 11:37:19.402615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.utils.tdigest import TDigest
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b4c1f7a390'
+down_revision = 'd6a2f9c4e817'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    sketches = op.create_table('price_sketches',
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('condition', sa.String(length=50), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('digest', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'category', 'condition')
+    )
+    # The digests are a binary encoding SQL cannot build, so they are filled
+    # here (cells as app.models.pricing.price_cell at this revision); writes
+    # then only ever remove prices that were added
+    listings = sa.table('listings', sa.column('status'), sa.column('category'), sa.column('condition'),
+                        sa.column('price'))
+    digests = {}
+    for status, category, condition, price in op.get_bind().execute(
+            sa.select(listings.c.status, listings.c.category, listings.c.condition, listings.c.price)):
+        cell = ('sold' if status == 'sold' else 'asking', (category or '').lower(), condition or '')
+        digests.setdefault(cell, TDigest()).add(price)
+    if digests:
+        op.bulk_insert(sketches, [
+            {'kind': kind, 'category': category, 'condition': condition,
+             'count': digest.count, 'digest': digest.to_bytes()}
+            for (kind, category, condition), digest in digests.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('price_sketches')
@@ -0,0 +1,61 @@
+"""Listing heart counts and trending scores
+
+Revision ID: f4d1a8c3b752
+Revises: e2b6c4a7f913
+Create Date: 2025-05-09 11:48:20.617392
+
+"""
+import math
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4d1a8c3b752'
+down_revision = 'e2b6c4a7f913'
+branch_labels = None
+depends_on = None
+
+# Same epoch and default half-life as app.models.trending / Config
+TRENDING_EPOCH = datetime(2025, 1, 1)
+HALF_LIFE_HOURS = 24
+
+
+def upgrade():
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heart_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('trending_score', sa.Float(), nullable=True))
+
+    # Backfill from existing hearts: count, and log-sum-exp of heart weights
+    bind = op.get_bind()
+    tau = HALF_LIFE_HOURS * 3600 / math.log(2)
+    weights = {}
+    for listing_id, created_at in bind.execute(sa.text(
+            'SELECT listing_id, created_at FROM hearted_listings')):
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        weights.setdefault(listing_id, []).append(
+            ((created_at or TRENDING_EPOCH) - TRENDING_EPOCH).total_seconds() / tau)
+    for listing_id, values in weights.items():
+        high = max(values)
+        score = high + math.log(sum(math.exp(value - high) for value in values))
+        bind.execute(sa.text('UPDATE listings SET heart_count = :count, trending_score = :score '
+                             'WHERE id = :id'),
+                     {'count': len(values), 'score': score, 'id': listing_id})
+
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index('ix_listings_status_trending_score_id', 'listings',
+                            ['status', 'trending_score', 'id'], postgresql_concurrently=True)
+    else:
+        op.create_index('ix_listings_status_trending_score_id', 'listings',
+                        ['status', 'trending_score', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_listings_status_trending_score_id', table_name='listings')
+    with op.batch_alter_table('listings', schema=None) as batch_op:
+        batch_op.drop_column('trending_score')
+        batch_op.drop_column('heart_count')
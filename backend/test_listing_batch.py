@@ -0,0 +1,24 @@
+def test_batch_preserves_order_and_reports_missing(client, make_user, make_listings, count_queries):
+    ids = [listing.id for listing in make_listings(make_user(), 5)]
+    requested = [ids[3], 999, ids[0], ids[3], ids[4]]
+
+    with count_queries() as statements:
+        body = client.get('/api/listing/batch?ids=' + ','.join(map(str, requested))).get_json()
+    assert [listing['id'] for listing in body['listings']] == [ids[3], ids[0], ids[4]]
+    assert body['missing'] == [999]
+    assert all(len(listing['images']) == 2 for listing in body['listings'])
+    # version lookup, listings, images
+    assert len(statements) == 3
+
+
+def test_batch_honours_fields(client, make_user, make_listings):
+    listing_id = make_listings(make_user(), 1)[0].id
+    body = client.get(f'/api/listing/batch?ids={listing_id}&fields=id,price').get_json()
+    assert body == {'listings': [{'id': listing_id, 'price': 10.0}], 'missing': []}
+
+
+def test_batch_validates_ids(app, client):
+    assert client.get('/api/listing/batch').status_code == 400
+    assert client.get('/api/listing/batch?ids=1,abc').status_code == 400
+    too_many = ','.join(str(i) for i in range(app.config['LISTING_BATCH_MAX_IDS'] + 1))
+    assert client.get(f'/api/listing/batch?ids={too_many}').status_code == 400
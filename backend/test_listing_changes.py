@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models import Listing, ListingChange, ListingChangeHorizon
+from app.utils.change_log import compact_change_log
+
+
+def changes(client, since=None, **params):
+    if since is not None:
+        params['since'] = since
+    response = client.get('/api/listing/changes', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_full_then_incremental_sync(client, make_user, make_listings):
+    user = make_user()
+    listings = make_listings(user, 3)
+    first = changes(client)
+    assert sorted(listing['id'] for listing in first['upserts']) == [listing.id for listing in listings]
+    assert first['tombstones'] == [] and first['has_more'] is False
+
+    assert changes(client, first['cursor']) == {
+        'upserts': [], 'tombstones': [], 'cursor': first['cursor'], 'has_more': False}
+
+    listings[0].status = 'sold'
+    db.session.delete(listings[1])
+    db.session.commit()
+    delta = changes(client, first['cursor'])
+    assert [(listing['id'], listing['status']) for listing in delta['upserts']] == [(listings[0].id, 'sold')]
+    assert delta['tombstones'] == [listings[1].id]
+
+
+def test_changes_page_through_the_log(client, make_user, make_listings):
+    listings = make_listings(make_user(), 5)
+    seen, cursor, has_more = [], None, True
+    while has_more:
+        page = changes(client, cursor, limit=2, fields='id,price')
+        seen += page['upserts']
+        cursor, has_more = page['cursor'], page['has_more']
+    # Each listing was logged twice (created, then its images added)
+    assert {listing['id'] for listing in seen} == {listing.id for listing in listings}
+    assert all(set(listing) == {'id', 'price'} for listing in seen)
+
+
+def test_compaction_keeps_what_clients_need(app, client, make_user, make_listings):
+    user = make_user()
+    listings = make_listings(user, 2)
+    cursor = changes(client)['cursor']
+    for price in (20, 30, 40):
+        listings[0].price = price
+        db.session.commit()
+    deleted_id = listings[1].id
+    db.session.delete(listings[1])
+    db.session.commit()
+    before = changes(client, cursor)
+
+    assert compact_change_log(app) == (6, 0)  # every row but the newest per listing
+    assert db.session.query(ListingChange).count() == 2
+    assert changes(client, cursor) == before
+    assert [listing['id'] for listing in changes(client)['upserts']] == [listings[0].id]
+
+    # Tombstones past retention go, and cursors from before them expire
+    db.session.query(ListingChange).filter_by(listing_id=deleted_id).update(
+        {'created_at': datetime.utcnow() - timedelta(days=31)})
+    db.session.commit()
+    assert compact_change_log(app) == (0, 1)
+    assert ListingChangeHorizon.current().change_id > int(cursor)
+    response = client.get('/api/listing/changes', query_string={'since': cursor})
+    assert response.status_code == 410 and response.get_json()['reset'] is True
+    assert [listing['id'] for listing in changes(client)['upserts']] == [listings[0].id]
+
+
+def test_invalid_cursor(client):
+    assert client.get('/api/listing/changes?since=abc').status_code == 400
+
+
+def test_compact_command(app, make_user, make_listings):
+    listing = make_listings(make_user(), 1)[0]
+    listing.title = 'Renamed'
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['listings', 'compact-changes'])
+    assert 'Removed 2 superseded changes and 0 expired tombstones.' in result.output
+    assert db.session.query(ListingChange).filter_by(listing_id=listing.id).count() == 1
+    assert db.session.get(Listing, listing.id).title == 'Renamed'
@@ -0,0 +1,46 @@
+def test_feed_revalidates_with_etag(client, make_user, make_listings, count_queries):
+    make_listings(make_user(), 3)
+    first = client.get('/api/listing/')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.last_modified is not None
+
+    with count_queries() as statements:
+        second = client.get('/api/listing/', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert len(statements) == 1
+
+    # Different filters are different representations
+    filtered = client.get('/api/listing/?category=books', headers={'If-None-Match': etag})
+    assert filtered.status_code == 200
+
+
+def test_feed_etag_changes_on_any_write(client, make_user, make_listings):
+    listing = make_listings(make_user(), 2)[0]
+    etag = client.get('/api/listing/').headers['ETag']
+
+    client.patch(f'/api/listing/{listing.id}/status', json={'status': 'sold'})
+    response = client.get('/api/listing/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_single_listing_conditional_get(client, make_user, make_listings):
+    listing_id = make_listings(make_user(), 1)[0].id
+    first = client.get(f'/api/listing/{listing_id}')
+    etag = first.headers['ETag']
+
+    assert client.get(f'/api/listing/{listing_id}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/api/listing/{listing_id}',
+                      headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+
+    client.put(f'/api/listing/{listing_id}', json={'images': []})
+    response = client.get(f'/api/listing/{listing_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['images'] == []
+
+
+def test_missing_listing_is_not_conditional(client):
+    response = client.get('/api/listing/999', headers={'If-None-Match': '"anything"'})
+    assert response.status_code != 304
+    assert 'ETag' not in response.headers
@@ -0,0 +1,75 @@
+from app.extensions import db
+from app.models import Listing, ListingFacetCount
+from app.models.facets import price_bucket
+
+
+def create(client, user, **fields):
+    payload = {'title': 'Item', 'description': 'd', 'price': 10, 'user_id': user.id}
+    payload.update(fields)
+    return client.post('/api/listing', json=payload).get_json()['id']
+
+
+def test_facets_follow_creates_updates_and_deletes(client, make_user):
+    user = make_user()
+    first = create(client, user, category='books', condition='good', price=5)
+    create(client, user, category='books', condition='new', price=30)
+    create(client, user, category='shoes', condition='good', price=120)
+
+    facets = client.get('/api/listing/facets').get_json()
+    assert facets['total'] == 3
+    assert facets['categories'] == {'books': 2, 'shoes': 1}
+    assert facets['conditions'] == {'good': 2, 'new': 1}
+    assert [bucket['count'] for bucket in facets['price_histogram']] == [1, 0, 1, 0, 1, 0, 0]
+
+    client.put(f'/api/listing/{first}', json={'category': 'shoes', 'price': 600})
+    client.patch(f'/api/listing/{first}/status', json={'status': 'sold'})
+    facets = client.get('/api/listing/facets?status=available').get_json()
+    assert facets['total'] == 2
+    assert facets['categories'] == {'books': 1, 'shoes': 1}
+    assert facets['statuses'] == {'available': 2, 'sold': 1}
+
+    client.delete(f'/api/listing/{first}')
+    assert client.get('/api/listing/facets').get_json()['statuses'] == {'available': 2}
+
+
+def test_each_facet_ignores_its_own_filter(client, make_user):
+    user = make_user()
+    create(client, user, category='books', price=5)
+    create(client, user, category='shoes', price=5)
+    create(client, user, category='shoes', price=300)
+
+    facets = client.get('/api/listing/facets?category=shoes&max_price=20').get_json()
+    assert facets['total'] == 1
+    assert facets['categories'] == {'books': 1, 'shoes': 1}
+    assert [bucket['count'] for bucket in facets['price_histogram']][0::5] == [1, 1]
+
+
+def test_max_price_inside_a_bucket_matches_the_feed(client, make_user):
+    user = make_user()
+    create(client, user, category='books', price=12)
+    create(client, user, category='books', price=15)
+    create(client, user, category='shoes', price=20)
+    create(client, user, category='shoes', price=24)
+
+    facets = client.get('/api/listing/facets?max_price=15').get_json()
+    feed = client.get('/api/listing/?max_price=15').get_json()
+    assert facets['total'] == len(feed) == 2
+    assert facets['categories'] == {'books': 2}
+    assert facets['price_histogram'][1]['count'] == 4
+
+
+def test_counts_match_a_full_scan(client, make_user, make_listings):
+    user = make_user()
+    make_listings(user, 7, category='Books', price=8)
+    make_listings(user, 3, category='furniture', price=240)
+    for listing in Listing.query.filter(Listing.price > 245):
+        listing.status = 'pending'
+    db.session.commit()
+
+    expected = {}
+    for listing in Listing.query:
+        cell = (listing.status, listing.category.lower(), listing.condition, price_bucket(listing.price))
+        expected[cell] = expected.get(cell, 0) + 1
+    stored = {(cell.status, cell.category, cell.condition, cell.price_bucket): cell.count
+              for cell in ListingFacetCount.query if cell.count}
+    assert stored == expected
@@ -0,0 +1,72 @@
+from app.extensions import db
+from app.models import ListingsVersion
+
+
+def store_of(app):
+    return app.extensions['listing_feed_store']
+
+
+def change_feed(app):
+    return app.extensions['listing_change_feed']
+
+
+def feed(client, query='', **kwargs):
+    return client.get(f'/api/listing/?status=available{query}', **kwargs)
+
+
+def test_feed_is_served_from_memory_once_loaded(app, client, make_user, make_listings, count_queries):
+    make_listings(make_user(), 5, category='books')
+    from_db = feed(client).get_json()
+
+    change_feed(app).sync()
+    with count_queries() as statements:
+        from_store = feed(client).get_json()
+    assert from_store == from_db
+    assert statements == []
+
+
+def test_store_pages_and_filters_like_the_database(app, client, make_user, make_listings):
+    user = make_user()
+    make_listings(user, 12, category='books', price=5)
+    make_listings(user, 8, category='Shoes', price=40)
+    queries = ['&limit=5', '&category=shoes', '&category=books&max_price=9&limit=2',
+               '&max_price=12', '&fields=id,image&limit=7']
+    expected = [feed(client, query).get_json() for query in queries]
+
+    change_feed(app).sync()
+    for query, body in zip(queries, expected):
+        assert feed(client, query).get_json() == body
+
+    cursor = feed(client, '&limit=5').get_json()['next_cursor']
+    db_page = client.get(f'/api/listing/?status=available&limit=5&cursor={cursor}&include=seller').get_json()
+    store_page = feed(client, f'&limit=5&cursor={cursor}').get_json()
+    assert [l['id'] for l in store_page['listings']] == [l['id'] for l in db_page['listings']]
+
+
+def test_store_applies_change_events(app, client, make_user, make_listings):
+    listings = make_listings(make_user(), 3)
+    change_feed(app).sync()
+    etag = feed(client).headers['ETag']
+
+    listings[0].status = 'sold'
+    listings[1].title = 'Renamed'
+    db.session.commit()
+    # What the PostgreSQL NOTIFY for that commit carries
+    version = ListingsVersion.current().version
+    change_feed(app).receive([f'{version}:u{listings[0].id},u{listings[1].id}'])
+
+    response = feed(client, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [listing['title'] for listing in body] == ['Listing 2', 'Renamed']
+    assert feed(client, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_requests_the_store_cannot_answer_go_to_the_database(app, client, make_user, make_listings,
+                                                              count_queries):
+    make_listings(make_user(), 2)
+    change_feed(app).sync()
+    for url in ['/api/listing/', '/api/listing/?status=sold', '/api/listing/?status=available&include=seller']:
+        with count_queries() as statements:
+            assert client.get(url).status_code == 200
+        assert statements
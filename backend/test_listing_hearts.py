@@ -0,0 +1,94 @@
+from app.extensions import db
+from app.models import HeartedListing, Listing
+
+
+def heart(client, listing_id, headers):
+    return client.post(f'/api/listing/{listing_id}/heart', headers=headers)
+
+
+def unheart(client, listing_id, headers):
+    return client.delete(f'/api/listing/{listing_id}/heart', headers=headers)
+
+
+def test_heart_is_one_idempotent_upsert(client, make_user, make_listings, auth_headers, count_queries):
+    listing = make_listings(make_user(), 1)[0]
+    headers = auth_headers(make_user('fan'))
+
+    with count_queries() as first:
+        assert heart(client, listing.id, headers).status_code == 200
+    with count_queries() as repeat:
+        assert heart(client, listing.id, headers).status_code == 200
+
+    inserts = [sql for sql in first if sql.startswith('INSERT INTO hearted_listings')]
+    assert len(inserts) == 1 and 'ON CONFLICT' in inserts[0]
+    assert not any(sql.startswith('UPDATE listings') for sql in repeat)  # counters untouched
+    assert db.session.query(HeartedListing).count() == 1
+    db.session.expire_all()
+    assert db.session.get(Listing, listing.id).heart_count == 1
+
+
+def test_unheart_is_one_idempotent_delete(client, make_user, make_listings, auth_headers, count_queries):
+    listing = make_listings(make_user(), 1)[0]
+    headers = auth_headers(make_user('fan'))
+    heart(client, listing.id, headers)
+
+    with count_queries() as statements:
+        assert unheart(client, listing.id, headers).status_code == 200
+    assert unheart(client, listing.id, headers).status_code == 200
+
+    deletes = [sql for sql in statements if sql.startswith('DELETE FROM hearted_listings')]
+    assert len(deletes) == 1 and 'RETURNING' in deletes[0]
+    assert db.session.query(HeartedListing).count() == 0
+    db.session.expire_all()
+    assert db.session.get(Listing, listing.id).heart_count == 0
+
+
+def test_only_available_listings_can_be_hearted(client, make_user, make_listings, auth_headers):
+    listing = make_listings(make_user(), 1)[0]
+    listing.status = 'sold'
+    db.session.commit()
+    headers = auth_headers(make_user('fan'))
+
+    response = heart(client, listing.id, headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Listing is not available'
+    assert heart(client, listing.id + 1, headers).status_code == 404
+    assert db.session.query(HeartedListing).count() == 0
+
+
+def test_hearted_ids_are_compact_and_conditional(client, make_user, make_listings, auth_headers,
+                                                 count_queries):
+    listings = make_listings(make_user(), 5)
+    headers = auth_headers(make_user('fan'))
+    for listing in (listings[3], listings[0], listings[4]):
+        heart(client, listing.id, headers)
+    expected = sorted(listing.id for listing in (listings[0], listings[3], listings[4]))
+
+    with count_queries() as statements:
+        response = client.get('/api/listing/hearted/ids', headers=headers)
+    assert response.get_json() == {'encoding': 'plain', 'ids': expected}
+    assert len(statements) == 1
+
+    delta = client.get('/api/listing/hearted/ids?encoding=delta', headers=headers).get_json()
+    assert delta['encoding'] == 'delta'
+    decoded, total = [], 0
+    for gap in delta['ids']:
+        total += gap
+        decoded.append(total)
+    assert decoded == expected
+
+    etag = response.headers['ETag']
+    cached = client.get('/api/listing/hearted/ids', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+    unheart(client, listings[0].id, headers)
+    changed = client.get('/api/listing/hearted/ids', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()['ids'] == expected[1:]
+
+
+def test_hearted_ids_are_per_user(client, make_user, make_listings, auth_headers):
+    listing = make_listings(make_user(), 1)[0]
+    heart(client, listing.id, auth_headers(make_user('fan')))
+    other = client.get('/api/listing/hearted/ids', headers=auth_headers(make_user('other')))
+    assert other.get_json()['ids'] == []
+    assert client.get('/api/listing/hearted/ids').status_code == 401
@@ -0,0 +1,61 @@
+import io
+from PIL import Image
+from app.utils.images import normalize_image, image_variants
+
+
+def encode(image, format='JPEG', **options):
+    output = io.BytesIO()
+    image.save(output, format=format, **options)
+    output.seek(0)
+    return output
+
+
+def open_normalized(stream, **options):
+    data, content_type = normalize_image(stream, **{'max_edge': 100, 'quality': 80, **options})
+    return Image.open(io.BytesIO(data)), content_type
+
+
+def test_photo_is_upright_small_and_stripped():
+    source = Image.new('RGB', (400, 200), (10, 120, 200))
+    exif = source.getexif()
+    exif[0x0112] = 6  # orientation: rotate 90 clockwise to view
+    exif[0x010F] = 'PhoneMaker'
+    image, content_type = open_normalized(encode(source, exif=exif.tobytes(), icc_profile=b'fake-icc'))
+
+    assert content_type == 'image/webp'
+    assert image.format == 'WEBP'
+    assert image.size == (50, 100)
+    assert not image.getexif()
+    assert 'xmp' not in image.info
+    assert image.info.get('icc_profile') == b'fake-icc'
+
+
+def test_large_jpeg_decodes_in_draft_mode():
+    source = encode(Image.new('RGB', (4000, 3000), (90, 90, 90)), quality=95)
+    image = Image.open(source)
+    image.draft('RGB', (100, 100))
+    assert image.size == (500, 375)  # decoded at 1/8 scale
+
+    source.seek(0)
+    image, _ = open_normalized(source, output_format='JPEG')
+    assert image.format == 'JPEG'
+    assert image.size == (100, 75)
+
+
+def test_transparency_is_kept_in_webp_and_flattened_in_jpeg():
+    source = Image.new('RGBA', (20, 20), (255, 0, 0, 0))
+    image, _ = open_normalized(encode(source, format='PNG'))
+    assert image.mode == 'RGBA'
+
+    image, content_type = open_normalized(encode(source, format='PNG'), output_format='JPEG')
+    assert content_type == 'image/jpeg'
+    assert image.mode == 'RGB'
+    assert all(channel > 250 for channel in image.getpixel((10, 10)))
+
+
+def test_variants_come_from_one_decode_in_the_order_asked():
+    source = encode(Image.new('RGB', (800, 400), (10, 120, 200)))
+    variants = image_variants(source, [100, 400, 24], quality=80)
+    assert [size for _, _, size in variants] == [(100, 50), (400, 200), (24, 12)]
+    assert all(content_type == 'image/webp' for _, content_type, _ in variants)
+    assert Image.open(io.BytesIO(variants[2][0])).size == (24, 12)
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+from app import create_app
+from app.extensions import db
+from app.models import Listing, HeartedListing, ListingImage, User, trending_listings
+from app.utils.serializers import listing_rows
+from conftest import TestConfig
+
+
+def explain(query):
+    """Query plan text for a legacy Query, on whichever database is bound."""
+    bind = db.session.get_bind()
+    sql = query.statement.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True})
+    if bind.dialect.name == 'postgresql':
+        rows = db.session.execute(text(f'EXPLAIN {sql}')).scalars()
+    else:
+        rows = (row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+    return '\n'.join(rows)
+
+
+def newest_first(query):
+    return query.order_by(Listing.created_at.desc(), Listing.id.desc()).limit(51)
+
+
+HOT_QUERIES = [
+    ('ix_listings_created_at_id', lambda: newest_first(listing_rows())),
+    ('ix_listings_lower_category_created_at_id',
+     lambda: newest_first(listing_rows().filter(db.func.lower(Listing.category) == 'books'))),
+    ('ix_listings_status_created_at_id',
+     lambda: newest_first(listing_rows().filter(Listing.status == 'available'))),
+    ('ix_listings_user_id_created_at_id',
+     lambda: newest_first(listing_rows().join(User, Listing.user_id == User.id)
+                          .filter(User.netid == 'seller'))),
+    ('ix_listings_buyer_id_created_at_id',
+     lambda: newest_first(listing_rows().filter(Listing.buyer_id == 1))),
+    ('ix_listing_images_listing_id_id',
+     lambda: db.session.query(ListingImage.listing_id, ListingImage.filename)
+     .filter(ListingImage.listing_id.in_([1, 2, 3])).order_by(ListingImage.id)),
+    ('ix_listings_status_trending_score_id',
+     lambda: trending_listings(listing_rows(), 20)),
+    ('uq_hearted_listings_user_id_listing_id',
+     lambda: db.session.query(HeartedListing.listing_id).filter(HeartedListing.user_id == 1)),
+    # facet counts for the price bucket max_price falls inside
+    ('ix_listings_price',
+     lambda: db.session.query(Listing.status, db.func.count())
+     .filter(Listing.price >= 10, Listing.price <= 15).group_by(Listing.status)),
+    # who hearted the listings whose hearts changed, for the recommendations update
+    ('ix_hearted_listings_listing_id',
+     lambda: db.session.query(HeartedListing.user_id)
+     .filter(HeartedListing.listing_id.in_([1, 2, 3])).distinct()),
+]
+
+
+@pytest.mark.parametrize('index, build_query', HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES])
+def test_hot_queries_use_their_index(app, index, build_query):
+    assert index in explain(build_query())
+
+
+class PostgresConfig(TestConfig):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_POSTGRES_URL')
+
+
+@pytest.mark.skipif(not PostgresConfig.SQLALCHEMY_DATABASE_URI,
+                    reason='set TEST_POSTGRES_URL to check PostgreSQL plans')
+@pytest.mark.parametrize('index, build_query', HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES])
+def test_hot_queries_use_their_index_on_postgres(index, build_query):
+    app = create_app(PostgresConfig)
+    with app.app_context():
+        db.create_all()
+        try:
+            # Empty tables make a sequential scan look free; ask whether the index is usable
+            db.session.execute(text('SET enable_seqscan = off'))
+            assert index in explain(build_query())
+        finally:
+            db.session.rollback()
+            db.drop_all()
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from app.extensions import db
+from app.models import HeartedListing
+
+
+def collect_pages(client, url, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        query = f'{url}{"&" if "?" in url else "?"}limit={limit}'
+        if cursor:
+            query += f'&cursor={cursor}'
+        body = client.get(query).get_json()
+        ids.extend(listing['id'] for listing in body['listings'])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return ids, pages
+
+
+def test_unpaginated_feed_is_plain_array(client, make_user, make_listings):
+    make_listings(make_user(), 3)
+    body = client.get('/api/listing/').get_json()
+    assert isinstance(body, list)
+    assert [listing['title'] for listing in body] == ['Listing 2', 'Listing 1', 'Listing 0']
+
+
+def test_keyset_pages_cover_feed_in_order(client, make_user, make_listings):
+    listings = make_listings(make_user(), 25)
+    ids, pages = collect_pages(client, '/api/listing/', 10)
+    assert pages == 3
+    assert ids == [listing.id for listing in reversed(listings)]
+
+
+def test_pages_are_stable_when_created_at_ties(client, make_user, make_listings):
+    user = make_user()
+    same_time = datetime(2025, 5, 1)
+    make_listings(user, 5, start=same_time)
+    for listing in make_listings(user, 5, start=same_time):
+        listing.created_at = same_time
+    db.session.commit()
+    ids, _ = collect_pages(client, '/api/listing/', 3)
+    assert len(ids) == len(set(ids)) == 10
+
+
+def test_pagination_respects_filters(client, make_user, make_listings):
+    user = make_user()
+    make_listings(user, 6, category='books', price=10)
+    make_listings(user, 4, category='shoes', price=10)
+    body = client.get('/api/listing/?category=shoes&max_price=12&limit=2').get_json()
+    assert [listing['category'] for listing in body['listings']] == ['shoes', 'shoes']
+    assert body['total_estimate'] == 3
+    ids, _ = collect_pages(client, '/api/listing/?category=shoes&max_price=12', 2)
+    assert len(ids) == 3
+
+
+def test_user_buyer_and_hearted_pagination(client, make_user, make_listings, auth_headers):
+    seller, buyer = make_user('seller'), make_user('buyer')
+    listings = make_listings(seller, 5)
+    for listing in listings[:3]:
+        listing.buyer_id = buyer.id
+        db.session.add(HeartedListing(user_id=buyer.id, listing_id=listing.id))
+    db.session.commit()
+
+    ids, _ = collect_pages(client, '/api/listing/user?netid=seller', 2)
+    assert len(ids) == 5
+    ids, _ = collect_pages(client, '/api/listing/buyer?netid=buyer', 2)
+    assert ids == [listing.id for listing in reversed(listings[:3])]
+
+    body = client.get('/api/listing/hearted?limit=2', headers=auth_headers(buyer)).get_json()
+    assert len(body['listings']) == 2 and body['next_cursor']
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get('/api/listing/?cursor=not-a-cursor')
+    assert response.status_code == 400
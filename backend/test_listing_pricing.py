@@ -0,0 +1,95 @@
+import random
+import pytest
+from app.extensions import db
+from app.models import PriceSketch
+from app.models.pricing import rebuild_price_sketches
+from app.utils.tdigest import TDigest
+
+
+def create(client, user, **fields):
+    payload = {'title': 'Item', 'description': 'd', 'price': 10, 'user_id': user.id,
+               'category': 'books', 'condition': 'good'}
+    payload.update(fields)
+    return client.post('/api/listing', json=payload).get_json()['id']
+
+
+def suggestion(client, **params):
+    response = client.get('/api/listing/price-suggestion', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def stored_digests():
+    return {(sketch.kind, sketch.category, sketch.condition): TDigest.from_bytes(sketch.digest).centroids()
+            for sketch in PriceSketch.query if sketch.count}
+
+
+def test_digest_quantiles_round_trip_and_removal():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(3, 1) for _ in range(20000))
+    digest = TDigest()
+    for value in values:
+        digest.add(value)
+    for q in (0.25, 0.5, 0.75):
+        assert digest.quantile(q) == pytest.approx(values[int(q * len(values))], rel=0.02)
+
+    data = digest.to_bytes()
+    assert len(data) < 2000
+    restored = TDigest.from_bytes(data)
+    assert restored.count == 20000
+    assert restored.quantile(0.5) == digest.quantile(0.5)
+
+    for value in values[:10000]:
+        restored.remove(value)
+    assert restored.count == 10000
+    assert restored.quantile(0.5) == pytest.approx(values[15000], rel=0.05)
+    assert TDigest().quantile(0.5) is None
+
+
+def test_suggestion_follows_creates_reprices_and_sales(client, make_user, count_queries):
+    user = make_user()
+    ids = [create(client, user, price=price) for price in (10, 20, 30, 40, 50)]
+    create(client, user, price=500, condition='new')
+    create(client, user, price=5, category='shoes')
+
+    result = suggestion(client, category='Books', condition='good')
+    assert result['asking'] == {'count': 5, 'low': 17.5, 'median': 30, 'high': 42.5}
+    assert result['sold']['count'] == 0
+    assert result['suggested'] == 30
+    assert suggestion(client, category='books')['asking']['count'] == 6
+
+    client.put(f'/api/listing/{ids[0]}', json={'price': 60})
+    client.put(f'/api/listing/{ids[1]}', json={'title': 'Renamed'})
+    assert suggestion(client, category='books', condition='good')['asking']['median'] == 40
+
+    for listing_id in ids:
+        client.patch(f'/api/listing/{listing_id}/status', json={'status': 'sold'})
+    result = suggestion(client, category='books', condition='good')
+    assert result['asking']['count'] == 0
+    assert result['sold'] == {'count': 5, 'low': 27.5, 'median': 40, 'high': 52.5}
+    assert result['suggested'] == 40
+
+    client.delete(f'/api/listing/{ids[0]}')
+    assert suggestion(client, category='books', condition='good')['sold']['count'] == 4
+
+    with count_queries() as statements:
+        suggestion(client, category='books')
+    assert not [sql for sql in statements if 'FROM listings ' in sql or sql.endswith('FROM listings')]
+
+
+def test_suggestion_requires_a_category(client):
+    assert client.get('/api/listing/price-suggestion').status_code == 400
+
+
+def test_rebuild_matches_incremental_sketches(app, client, make_user, make_listings):
+    user = make_user()
+    make_listings(user, 6, category='Books', price=8)
+    make_listings(user, 3, category='furniture', price=240)
+    listing_id = create(client, user, price=15)
+    client.patch(f'/api/listing/{listing_id}/status', json={'status': 'sold'})
+    incremental = stored_digests()
+
+    result = app.test_cli_runner().invoke(args=['listings', 'rebuild-price-sketches'])
+    assert 'Rebuilt 3 price sketches.' in result.output
+    assert stored_digests() == incremental
+    assert rebuild_price_sketches(db.session) == 3
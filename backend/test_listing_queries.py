@@ -0,0 +1,59 @@
+import pytest
+
+from app.extensions import db
+from app.models import HeartedListing
+
+
+def queries_for(client, count_queries, url, **kwargs):
+    with count_queries() as statements:
+        response = client.get(url, **kwargs)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/listing/',
+    '/api/listing/?limit=500',
+    '/api/listing/user?netid=seller',
+    '/api/listing/buyer?netid=seller',
+])
+def test_collection_query_count_is_flat(client, make_user, make_listings, count_queries, url):
+    seller = make_user('seller')
+    listings = make_listings(seller, 5)
+    for listing in listings:
+        listing.buyer_id = seller.id
+    db.session.commit()
+    db.session.expire_all()
+    small = queries_for(client, count_queries, url)
+
+    for listing in make_listings(seller, 45, start=listings[-1].created_at):
+        listing.buyer_id = seller.id
+    db.session.commit()
+    db.session.expire_all()
+    assert queries_for(client, count_queries, url) == small
+
+
+def test_hearted_query_count_is_flat(client, make_user, make_listings, count_queries, auth_headers):
+    user = make_user()
+
+    def heart(listings):
+        for listing in listings:
+            db.session.add(HeartedListing(user_id=user.id, listing_id=listing.id))
+        db.session.commit()
+        db.session.expire_all()
+
+    heart(make_listings(user, 3))
+    small = queries_for(client, count_queries, '/api/listing/hearted', headers=auth_headers(user))
+    heart(make_listings(user, 30))
+    assert queries_for(client, count_queries, '/api/listing/hearted', headers=auth_headers(user)) == small
+
+
+def test_single_listing_loads_seller_and_images_in_fixed_queries(client, make_user, make_listings, count_queries):
+    listing_id = make_listings(make_user('seller'), 1, images=4)[0].id
+    db.session.expire_all()
+    with count_queries() as statements:
+        body = client.get(f'/api/listing/{listing_id}').get_json()
+    assert body['user_netid'] == 'seller'
+    assert len(body['images']) == 4
+    # ETag validator lookup, listing joined with seller, images
+    assert len(statements) == 3
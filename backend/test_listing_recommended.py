@@ -0,0 +1,88 @@
+import pytest
+from app.extensions import db
+from app.models import HeartEvent, ListingCooccurrence, ListingRecommendation
+from app.utils.recommend import cooccurrence_scores
+
+
+def heart(client, listing_id, headers):
+    assert client.post(f'/api/listing/{listing_id}/heart', headers=headers).status_code == 200
+
+
+def build(app, *args):
+    result = app.test_cli_runner().invoke(args=['listings', 'build-recommendations', *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def recommended(client, headers, **params):
+    response = client.get('/api/listing/recommended', headers=headers, query_string=params)
+    assert response.status_code == 200
+    return [listing['id'] for listing in response.get_json()]
+
+
+def snapshot():
+    neighbours = {(row.listing_id, row.neighbour_id): row.score for row in db.session.query(ListingCooccurrence)}
+    recommendations = {(row.user_id, row.listing_id): row.score for row in db.session.query(ListingRecommendation)}
+    return neighbours, recommendations
+
+
+def test_cooccurrence_is_cosine_of_hearting_users():
+    user_hearts = {1: [10, 11], 2: [10, 11, 12], 3: [12]}
+    popularity = {10: 2, 11: 2, 12: 2}
+    scores = cooccurrence_scores([10, 12], user_hearts, popularity, available={10, 11, 12})
+    assert scores[10] == {11: pytest.approx(1.0), 12: pytest.approx(0.5)}
+    assert scores[12] == {10: pytest.approx(0.5), 11: pytest.approx(0.5)}
+    # Only available listings are neighbours
+    assert cooccurrence_scores([10], user_hearts, popularity, available={10, 12}) == {10: {12: pytest.approx(0.5)}}
+
+
+def test_recommendations_come_from_what_similar_users_hearted(app, client, make_user, make_listings, auth_headers):
+    seller = make_user('seller')
+    a, b, c, d, e = (listing.id for listing in make_listings(seller, 5))
+    alice, bob, carol = make_user('alice'), make_user('bob'), make_user('carol')
+    for user, hearted in ((alice, [a, b]), (bob, [a, b, c]), (carol, [c, d])):
+        for listing_id in hearted:
+            heart(client, listing_id, auth_headers(user))
+
+    # No list yet: trending listings instead
+    assert set(recommended(client, auth_headers(alice))) == {a, b, c, d}
+    build(app)
+    assert db.session.query(HeartEvent).count() == 0
+
+    # Bob hearted a and b like alice, and c; d was only hearted with c
+    assert recommended(client, auth_headers(alice)) == [c]
+    assert recommended(client, auth_headers(carol)) == [a, b]
+    assert recommended(client, auth_headers(carol), limit=1) == [a]
+    # New hearts are picked up; sellers are not recommended their own listings
+    f = make_listings(make_user('dave'), 1)[0].id
+    heart(client, e, auth_headers(alice))
+    heart(client, f, auth_headers(bob))
+    heart(client, a, auth_headers(seller))
+    build(app)
+    assert e in recommended(client, auth_headers(bob))
+    assert recommended(client, auth_headers(seller)) == [f]
+
+
+def test_incremental_update_matches_full_rebuild(app, client, make_user, make_listings, auth_headers):
+    seller = make_user('seller')
+    ids = [listing.id for listing in make_listings(seller, 8)]
+    users = [make_user(f'user{i}') for i in range(6)]
+    for i, user in enumerate(users):
+        for listing_id in ids[i:i + 3]:
+            heart(client, listing_id, auth_headers(user))
+    build(app)
+
+    # New hearts, a removed heart and a listing that loses its only heart
+    heart(client, ids[0], auth_headers(users[4]))
+    heart(client, ids[7], auth_headers(users[0]))
+    assert client.delete(f'/api/listing/{ids[2]}/heart', headers=auth_headers(users[1])).status_code == 200
+    assert client.delete(f'/api/listing/{ids[7]}/heart', headers=auth_headers(users[5])).status_code == 200
+    assert db.session.query(HeartEvent).count() == 4
+    assert 'for 0 users' not in build(app)
+    incremental = snapshot()
+
+    assert 'Wrote neighbours' in build(app, '--full')
+    full = snapshot()
+    for stored, expected in zip(incremental, full):
+        assert stored.keys() == expected.keys()
+        assert stored == {key: pytest.approx(score) for key, score in expected.items()}
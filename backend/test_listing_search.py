@@ -0,0 +1,56 @@
+from app.extensions import db
+from app.models import Listing
+
+
+def add_listing(user, title, description='', category='other', price=10.0, status='available'):
+    listing = Listing(title=title, description=description, price=price, category=category,
+                      status=status, user_id=user.id)
+    db.session.add(listing)
+    db.session.commit()
+    return listing
+
+
+def search(client, query):
+    response = client.get(f'/api/listing/search?{query}')
+    assert response.status_code == 200
+    return [listing['title'] for listing in response.get_json()]
+
+
+def test_search_ranks_title_matches_first(client, make_user):
+    user = make_user()
+    add_listing(user, 'Wooden desk', 'Sturdy and cheap')
+    add_listing(user, 'Office chair', 'Pairs well with a desk')
+    add_listing(user, 'Lamp', 'Bright')
+    assert search(client, 'q=desk') == ['Wooden desk', 'Office chair']
+
+
+def test_search_matches_stems_and_prefixes(client, make_user):
+    user = make_user()
+    add_listing(user, 'Running shoes', 'Barely used')
+    assert search(client, 'q=run') == ['Running shoes']
+    assert search(client, 'q=shoe') == ['Running shoes']
+
+
+def test_search_applies_feed_filters(client, make_user):
+    user = make_user()
+    add_listing(user, 'Desk lamp', category='furniture', price=15)
+    add_listing(user, 'Standing desk', category='furniture', price=150)
+    add_listing(user, 'Desk organizer', category='other', price=5, status='sold')
+    assert search(client, 'q=desk&category=furniture&max_price=20') == ['Desk lamp']
+    assert search(client, 'q=desk&status=sold') == ['Desk organizer']
+
+
+def test_search_index_follows_updates_and_deletes(client, make_user):
+    user = make_user()
+    listing = add_listing(user, 'Textbook', 'Calculus')
+    listing.title = 'Physics textbook'
+    db.session.commit()
+    assert search(client, 'q=physics') == ['Physics textbook']
+    db.session.delete(listing)
+    db.session.commit()
+    assert search(client, 'q=physics') == []
+
+
+def test_search_requires_query(client):
+    assert client.get('/api/listing/search').status_code == 400
+    assert client.get('/api/listing/search?q=%22%2A').get_json() == []
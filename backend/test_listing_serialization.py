@@ -0,0 +1,148 @@
+import pytest
+from app.extensions import db
+from app.utils import serializers
+from app.models import HeartedListing, Listing, ListingImage
+from app.utils.serializers import LISTING_FIELDS
+
+EXPECTED_KEYS = set(LISTING_FIELDS) | {'images', 'thumbnail'}
+DETAIL_KEYS = set(LISTING_FIELDS) | {'images', 'srcset', 'user_netid'}
+
+
+def test_every_endpoint_returns_the_same_listing_shape(client, make_user, make_listings, auth_headers):
+    seller = make_user('seller')
+    listing = make_listings(seller, 1)[0]
+    listing.buyer_id = seller.id
+    db.session.add(HeartedListing(user_id=seller.id, listing_id=listing.id))
+    db.session.commit()
+    listing_id = listing.id
+
+    payloads = [
+        client.get('/api/listing/').get_json()[0],
+        client.get('/api/listing/?limit=1').get_json()['listings'][0],
+        client.get('/api/listing/user?netid=seller').get_json()[0],
+        client.get('/api/listing/buyer?netid=seller').get_json()[0],
+        client.get('/api/listing/hearted', headers=auth_headers(seller)).get_json()[0],
+        client.get('/api/listing/search?q=listing').get_json()[0],
+        client.put(f'/api/listing/{listing_id}', json={'price': 12}).get_json(),
+        client.post('/api/listing', json={'title': 'New', 'description': 'd', 'price': 3,
+                                          'user_id': seller.id}).get_json(),
+    ]
+    for payload in payloads:
+        assert set(payload) == EXPECTED_KEYS
+
+    detail = client.get(f'/api/listing/{listing_id}').get_json()
+    assert set(detail) == DETAIL_KEYS
+    assert detail['buyer_id'] == seller.id
+    assert detail['condition'] == 'good'
+    assert detail['images'] == [f'https://img.test/{listing_id}/0.jpg', f'https://img.test/{listing_id}/1.jpg']
+    assert detail['srcset'] == detail['images']  # no variants: just the URLs
+    assert detail['created_at'] == '2025-05-01T00:00:00'
+
+
+def test_collections_are_streamed_in_batches(app, client, make_user, make_listings, count_queries):
+    app.config['LISTING_STREAM_BATCH_SIZE'] = 4
+    listings = make_listings(make_user(), 10)
+
+    with count_queries() as statements:
+        response = client.get('/api/listing/')
+    body = response.get_json()
+    assert [listing['id'] for listing in body] == [listing.id for listing in reversed(listings)]
+    assert all(len(listing['images']) == 2 for listing in body)
+    # version lookup, listing rows, then one image query per batch of 4
+    assert sum('FROM listing_images' in statement for statement in statements) == 3
+
+
+def failing_after(calls, monkeypatch):
+    real = serializers.serialize_rows
+    count = iter(range(calls + 1))
+
+    def serialize_rows(rows, view):
+        if next(count) == calls:
+            raise RuntimeError('connection lost')
+        return real(rows, view)
+    monkeypatch.setattr(serializers, 'serialize_rows', serialize_rows)
+
+
+def test_errors_before_the_first_batch_get_an_error_status(app, client, make_user, make_listings,
+                                                            monkeypatch):
+    make_listings(make_user(), 3)
+    failing_after(0, monkeypatch)
+    response = client.get('/api/listing/')
+    assert response.status_code == 500
+    assert 'error' in response.get_json()
+
+
+def test_errors_mid_stream_abort_the_response(app, client, make_user, make_listings, monkeypatch):
+    app.config['LISTING_STREAM_BATCH_SIZE'] = 2
+    make_listings(make_user(), 5)
+    failing_after(1, monkeypatch)
+    # Raised to the server, which drops the connection instead of ending the array
+    with pytest.raises(RuntimeError, match='connection lost'):
+        client.get('/api/listing/')
+
+
+def test_streams_beyond_the_cap_are_buffered(app, make_user, make_listings):
+    app.config['LISTING_STREAM_MAX_CONCURRENT'] = 1
+    make_listings(make_user(), 3)
+    query = serializers.listing_rows(serializers.DEFAULT_VIEW).order_by(Listing.id)
+    with app.test_request_context():
+        streamed = serializers.streamed_json_response(query)
+        buffered = serializers.streamed_json_response(query)
+        assert streamed.is_streamed and not buffered.is_streamed
+        assert len(buffered.get_json()) == 3
+        assert b''.join(streamed.response).count(b'"id"') == 3
+        streamed.close()
+        assert serializers.streamed_json_response(query).is_streamed
+
+
+def test_empty_collection_streams_empty_array(client):
+    assert client.get('/api/listing/').data == b'[]'
+
+
+def test_fields_narrow_payload_and_select_list(client, make_user, make_listings, count_queries):
+    make_listings(make_user(), 3, images=3)
+    with count_queries() as statements:
+        body = client.get('/api/listing/?fields=id,title,price,image').get_json()
+    assert [set(listing) for listing in body] == [{'id', 'title', 'price', 'image'}] * 3
+    assert body[0]['image'].endswith('/0.jpg')
+    listing_select = next(s for s in statements if 'FROM listings' in s)
+    assert 'description' not in listing_select
+
+
+def test_fields_without_images_skip_the_image_query(client, make_user, make_listings, count_queries):
+    make_listings(make_user(), 3)
+    with count_queries() as statements:
+        page = client.get('/api/listing/?fields=id,title&limit=2').get_json()
+    assert [set(listing) for listing in page['listings']] == [{'id', 'title'}] * 2
+    assert page['next_cursor']
+    assert not any('listing_images' in statement for statement in statements)
+
+
+def test_thumbnail_and_srcset_fields(client, make_user, make_listings, count_queries):
+    listing_id = make_listings(make_user(), 1)[0].id
+    first = ListingImage.query.filter_by(listing_id=listing_id).order_by(ListingImage.id).first()
+    first.thumbnail = 'https://img.test/t.webp'
+    first.srcset = 'https://img.test/t.webp 400w, https://img.test/f.webp 1600w'
+    db.session.commit()
+
+    with count_queries() as statements:
+        body = client.get('/api/listing/?fields=id,thumbnail').get_json()
+    assert body == [{'id': listing_id, 'thumbnail': 'https://img.test/t.webp'}]
+    image_select = next(s for s in statements if 'FROM listing_images' in s)
+    assert 'srcset' not in image_select
+
+    body = client.get('/api/listing/?fields=srcset').get_json()
+    assert body == [{'srcset': [first.srcset, f'https://img.test/{listing_id}/1.jpg']}]
+
+
+def test_include_seller(client, make_user, make_listings):
+    listing_id = make_listings(make_user('seller'), 1)[0].id
+    body = client.get('/api/listing/user?netid=seller&fields=id&include=seller').get_json()
+    assert body == [{'id': listing_id, 'user_netid': 'seller'}]
+    detail = client.get(f'/api/listing/{listing_id}?fields=title').get_json()
+    assert detail == {'title': 'Listing 0', 'user_netid': 'seller'}
+
+
+def test_unknown_fields_are_rejected(client):
+    assert client.get('/api/listing/?fields=id,password').status_code == 400
+    assert client.get('/api/listing/?include=buyer').status_code == 400
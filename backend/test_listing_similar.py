@@ -0,0 +1,118 @@
+import time
+from app.extensions import db
+from app.models import Listing, ListingSimilarity, SimilarityRefresh
+from app.utils.similar import SimilarityIndex, rebuild_similar_listings, refresh_similar_listings
+
+LISTINGS = [
+    ('Wooden desk', 'Solid oak writing desk with two drawers', 'furniture'),
+    ('Oak desk chair', 'Comfortable chair for a wooden desk', 'furniture'),
+    ('Standing desk', 'Adjustable desk, barely used', 'furniture'),
+    ('Calculus textbook', 'Stewart calculus, 8th edition', 'books'),
+    ('Linear algebra textbook', 'Strang, great condition', 'books'),
+    ('Mini fridge', 'Compact fridge for a dorm room', 'appliances'),
+]
+
+
+def create(client, user, auth_headers, title, description, category):
+    response = client.post('/api/listing', headers=auth_headers(user), json={
+        'title': title, 'description': description, 'price': 10, 'category': category,
+        'user_id': user.id, 'images': []})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+
+def similar(client, listing_id, **params):
+    response = client.get(f'/api/listing/{listing_id}/similar', query_string=params)
+    assert response.status_code == 200
+    return [listing['id'] for listing in response.get_json()]
+
+
+def refresh(app):
+    result = app.test_cli_runner().invoke(args=['listings', 'refresh-similar'])
+    assert result.exit_code == 0, result.output
+
+
+def test_index_ranks_shared_terms_and_category():
+    index = SimilarityIndex()
+    index.build([(i, *listing) for i, listing in enumerate(LISTINGS)])
+    desk, chair, standing, calculus, algebra, fridge = range(6)
+
+    assert [other for other, _ in index.neighbours(desk, 2)] == [chair, standing]
+    assert [other for other, _ in index.neighbours(calculus, 1)] == [algebra]
+    assert index.scores(fridge) == {}
+    # The category alone does not make listings similar
+    index.upsert(6, 'Microwave', 'Small microwave oven', 'appliances')
+    assert index.scores(fridge) == {}
+    # but it ranks a listing in the same category above an equal match elsewhere
+    index.upsert(7, 'Compact microwave', 'Small microwave oven', 'appliances')
+    index.upsert(8, 'Compact microwave', 'Small microwave oven', 'other')
+    assert [other for other, _ in index.neighbours(fridge, 2)] == [7, 8]
+
+    index.remove(chair)
+    assert chair not in index
+    assert chair not in index.scores(desk)
+
+
+def test_lists_are_precomputed_and_kept_current(app, client, make_user, auth_headers, count_queries):
+    user = make_user()
+    ids = [create(client, user, auth_headers, *listing) for listing in LISTINGS]
+    desk, chair, standing, calculus, algebra, fridge = ids
+    refresh(app)
+
+    assert similar(client, desk)[:2] == [chair, standing]
+    assert similar(client, calculus, limit=1) == [algebra]
+    with count_queries() as statements:
+        similar(client, desk)
+    assert len(statements) == 2  # the neighbour rows, then their images
+
+    # A new listing shows up in the lists it belongs in once the job has run
+    lamp = create(client, user, auth_headers, 'Desk lamp', 'Oak desk lamp with two drawers', 'furniture')
+    assert lamp not in similar(client, desk)
+    refresh(app)
+    assert lamp in similar(client, desk)[:2]
+    assert db.session.query(SimilarityRefresh).count() == 0
+
+    # Sold listings drop out of other lists and lose their own
+    assert client.patch(f'/api/listing/{chair}/status', headers=auth_headers(user),
+                        json={'status': 'sold'}).status_code == 200
+    refresh(app)
+    assert chair not in similar(client, desk)
+    assert db.session.query(ListingSimilarity).filter_by(listing_id=chair).count() == 0
+    assert db.session.query(ListingSimilarity).filter_by(similar_id=chair).count() == 0
+
+
+def test_rebuild_matches_incremental_updates(app, client, make_user, auth_headers):
+    user = make_user()
+    ids = [create(client, user, auth_headers, *listing) for listing in LISTINGS]
+    refresh(app)
+    before = {listing_id: similar(client, listing_id) for listing_id in ids}
+
+    result = app.test_cli_runner().invoke(args=['listings', 'rebuild-similar'])
+    assert f'Rebuilt similar listings for {len(ids)} listings.' in result.output
+    # Weights drift between incremental updates, but the top match holds
+    after = {listing_id: similar(client, listing_id) for listing_id in ids}
+    assert {key: value[:1] for key, value in after.items()} == {key: value[:1] for key, value in before.items()}
+    assert rebuild_similar_listings(app) == db.session.query(Listing).filter_by(status='available').count()
+
+
+def test_only_text_and_status_changes_are_queued(app, client, make_user, auth_headers):
+    user = make_user()
+    desk = create(client, user, auth_headers, *LISTINGS[0])
+    refresh(app)
+    client.put(f'/api/listing/{desk}', headers=auth_headers(user), json={'price': 25})
+    assert db.session.query(SimilarityRefresh).count() == 0
+    client.put(f'/api/listing/{desk}', headers=auth_headers(user), json={'title': 'Pine desk'})
+    assert [row.listing_id for row in db.session.query(SimilarityRefresh)] == [desk]
+
+
+def test_the_upload_worker_loop_refreshes_lists(app, client, make_user, auth_headers):
+    user = make_user()
+    desk, chair = (create(client, user, auth_headers, *listing) for listing in LISTINGS[:2])
+    runner = app.extensions['upload_jobs']
+    runner.run_due_tasks()
+    assert similar(client, desk) == []  # not due yet
+
+    runner.schedule(refresh_similar_listings, 0.01)
+    time.sleep(0.02)
+    runner.run_due_tasks()
+    assert similar(client, desk) == [chair]
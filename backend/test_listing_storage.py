@@ -0,0 +1,57 @@
+import hashlib
+import io
+import pytest
+from PIL import Image
+from app.utils.storage import ImageStorage, LocalStorage
+
+
+def photo(width, height=10):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (30, 120, 200)).save(output, format='JPEG')
+    return output.getvalue()
+
+
+def use_local_storage(app, root):
+    storage = app.extensions['image_storage'] = LocalStorage(str(root), app.config['LISTING_IMAGE_STORAGE_URL'])
+    app.extensions['upload_jobs'].storage = storage
+    return storage
+
+
+def test_backends_must_implement_store():
+    class Incomplete(ImageStorage):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_local_storage_keeps_one_file_per_key(tmp_path):
+    storage = LocalStorage(str(tmp_path), '/media/')
+    key = hashlib.sha256(b'photo').hexdigest()
+    url = storage.store(key, b'webp bytes', 'image/webp')
+    assert url == f'/media/{key[:2]}/{key}.webp'
+    assert storage.store(key, b'other bytes', 'image/webp') == url
+    assert (tmp_path / key[:2] / f'{key}.webp').read_bytes() == b'webp bytes'
+    assert [path.name for path in (tmp_path / key[:2]).iterdir()] == [f'{key}.webp']
+
+
+def test_uploads_are_served_from_local_storage(app, client, tmp_path):
+    app.config['LISTING_UPLOAD_SPOOL'] = str(tmp_path / 'spool')
+    use_local_storage(app, tmp_path / 'images')
+    data = {'images': [(io.BytesIO(photo(40)), 'photo.jpg')]}
+    response = client.post('/api/listing/upload', data=data, content_type='multipart/form-data')
+    body = client.get(response.get_json()['status_url'], query_string={'wait': 10}).get_json()
+    assert body['status'] == 'done'
+
+    url = body['urls'][0]
+    assert url.startswith('/api/listing/images/')
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert response.cache_control.max_age == 365 * 24 * 3600
+    assert Image.open(io.BytesIO(response.data)).size == (40, 10)
+    assert client.get('/api/listing/images/00/missing.webp').status_code == 404
+
+
+def test_images_are_not_served_with_cloudinary_storage(client):
+    assert client.get('/api/listing/images/00/missing.webp').status_code == 404
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from app.extensions import db
+from app.models import ListingsVersion
+from app.utils.change_feed import parse_notification
+from app.utils.listing_events import ListingEvents
+
+
+@pytest.fixture
+def feed(app):
+    """The change feed, synced, with a short heartbeat so idle reads return quickly."""
+    app.config['LISTING_EVENTS_HEARTBEAT'] = 0.01
+    change_feed = app.extensions['listing_change_feed']
+    change_feed.sync()
+    return change_feed
+
+
+def notify(feed, changes):
+    """Deliver what PostgreSQL would NOTIFY for the last commit."""
+    version = ListingsVersion.current().version
+    feed.receive([f'{version}:' + ','.join(f'{op}{listing_id}' for op, listing_id in changes)])
+    return version
+
+
+def parse(text):
+    """SSE text into [(id, event, data)], skipping comments and retry hints."""
+    events = []
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def read(stream, count=3):
+    return parse(''.join(next(stream) for _ in range(count)))
+
+
+def test_parse_notification():
+    assert parse_notification('12:c3,u4,d5') == (12, {3: 'c', 4: 'u', 5: 'd'})
+    assert parse_notification('12:*') == (12, None)
+
+
+def test_stream_pushes_compact_change_events(app, client, feed, make_user, make_listings):
+    user = make_user()
+    response = client.get('/api/listing/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    stream = (chunk.decode() for chunk in response.response)
+
+    created = make_listings(user, 1)[0]
+    created_version = notify(feed, [('c', created.id)])
+    created.status = 'sold'
+    db.session.commit()
+    sold_version = notify(feed, [('u', created.id)])
+    listing_id = created.id
+    db.session.delete(created)
+    db.session.commit()
+    deleted_version = notify(feed, [('d', listing_id)])
+
+    events = read(stream)
+    response.close()
+    assert [(event_id, name) for event_id, name, _ in events] == [
+        (f'{created_version}-0', 'create'),
+        (f'{sold_version}-0', 'update'),
+        (f'{deleted_version}-0', 'delete'),
+    ]
+    assert events[0][2]['image'] == f'https://img.test/{listing_id}/0.jpg'
+    assert 'description' not in events[0][2]
+    assert events[1][2]['status'] == 'sold'
+    assert events[2][2] == {'id': listing_id}
+
+
+def test_clients_resume_from_last_event_id(app, feed, make_user, make_listings):
+    user = make_user()
+    events = app.extensions['listing_events']
+    ids = []
+    for _ in range(3):
+        listing = make_listings(user, 1)[0]
+        ids.append(f'{notify(feed, [("c", listing.id)])}-0')
+
+    resumed = read(events.subscribe(ids[0], heartbeat=0.01), count=2)
+    assert [event_id for event_id, _, _ in resumed] == ids[1:]
+
+
+def test_clients_too_far_behind_are_told_to_refetch(app, feed, make_user, make_listings):
+    user = make_user()
+    events = app.extensions['listing_events']
+    make_listings(user, 1)
+    feed.sync()
+    before_start = f'{feed.version - 1}-0'
+    (_, name, data), = read(events.subscribe(before_start, heartbeat=0.01), count=2)
+    assert (name, data) == ('reset', {'version': feed.version})
+
+    # Falling out of the backlog has the same effect
+    small = ListingEvents(backlog=2)
+    feed.subscribe(small)
+    small.reset(feed.version)
+    first = feed.version
+    versions = [notify(feed, [('c', make_listings(user, 1)[0].id)]) for _ in range(3)]
+    (_, name, _), = read(small.subscribe(f'{first}-0', heartbeat=0.01), count=2)
+    assert name == 'reset'
+    resumed = read(small.subscribe(f'{versions[0]}-0', heartbeat=0.01), count=2)
+    assert [event_id for event_id, _, _ in resumed] == [f'{version}-0' for version in versions[1:]]
+
+
+def test_invalid_last_event_id(client):
+    response = client.get('/api/listing/stream', headers={'Last-Event-ID': 'nope'})
+    assert response.status_code == 400
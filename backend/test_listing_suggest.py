@@ -0,0 +1,91 @@
+from app.extensions import db
+from app.models import Listing, ListingsVersion
+from app.utils.suggest import SuggestIndex, init_suggest_index
+
+
+def titles(client, prefix):
+    body = client.get(f'/api/listing/suggest?prefix={prefix}').get_json()
+    return [listing['title'] for listing in body['listings']]
+
+
+def create(client, user, title, category='furniture'):
+    response = client.post('/api/listing', json={
+        'title': title, 'description': 'x', 'price': 10, 'user_id': user.id, 'category': category
+    })
+    return response.get_json()['id']
+
+
+def test_prefix_matches_any_word_boundary():
+    index = SuggestIndex()
+    index.build([(1, 'Wooden desk', 'furniture'), (2, 'Desk lamp', 'appliances'), (3, 'Rug', 'other')])
+    assert [s['id'] for s in index.suggest('desk')] == [2, 1]
+    assert [s['id'] for s in index.suggest('wooden d')] == [1]
+    assert index.suggest('') == []
+
+
+def test_fuzzy_match_tolerates_typos():
+    index = SuggestIndex()
+    index.build([(1, 'Office chair', 'furniture'), (2, 'Chemistry textbook', 'books')])
+    assert [s['id'] for s in index.suggest('chiar')] == [1]
+    assert [s['id'] for s in index.suggest('txtbook')] == [2]
+
+
+def test_suggest_endpoint_tracks_writes(client, make_user):
+    user = make_user()
+    db.session.add(Listing(title='Mini fridge', description='x', price=50, category='appliances',
+                           status='available', user_id=user.id))
+    db.session.commit()
+    assert titles(client, 'mini') == ['Mini fridge']
+
+    listing_id = create(client, user, 'Minimalist shelf')
+    assert titles(client, 'mini') == ['Mini fridge', 'Minimalist shelf']
+
+    client.put(f'/api/listing/{listing_id}', json={'title': 'Bookshelf'})
+    assert titles(client, 'mini') == ['Mini fridge']
+    assert titles(client, 'books') == ['Bookshelf']
+
+    client.patch(f'/api/listing/{listing_id}/status', json={'status': 'sold'})
+    assert titles(client, 'books') == []
+
+
+def test_suggest_endpoint_includes_categories(client):
+    body = client.get('/api/listing/suggest?prefix=bo').get_json()
+    assert body['categories'] == ['bottoms', 'books']
+
+
+def test_index_follows_writes_from_other_workers(app, client, make_user):
+    user = make_user()
+    assert titles(client, 'mini') == []
+
+    # Written by another worker: no signal here, only the change feed
+    listing = Listing(title='Mini fridge', description='x', price=50, category='appliances',
+                      status='available', user_id=user.id)
+    db.session.add(listing)
+    db.session.commit()
+    app.extensions['listing_change_feed'].sync()
+    assert titles(client, 'mini') == ['Mini fridge']
+
+    listing.status = 'sold'
+    db.session.commit()
+    version = ListingsVersion.current().version
+    app.extensions['listing_change_feed'].receive([f'{version}:u{listing.id}'])
+    assert titles(client, 'mini') == []
+
+
+def test_index_is_built_by_the_first_suggest_request(app, client, make_user, make_listings):
+    make_listings(make_user(), 2)
+    index = init_suggest_index(app, app.extensions['listing_change_feed'])
+    index.reset(None)  # the change feed starting up does not build it either
+    assert not index.built
+    response = client.get('/api/listing/suggest?prefix=listing')
+    assert [s['title'] for s in response.get_json()['listings']] == ['Listing 0', 'Listing 1']
+    assert index.built
+
+
+def test_suggest_errors_are_json(app, client, monkeypatch):
+    def broken(app):
+        raise RuntimeError('database unavailable')
+    monkeypatch.setattr('app.routes.listing_routes.get_suggest_index', broken)
+    response = client.get('/api/listing/suggest?prefix=desk')
+    assert response.status_code == 500
+    assert response.get_json() == {'error': 'Failed to suggest listings'}
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Listing, ListingsVersion
+from app.models.trending import heart_weight, log_add, log_subtract, record_heart
+
+
+def trending_ids(client, **params):
+    response = client.get('/api/listing/trending', query_string=params)
+    assert response.status_code == 200
+    return [listing['id'] for listing in response.get_json()]
+
+
+def test_log_space_arithmetic_round_trips():
+    weights = [heart_weight(datetime(2025, 5, 1) + timedelta(hours=hours), 24) for hours in (0, 5, 30)]
+    score = None
+    for weight in weights:
+        score = log_add(score, weight)
+    assert log_subtract(log_subtract(score, weights[0]), weights[2]) == pytest.approx(weights[1])
+    assert log_subtract(weights[1], weights[1]) is None
+
+
+def test_recent_hearts_outrank_older_ones(app, client, make_user, make_listings):
+    old, new, unloved = make_listings(make_user(), 3)
+    now = datetime.utcnow()
+    for _ in range(3):
+        record_heart(db.session, old.id, now - timedelta(days=3), 24)  # 3 * 2^-3 = 0.375
+    record_heart(db.session, new.id, now, 24)  # 1
+    db.session.commit()
+
+    assert trending_ids(client) == [new.id, old.id]
+    assert trending_ids(client, limit=1) == [new.id]
+    assert db.session.get(Listing, old.id).heart_count == 3
+
+    old.status = 'sold'
+    db.session.commit()
+    assert trending_ids(client) == [new.id]
+
+
+def test_heart_and_unheart_maintain_the_counters(app, client, make_user, make_listings, auth_headers):
+    listing = make_listings(make_user(), 1)[0]
+    fans = [make_user(f'fan{i}') for i in range(2)]
+    updated_at = listing.updated_at
+    version = ListingsVersion.current().version
+
+    for fan in fans:
+        assert client.post(f'/api/listing/{listing.id}/heart', headers=auth_headers(fan)).status_code == 200
+    db.session.expire_all()
+    assert listing.heart_count == 2
+    assert trending_ids(client) == [listing.id]
+    # Hearts are not listing edits
+    assert listing.updated_at == updated_at
+    assert ListingsVersion.current().version == version
+
+    for fan in fans:
+        assert client.delete(f'/api/listing/{listing.id}/heart', headers=auth_headers(fan)).status_code == 200
+    db.session.expire_all()
+    assert (listing.heart_count, listing.trending_score) == (0, None)
+    assert trending_ids(client) == []
@@ -0,0 +1,260 @@
+import gc
+import io
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+from PIL import Image
+from app.extensions import db
+from app.models import UploadJob, StoredImage
+from benchmarks.fake_storage import FakeStorageServer
+
+FAIL_WIDTH, SLOW_WIDTH = 13, 17
+
+
+def photo(width, height=10):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(output, format='JPEG')
+    return output.getvalue()
+
+
+def classify(data):
+    width = Image.open(io.BytesIO(data)).width
+    return {FAIL_WIDTH: 'fail', SLOW_WIDTH: 'slow'}.get(width)
+
+
+@pytest.fixture
+def storage(app, tmp_path):
+    app.extensions['image_storage'].timeout = 1
+    app.config['LISTING_UPLOAD_SPOOL'] = str(tmp_path)
+    with FakeStorageServer(latency=0.2, slow_latency=3, classify=classify) as server, server.configure():
+        yield server
+
+
+def upload(client, *contents):
+    data = {'images': [(io.BytesIO(content), f'photo{i}.jpg') for i, content in enumerate(contents)]}
+    return client.post('/api/listing/upload', data=data, content_type='multipart/form-data')
+
+
+def result(client, response, wait=10):
+    return client.get(response.get_json()['status_url'], query_string={'wait': wait})
+
+
+def stored(storage, url):
+    return Image.open(io.BytesIO(storage.uploads[url.rsplit('/', 1)[1]]))
+
+
+def test_upload_returns_a_job_right_away(app, client, storage):
+    start = time.perf_counter()
+    response = upload(client, photo(20), photo(21))
+    assert time.perf_counter() - start < storage.latency
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['status'] == 'processing'
+    assert body['status_url'] == f"/api/listing/upload/{body['job_id']}"
+    assert result(client, response).get_json()['status'] == 'done'
+
+
+def test_files_upload_concurrently_in_order(app, client, storage):
+    workers = app.config['LISTING_UPLOAD_WORKERS']
+    gc.collect()  # no collection of earlier tests' garbage inside the timing
+    start = time.perf_counter()
+    response = result(client, upload(client, *[photo(20 + i) for i in range(workers)]))
+    elapsed = time.perf_counter() - start
+
+    body = response.get_json()
+    assert body['status'] == 'done' and body['failed'] == []
+    assert [stored(storage, url).width for url in body['urls']] == [20 + i for i in range(workers)]
+    assert storage.peak == workers
+    assert elapsed < 2 * storage.latency  # not workers * latency
+
+
+def test_uploads_are_normalized(app, client, storage):
+    app.config['LISTING_IMAGE_MAX_EDGE'] = 64
+    response = result(client, upload(client, photo(300, 120)))
+    image = stored(storage, response.get_json()['urls'][0])
+    assert image.format == app.config['LISTING_IMAGE_FORMAT']
+    assert image.size == (64, 26)
+
+
+def test_workers_bound_concurrency_across_jobs(app, client, storage):
+    workers = app.config['LISTING_UPLOAD_WORKERS']
+    responses = [upload(client, *[photo(20 + i, 10 + job) for i in range(workers)]) for job in range(2)]
+    for response in responses:
+        assert len(result(client, response).get_json()['urls']) == workers
+    assert storage.peak == workers
+
+
+def test_time_spent_queued_is_not_a_timeout(app, client, storage):
+    # Enough files that the last ones wait longer than a store may take
+    workers = app.config['LISTING_UPLOAD_WORKERS']
+    rounds = int(app.extensions['image_storage'].timeout / storage.latency) + 2
+    response = upload(client, *[photo(20 + i) for i in range(workers * rounds)])
+    body = result(client, response, wait=0).get_json()
+    assert body['status'] == 'processing' and 'failed' not in body
+
+    body = result(client, response, wait=30).get_json()
+    assert body['status'] == 'done' and body['failed'] == []
+    assert len(body['urls']) == workers * rounds
+
+
+def test_partial_failures_are_reported(app, client, storage):
+    response = result(client, upload(client, photo(20), photo(FAIL_WIDTH), photo(SLOW_WIDTH),
+                                     b'not an image', photo(21)))
+    body = response.get_json()
+    assert body['status'] == 'done'
+    assert [stored(storage, url).width for url in body['urls']] == [20, 21]
+    assert [(failure['index'], failure['filename']) for failure in body['failed']] == \
+        [(1, 'photo1.jpg'), (2, 'photo2.jpg'), (3, 'photo3.jpg')]
+    assert 'Storage unavailable' in body['failed'][0]['error']
+
+    body = result(client, upload(client, photo(FAIL_WIDTH))).get_json()
+    assert body['status'] == 'failed'
+    assert body['urls'] == []
+    assert os.listdir(app.config['LISTING_UPLOAD_SPOOL']) == []
+
+
+def test_invalid_files_are_rejected_before_queueing(app, client, storage):
+    data = {'images': [(io.BytesIO(photo(20)), 'photo.jpg'), (io.BytesIO(b'x'), 'script.sh')]}
+    response = client.post('/api/listing/upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert UploadJob.query.count() == 0
+    assert client.get('/api/listing/upload/unknown').status_code == 404
+
+
+def test_files_are_spooled_before_the_request_returns(app, client, storage):
+    app.config['LISTING_UPLOAD_JOBS_IN_PROCESS'] = False
+    contents = [photo(20), photo(21)]
+    job_id = upload(client, *contents).get_json()['job_id']
+    # The request and its streams are gone; the job runs from the spool alone
+    for index, content in enumerate(contents):
+        with open(os.path.join(app.config['LISTING_UPLOAD_SPOOL'], job_id, str(index)), 'rb') as spooled:
+            assert spooled.read() == content
+    assert app.extensions['upload_jobs'].poll() == 1
+    assert len(client.get(f'/api/listing/upload/{job_id}', query_string={'wait': 10}).get_json()['urls']) == 2
+
+
+def test_queued_jobs_are_picked_up_by_polling(app, client, storage):
+    app.config['LISTING_UPLOAD_JOBS_IN_PROCESS'] = False
+    response = upload(client, photo(20))
+    assert response.get_json()['status'] == 'queued'
+    assert result(client, response, wait=0).get_json()['status'] == 'queued'
+
+    assert app.extensions['upload_jobs'].poll() == 1
+    assert result(client, response).get_json()['status'] == 'done'
+    assert app.extensions['upload_jobs'].poll() == 0
+
+
+def test_stale_jobs_are_requeued(app, client, storage):
+    app.config['LISTING_UPLOAD_JOBS_IN_PROCESS'] = False
+    response = upload(client, photo(20))
+    job = db.session.get(UploadJob, response.get_json()['job_id'])
+    job.status, job.claimed_at = 'processing', datetime.utcnow() - timedelta(minutes=5)
+    db.session.commit()
+
+    runner = app.extensions['upload_jobs']
+    assert runner.poll() == 0  # its worker may still be at it
+    job.claimed_at = datetime.utcnow() - timedelta(seconds=app.config['LISTING_UPLOAD_JOB_STALE'] + 1)
+    db.session.commit()
+    assert runner.poll() == 1
+    assert result(client, response).get_json()['status'] == 'done'
+
+
+def test_stale_jobs_spooled_nowhere_are_failed(app, client, storage, tmp_path):
+    app.config['LISTING_UPLOAD_JOBS_IN_PROCESS'] = False
+    stale = timedelta(seconds=app.config['LISTING_UPLOAD_JOB_STALE'])
+    claimed = upload(client, photo(20), photo(21)).get_json()['job_id']
+    queued = upload(client, photo(22)).get_json()['job_id']
+    job = db.session.get(UploadJob, claimed)
+    job.status, job.claimed_at = 'processing', datetime.utcnow() - 2 * stale - timedelta(seconds=1)
+    db.session.get(UploadJob, queued).created_at = datetime.utcnow() - stale
+    db.session.commit()
+    # As after a restart that lost the spool
+    app.config['LISTING_UPLOAD_SPOOL'] = str(tmp_path / 'elsewhere')
+
+    assert app.extensions['upload_jobs'].poll() == 0
+    body = client.get(f'/api/listing/upload/{claimed}').get_json()
+    assert body['status'] == 'failed'
+    assert [failure['index'] for failure in body['failed']] == [0, 1]
+    # Not stuck long enough yet: a host holding its files may still pick it up
+    assert db.session.get(UploadJob, queued, populate_existing=True).status == 'queued'
+
+
+def test_finished_jobs_are_purged(app, client, storage):
+    runner = app.extensions['upload_jobs']
+    old, recent = (result(client, upload(client, photo(width))).get_json()['job_id'] for width in (20, 21))
+    db.session.get(UploadJob, old).created_at = datetime.utcnow() - timedelta(
+        days=app.config['LISTING_UPLOAD_JOB_RETENTION_DAYS'] + 1)
+    db.session.commit()
+
+    assert runner.purge_finished() == 1
+    assert client.get(f'/api/listing/upload/{old}').status_code == 404
+    assert client.get(f'/api/listing/upload/{recent}').get_json()['status'] == 'done'
+
+
+def test_duplicate_files_are_stored_once(app, client, storage):
+    first = result(client, upload(client, photo(20), photo(21), photo(20))).get_json()
+    assert first['urls'][0] == first['urls'][2] != first['urls'][1]
+    assert len(storage.uploads) == 2
+
+    # The same photo sent again, e.g. when its listing is edited
+    response = upload(client, photo(21))
+    assert response.get_json()['status'] == 'done'
+    assert result(client, response).get_json()['urls'] == [first['urls'][1]]
+    assert len(storage.uploads) == 2
+    # Stored under the uploaded files' hashes
+    assert sorted(storage.uploads) == sorted(image.sha256 for image in StoredImage.query)
+
+
+def test_failed_files_are_not_indexed(app, client, storage):
+    result(client, upload(client, photo(FAIL_WIDTH)))
+    assert StoredImage.query.count() == 0
+    storage.classify = None
+    assert result(client, upload(client, photo(FAIL_WIDTH))).get_json()['status'] == 'done'
+
+
+def test_jobs_without_digests_are_hashed_when_claimed(app, client, storage):
+    app.config['LISTING_UPLOAD_JOBS_IN_PROCESS'] = False
+    response = upload(client, photo(20))
+    job = db.session.get(UploadJob, response.get_json()['job_id'])
+    digest, job.digests = job.digests[0], None
+    db.session.commit()
+
+    assert app.extensions['upload_jobs'].poll() == 1
+    url = result(client, response).get_json()['urls'][0]
+    assert db.session.get(StoredImage, digest).url == url
+
+
+def test_variants_are_stored_and_picked_up_by_listings(app, client, storage, make_user):
+    app.config['LISTING_IMAGE_MAX_EDGE'] = 200
+    app.config['LISTING_IMAGE_VARIANTS'] = {'thumbnail': 40, 'medium': 100}
+    url = result(client, upload(client, photo(300, 150))).get_json()['urls'][0]
+    key = url.rsplit('/', 1)[1]
+    assert {name: stored(storage, f'/{name}').size for name in storage.uploads} == {
+        key: (200, 100), f'{key}-medium': (100, 50), f'{key}-thumbnail': (40, 20)}
+
+    image = db.session.get(StoredImage, key)
+    assert image.thumbnail == f'{url}-thumbnail'
+    assert image.srcset == f'{url}-thumbnail 40w, {url}-medium 100w, {url} 200w'
+
+    seller = make_user()
+    listing = client.post('/api/listing', json={'title': 'Lamp', 'description': 'd', 'price': 5,
+                                                'user_id': seller.id, 'images': [url, 'https://elsewhere/a.jpg']})
+    assert listing.get_json()['thumbnail'] == image.thumbnail
+    listing_id = listing.get_json()['id']
+    assert client.get('/api/listing/user?netid=seller').get_json()[0]['thumbnail'] == image.thumbnail
+    detail = client.get(f'/api/listing/{listing_id}').get_json()
+    assert detail['srcset'] == [image.srcset, 'https://elsewhere/a.jpg']
+
+    client.put(f'/api/listing/{listing_id}', json={'images': ['https://elsewhere/a.jpg', url]})
+    detail = client.get(f'/api/listing/{listing_id}?fields=thumbnail,srcset').get_json()
+    assert detail == {'thumbnail': 'https://elsewhere/a.jpg', 'srcset': ['https://elsewhere/a.jpg', image.srcset],
+                      'user_netid': 'seller'}
+
+
+def test_small_photos_are_stored_once(app, client, storage):
+    url = result(client, upload(client, photo(30, 20))).get_json()['urls'][0]
+    image = StoredImage.query.one()
+    assert list(storage.uploads) == [image.sha256]
+    assert image.thumbnail == url and image.srcset == f'{url} 30w'
@@ -48,10 +48,11 @@ const ListingCard: React.FC<ListingCardProps> = ({ listing, onDelete, onClick, i
       onClick={handleCardClick}
     >
       <div className="relative aspect-w-16 aspect-h-9">
-        {listing.images?.[0] && (
+        {(listing.thumbnail || listing.images?.[0]) && (
           <img
-            src={listing.images[0]}
+            src={listing.thumbnail || listing.images[0]}
             alt={listing.title}
+            loading="lazy"
             className="w-full h-full object-cover"
           />
         )}
@@ -130,6 +130,8 @@ const ListingDetailModal: React.FC<ListingDetailModalProps> = ({
               {listing.images?.[currentImageIndex] && (
                 <img
                   src={listing.images[currentImageIndex]}
+                  srcSet={listing.srcset?.[currentImageIndex]}
+                  sizes="(min-width: 768px) 768px, 100vw"
                   alt={listing.title}
                   className="w-full h-full object-contain rounded-lg bg-gray-100"
                 />
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useLocation } from 'react-router-dom';
 import ListingCard from '../components/ListingCard';
-import { Listing, getListings, heartListing, unheartListing, getHeartedListings } from '../services/listingService';
+import { Listing, getListings, heartListing, unheartListing, getHeartedListingIds } from '../services/listingService';
 import ListingDetailModal from '../components/ListingDetailModal';
 
 interface PriceRange {
@@ -77,8 +77,7 @@ const MarketplacePage: React.FC = () => {
 
   const fetchHeartedListings = async () => {
     try {
-      const hearted = await getHeartedListings();
-      setHeartedListings(hearted.map(listing => listing.id));
+      setHeartedListings(await getHeartedListingIds());
     } catch (error) {
       console.error('Error fetching hearted listings:', error);
     }
@@ -39,6 +39,10 @@ export interface Listing {
   created_at: string;
   updated_at: string;
   images: string[];
+  // Small variant of the first image, for grid cards (list endpoints)
+  thumbnail?: string | null;
+  // An <img srcset> per image (single-listing endpoint)
+  srcset?: string[];
   condition: string;
   seller_id: number;
   buyer_id?: number;
@@ -82,6 +86,104 @@ export const getListing = async (id: number): Promise<Listing> => {
   return handleResponse(response);
 };
 
+export interface ListingBatch {
+  listings: Listing[];
+  missing: number[];
+}
+
+// Fetch several listings in one request; results keep the order of `ids`
+export const getListingsByIds = async (ids: number[]): Promise<ListingBatch> => {
+  const response = await fetch(`${API_URL}/api/listing/batch?ids=${ids.join(',')}`, {
+    headers: getHeaders(),
+    credentials: 'include',
+    mode: 'cors'
+  });
+  return handleResponse(response);
+};
+
+// Available listings with the most recent hearts, hottest first
+export const getTrendingListings = async (limit = 20): Promise<Listing[]> => {
+  const response = await fetch(`${API_URL}/api/listing/trending?limit=${limit}`, {
+    headers: getHeaders(),
+    credentials: 'include',
+    mode: 'cors'
+  });
+  return handleResponse(response);
+};
+
+// Falls back to trending listings for users without recommendations yet
+export const getRecommendedListings = async (limit = 20): Promise<Listing[]> => {
+  const response = await fetch(`${API_URL}/api/listing/recommended?limit=${limit}`, {
+    headers: getHeaders(),
+    credentials: 'include',
+    mode: 'cors'
+  });
+  return handleResponse(response);
+};
+
+export interface PriceRange {
+  count: number;
+  low: number | null;
+  median: number | null;
+  high: number | null;
+}
+
+export interface PriceSuggestion {
+  category: string;
+  condition: string | null;
+  asking: PriceRange;
+  sold: PriceRange;
+  suggested: number | null;
+}
+
+export const getPriceSuggestion = async (category: string, condition?: string): Promise<PriceSuggestion> => {
+  const params = new URLSearchParams({ category });
+  if (condition) {
+    params.append('condition', condition);
+  }
+  const response = await fetch(`${API_URL}/api/listing/price-suggestion?${params.toString()}`, {
+    headers: getHeaders(),
+    credentials: 'include',
+    mode: 'cors'
+  });
+  return handleResponse(response);
+};
+
+export interface ListingChanges {
+  upserts: Listing[];
+  tombstones: number[];
+  cursor: string;
+  has_more: boolean;
+}
+
+// Listings changed since `since` (omit it for a full sync). Keep the returned
+// cursor and call again while has_more; a 410 means sync again from scratch.
+export const getListingChanges = async (since?: string): Promise<ListingChanges> => {
+  const query = since ? `?since=${encodeURIComponent(since)}` : '';
+  const response = await fetch(`${API_URL}/api/listing/changes${query}`, {
+    headers: getHeaders(),
+    credentials: 'include',
+    mode: 'cors'
+  });
+  return handleResponse(response);
+};
+
+export type ListingEventType = 'create' | 'update' | 'delete' | 'reset';
+
+// Subscribe to listing changes pushed by the server. The browser reconnects
+// on its own and resumes from the last event it saw; on 'reset' the caller
+// should refetch whatever it is showing. Returns a function that unsubscribes.
+export const subscribeToListingChanges = (
+  onEvent: (type: ListingEventType, data: Partial<Listing> & { version?: number }) => void
+): (() => void) => {
+  const source = new EventSource(`${API_URL}/api/listing/stream`, { withCredentials: true });
+  const types: ListingEventType[] = ['create', 'update', 'delete', 'reset'];
+  types.forEach(type => {
+    source.addEventListener(type, event => onEvent(type, JSON.parse((event as MessageEvent).data)));
+  });
+  return () => source.close();
+};
+
 export const createListing = async (data: CreateListingData): Promise<Listing> => {
   const response = await fetch(`${API_URL}/api/listing/`, {
     method: 'POST',
@@ -147,10 +249,24 @@ export const uploadImages = async (files: File[]): Promise<string[]> => {
       mode: 'cors'
     });
     
-    const data = await handleResponse(response);
+    // 202: the images are stored in the background; wait on the job
+    let data = await handleResponse(response);
+    while (data.status === 'queued' || data.status === 'processing') {
+      const statusResponse = await fetch(`${API_URL}/api/listing/upload/${data.job_id}?wait=25`, {
+        headers: getHeaders(),
+        credentials: 'include',
+        mode: 'cors'
+      });
+      data = await handleResponse(statusResponse);
+    }
     if (!data.urls || !Array.isArray(data.urls)) {
       throw new Error('Invalid response format from server');
     }
+    if (data.failed && data.failed.length) {
+      // Some or all files could not be stored
+      const names = data.failed.map((failure: { filename: string }) => failure.filename).join(', ');
+      throw new Error(`Failed to upload ${names}`);
+    }
 
     return data.urls;
   } catch (error) {
@@ -276,6 +392,32 @@ export const unheartListing = async (id: number): Promise<void> => {
   }
 };
 
+// Ids of the current user's hearted listings, for marking hearts in a grid.
+// Fetched delta-encoded (first id, then gaps) and decoded here.
+export const getHeartedListingIds = async (): Promise<number[]> => {
+  try {
+    const token = localStorage.getItem('token');
+    if (!token) {
+      return [];
+    }
+    const response = await fetch(`${API_URL}/api/listing/hearted/ids?encoding=delta`, {
+      headers: getHeaders(),
+      credentials: 'include',
+      mode: 'cors'
+    });
+    if (!response.ok) {
+      if (response.status === 401 || response.status === 422) return [];
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data: { ids: number[] } = await response.json();
+    let id = 0;
+    return data.ids.map(gap => (id += gap));
+  } catch (error) {
+    console.error('Error fetching hearted listing ids:', error);
+    return [];
+  }
+};
+
 export const getHeartedListings = async (): Promise<Listing[]> => {
   try {
     const token = localStorage.getItem('token');